@@ -1,76 +1,60 @@
 # 04_build_dataset_multidomain.py
+import argparse
 import os
-import pandas as pd
 from tqdm import tqdm
 
-# Base paths
-train_folder = "../data/imad/BrushlessMotor/train/"
-test_folder = "../data/imad/BrushlessMotor/test/"
-
-# Train CSVs
-train_csvs = {
-    "source_normal": os.path.join(train_folder, "attributes_normal_source_train.csv"),
-    "target_normal": os.path.join(train_folder, "attributes_normal_target_train.csv"),
-}
-
-# Test CSVs
-test_csvs = {
-    "source_normal": os.path.join(test_folder, "attributes_anomaly_source_test.csv"),
-    "source_anomaly": os.path.join(test_folder, "attributes_anomaly_target_test.csv"),
-    "target_normal": os.path.join(test_folder, "attributes_normal_source_test.csv"),
-    "target_anomaly": os.path.join(test_folder, "attributes_normal_target_test.csv"),
-}
-
-# Helper: load metadata and add domain info
-def load_meta(file, split, domain, label):
-    df = pd.read_csv(file)
-    df["split"] = split
-    df["domain"] = domain      # source vs target
-    df["label"] = label        # normal=0, anomaly=1
-    return df
-
-# Load all CSVs
-meta_frames = []
-meta_frames.append(load_meta(train_csvs["source_normal"], "train", "source", 0))
-meta_frames.append(load_meta(train_csvs["target_normal"], "train", "target", 0))
-
-meta_frames.append(load_meta(test_csvs["source_normal"], "test", "source", 0))
-meta_frames.append(load_meta(test_csvs["source_anomaly"], "test", "source", 1))
-meta_frames.append(load_meta(test_csvs["target_normal"], "test", "target", 0))
-meta_frames.append(load_meta(test_csvs["target_anomaly"], "test", "target", 1))
-
-meta = pd.concat(meta_frames, ignore_index=True)
-
-print("Metadata shape:", meta.shape)
-print(meta.head())
-
-# ---- Now load parquet waveforms ----
-def load_waveform(parquet_file, split):
-    folder = train_folder if split == "train" else test_folder
-    file_path = os.path.join(folder, parquet_file)
-    try:
-        df = pd.read_parquet(file_path)
-        return df["MIC [Waveform]"].values  # numpy array
-    except Exception as e:
-        print(f"Error loading {file_path}: {e}")
-        return None
-
-records = []
-for _, row in tqdm(meta.iterrows(), total=len(meta)):
-    parquet_file = row["imp23absu_mic"]  # column pointing to parquet
-    waveform = load_waveform(parquet_file, row["split"])
-    if waveform is not None:
-        records.append({
-            "segment_id": row["segment_id"],
-            "split": row["split"],
-            "domain": row["domain"],
-            "label": row["label"],
-            "waveform": waveform
-        })
-
-dataset = pd.DataFrame(records)
-print("Final dataset shape:", dataset.shape)
-print(dataset.head())
-
-# Save for reuse
-dataset.to_pickle("../data/processed_dataset.pkl")
+from ingestion import SENSORS, build_metadata, iter_segments
+from waveform_store import STORE_PATH, WaveformStore, WaveformStoreWriter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the multi-domain waveform dataset")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of parallel parquet readers (default: all cores)")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process",
+                        help="pool type used for parquet decoding")
+    parser.add_argument("--chunksize", type=int, default=4,
+                        help="segments handed to a worker at a time")
+    parser.add_argument("--sensors", nargs="+", choices=list(SENSORS), default=list(SENSORS),
+                        help="sensors to ingest (default: mic, acc and gyro)")
+    parser.add_argument("--out", default=STORE_PATH, help="waveform store directory")
+    args = parser.parse_args()
+
+    sensors = {name: SENSORS[name] for name in args.sensors}
+
+    # Load all CSVs
+    meta = build_metadata()
+
+    print("Metadata shape:", meta.shape)
+    print(meta.head())
+
+    # ---- Now load parquet waveforms for every sensor in one parallel pass ----
+    # Each segment's files are decoded once and streamed straight into the store
+    stream = iter_segments(meta, sensors=sensors, workers=args.workers,
+                           executor=args.executor, chunksize=args.chunksize)
+    layout = {sensor: list(axes) for sensor, (_, axes) in sensors.items()}
+    skipped = 0
+    with WaveformStoreWriter(args.out, layout=layout) as writer:
+        for row, channels in tqdm(stream, total=len(meta)):
+            # Every feature table needs the mic: drop segments without it. Other
+            # missing sensors are stored empty and listed in the index
+            missing = [sensor for sensor in sensors if channels[sensor] is None]
+            if "mic" in missing or len(missing) == len(sensors):
+                skipped += 1
+                continue
+            sources = {sensor: getattr(row, col) for sensor, (col, _) in sensors.items()}
+            writer.append(row.segment_id, row.split, row.domain, row.label, channels, sources)
+
+    store = WaveformStore(args.out)
+    print("Final dataset:", len(store), "segments,", skipped, "skipped")
+    incomplete = store.index["missing"] != ""
+    if incomplete.any():
+        print(f"⚠️ {incomplete.sum()} segment(s) stored without some sensors:")
+        print(store.index.loc[incomplete, "missing"].value_counts().to_string())
+    for sensor, axes in store.layout.items():
+        print(f"   - {sensor}: {len(axes)} axis/axes, {len(store.array(sensor, axes[0]))} samples each")
+    print(store.index.head())
+
+
+if __name__ == "__main__":
+    main()
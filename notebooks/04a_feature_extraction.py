@@ -1,70 +1,89 @@
-# 05_feature_extraction_from_pkl.py
+# 05_feature_extraction_from_store.py
 
+import argparse
+import os
 import pandas as pd
-import numpy as np
-from scipy.stats import skew, kurtosis
-from scipy.fft import fft
 from tqdm import tqdm
 
-# 1️⃣ Load processed dataset
-print("Loading dataset...")
-dataset = pd.read_pickle("../data/processed_dataset.pkl")
-print(f"Loaded dataset with shape: {dataset.shape}")
+from feature_cache import FeatureCache
+from features import ALL_FEATURES, FEATURE_COLUMNS, FeatureBank, bank_columns, iter_feature_chunks
+from waveform_store import WaveformStore
 
-# 2️⃣ Helper: extract statistical & frequency features
-def extract_features(signal):
-    # Handle NaNs or empty signals
-    if signal is None or len(signal) == 0:
-        return {
-            "mean": np.nan, "std": np.nan, "skew": np.nan, "kurt": np.nan,
-            "max": np.nan, "min": np.nan, "freq_peak": np.nan, "signal_energy": np.nan
-        }
 
-    # Normalize (z-score)
-    signal = (signal - np.mean(signal)) / (np.std(signal) + 1e-8)
+def main():
+    parser = argparse.ArgumentParser(description="Extract features from the waveform store")
+    parser.add_argument("--chunk-size", type=int, default=64,
+                        help="segments stacked into one vectorized batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes sharing the memory-mapped store (1 = no pool)")
+    parser.add_argument("--features", nargs="+", default=FEATURE_COLUMNS, metavar="NAME",
+                        help=f"mic features to extract, or 'all' (default: the original eight). "
+                             f"Available: {', '.join(ALL_FEATURES)}")
+    parser.add_argument("--imu", action="store_true",
+                        help="also extract the default acc/gyro features (per axis)")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument("--invalidate", nargs="*", metavar="SEGMENT_ID",
+                       help="drop these segments (or all if none given) from the cached features "
+                            "of the selected feature set before extracting")
+    scope.add_argument("--invalidate-all", nargs="*", metavar="SEGMENT_ID",
+                       help="like --invalidate, for the cached features of every feature set")
+    args = parser.parse_args()
 
-    # Statistical features
-    mean_val = np.mean(signal)
-    std_val = np.std(signal)
-    skew_val = skew(signal)
-    kurt_val = kurtosis(signal)
-    max_val = np.max(signal)
-    min_val = np.min(signal)
+    # 1️⃣ Open the memory-mapped waveform store (only the index is read here)
+    print("Loading dataset...")
+    store = WaveformStore()
+    print(f"Loaded waveform store with {len(store)} segments")
 
-    # Frequency-domain features
-    fft_vals = np.abs(fft(signal))
-    freq_peak = np.argmax(fft_vals)
-    energy = np.sum(fft_vals**2)
+    # 2️⃣ Reuse cached features of segments whose source parquet hasn't changed
+    mic_features = ALL_FEATURES if args.features == ["all"] else args.features
+    banks = {"mic": FeatureBank.for_sensor("mic", mic_features)}
+    if args.imu:
+        banks.update({sensor: FeatureBank.for_sensor(sensor) for sensor in ["acc", "gyro"]})
+    columns = bank_columns(banks, store.layout)
+    cache = FeatureCache(banks=banks, layout=store.layout)
+    invalidate = args.invalidate if args.invalidate is not None else args.invalidate_all
+    if invalidate is not None:
+        every = args.invalidate_all is not None
+        cache.invalidate(invalidate, all_banks=every)
+        print(f"Invalidated {f'{len(invalidate)} segment(s)' if invalidate else 'all segments'} "
+              f"in {'every feature set' if every else 'the selected feature set'}")
+    keys = cache.keys(store.index)
+    cached, todo = cache.lookup(keys)
+    print(f"Feature cache: {len(cached)} hit(s), {len(todo)} segment(s) to extract")
 
-    return {
-        "mean": mean_val, "std": std_val, "skew": skew_val, "kurt": kurt_val,
-        "max": max_val, "min": min_val, "freq_peak": freq_peak, "signal_energy": energy
-    }
+    # 3️⃣ Extract the rest chunk by chunk (vectorized, spread over --workers processes)
+    frames = []
+    todo_rows = store.index.loc[todo.index]
+    with tqdm(total=len(todo_rows)) as progress:
+        for rows, feats in iter_feature_chunks(store, todo_rows, chunk_size=args.chunk_size,
+                                               workers=args.workers, banks=banks):
+            frames.append(pd.DataFrame(feats, index=rows.index))
+            progress.update(len(rows))
+    if frames:
+        cache.update(todo, pd.concat(frames))
+    cache.save()
 
-# 3️⃣ Apply to all rows
-records = []
-for _, row in tqdm(dataset.iterrows(), total=len(dataset)):
-    feats = extract_features(row["waveform"])
-    feats.update({
-        "segment_id": row["segment_id"],
-        "split": row["split"],
-        "domain": row["domain"],
-        "label": row["label"]
-    })
-    records.append(feats)
+    # 4️⃣ Merge with the cached rows (back in store order)
+    if len(cached):
+        frames.append(cached)
+    features_df = pd.concat(frames).loc[store.index.index, columns]
+    for col in ["segment_id", "split", "domain", "label"]:
+        features_df[col] = store.index[col]
+    print("Feature DataFrame shape:", features_df.shape)
+    print(features_df.head())
 
-# 4️⃣ Convert to DataFrame
-features_df = pd.DataFrame(records)
-print("Feature DataFrame shape:", features_df.shape)
-print(features_df.head())
+    # 5️⃣ Split and save
+    train_df = features_df[features_df["split"] == "train"]
+    test_df = features_df[features_df["split"] == "test"]
 
-# 5️⃣ Split and save
-train_df = features_df[features_df["split"] == "train"]
-test_df = features_df[features_df["split"] == "test"]
+    train_df.to_csv("../data/features_train.csv", index=False)
+    test_df.to_csv("../data/features_test.csv", index=False)
 
-train_df.to_csv("../data/features_train.csv", index=False)
-test_df.to_csv("../data/features_test.csv", index=False)
+    print("✅ Feature extraction completed and saved:")
+    print("   - ../data/features_train.csv")
+    print("   - ../data/features_test.csv")
 
-print("✅ Feature extraction completed and saved:")
-print("   - ../data/features_train.csv")
-print("   - ../data/features_test.csv")
+
+# Guarded so worker processes can import this module safely
+if __name__ == "__main__":
+    main()
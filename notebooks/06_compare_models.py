@@ -1,73 +1,44 @@
-import re
-import pandas as pd
+import argparse
 from pathlib import Path
 
-# === Define folder paths ===
-log_folder = Path(__file__).parent.parent.parent / 'imec' / 'loghub'
-print(f"🔍 Scanning log files in: {log_folder}")
-
-# === Regex pattern to extract metrics ===
-pattern = re.compile(
-    r"Accuracy:\s*([\d.]+).*?"
-    r"Precision:\s*([\d.]+).*?"
-    r"Recall:\s*([\d.]+).*?"
-    r"F1-Score:\s*([\d.]+)",
-    re.DOTALL
-)
-
-records = []
-
-# === Collect all matching log files ===
-log_files = list(log_folder.glob("model_run_*.txt")) + \
-             list(log_folder.glob("model_run_xgb_*.txt")) + \
-             list(log_folder.glob("Rfmodel_run_*.txt"))
-
-if not log_files:
-    print("⚠️ No log files found in loghub folder. Check filenames and rerun training scripts.")
-else:
-    for log_file in log_files:
-        text = log_file.read_text(errors="ignore")
-        match = pattern.search(text)
-        if match:
-            accuracy, precision, recall, f1 = map(float, match.groups())
-
-            # Detect model type from filename
-            fname = log_file.name.lower()
-            if "xgb" in fname:
-                model_type = "XGBoost"
-            elif "rf" in fname:
-                model_type = "RandomForest"
-            elif "logreg" in fname or "model_run" in fname:
-                model_type = "LogisticRegression"
-            else:
-                model_type = "Unknown"
-
-            records.append({
-                "ModelType": model_type,
-                "LogFile": log_file.name,
-                "Accuracy": accuracy,
-                "Precision": precision,
-                "Recall": recall,
-                "F1-Score": f1,
-                "FullPath": str(log_file)
-            })
-
-# === Build DataFrame ===
-if records:
-    df = pd.DataFrame(records)
-    df = df.sort_values(by="F1-Score", ascending=False).reset_index(drop=True)
+from metrics_store import RUNS_DB, best_per_model, import_legacy_logs, query_runs
 
+# === Define folder paths ===
+log_folder = Path(__file__).parent.parent / 'loghub'
+print(f"🔍 Reading training runs from: {RUNS_DB}")
+
+parser = argparse.ArgumentParser(description="Compare the recorded training runs")
+parser.add_argument("--import-logs", action="store_true",
+                    help="first add the metrics of old loghub text logs to the store")
+parser.add_argument("--data-hash", help="only runs trained on this design matrix (preprocessing key)")
+parser.add_argument("--top", type=int, default=20, help="how many of the best runs to list")
+args = parser.parse_args()
+
+if args.import_logs:
+    print(f"📥 Imported {import_legacy_logs(log_folder)} legacy log file(s)")
+
+# === Query the metrics store (indexed by F1, best first) ===
+columns = {"model": "ModelType", "run_id": "RunId", "created": "Created", "accuracy": "Accuracy",
+           "precision": "Precision", "recall": "Recall", "f1": "F1-Score", "data_hash": "DataHash",
+           "log_file": "LogFile", "artifact_path": "ArtifactPath"}
+runs = query_runs(data_hash=args.data_hash, limit=args.top)[list(columns)].rename(columns=columns)
+
+if len(runs):
     print("\n=== 🧩 Model Comparison Summary ===")
-    print(df.to_string(index=False))
+    print(runs.drop(columns=["LogFile", "ArtifactPath"]).to_string(index=False))
+
+    best_models = best_per_model(data_hash=args.data_hash)[list(columns)].rename(columns=columns)
+    print("\n=== 🥇 Best Run per Model ===")
+    print(best_models[["ModelType", "RunId", "F1-Score", "Accuracy", "Created"]].to_string(index=False))
 
-    # Save summary
+    # Save summary (07_save_best_models.py promotes its first row)
     out_path = log_folder / "model_comparison_summary.csv"
-    df.to_csv(out_path, index=False)
+    best_models.to_csv(out_path, index=False)
     print(f"\n✅ Summary saved to: {out_path}")
 
     # Print best performer
-    best = df.iloc[0]
-    print(f"\n🏆 Best Model: {best['ModelType']} ({best['LogFile']}) | F1-Score: {best['F1-Score']:.4f}")
+    best = best_models.iloc[0]
+    print(f"\n🏆 Best Model: {best['ModelType']} (run {best['RunId']}) | F1-Score: {best['F1-Score']:.4f}")
 
 else:
-    print("⚠️ No valid metrics found in any log files.")
+    print("⚠️ No runs recorded yet. Run the training scripts (or pass --import-logs for old text logs).")
@@ -1,35 +1,42 @@
-import joblib
-import pandas as pd
-from pathlib import Path
-import shutil
+import argparse
 
-# Paths
-base_folder = Path(__file__).parent.parent.parent / 'imec'
-log_folder = base_folder / 'loghub'
-print(f"📂 Base folder: {base_folder}")
-print(f"📂 Log folder: {log_folder}")
-models_folder = base_folder / 'models'
-best_folder = base_folder / 'best_model'
+from metrics_store import best_per_model, query_runs
+from model_registry import ModelRegistry
+
+parser = argparse.ArgumentParser(description="Promote a registered model version to an alias")
+parser.add_argument("--alias", default="best", help="alias to move (e.g. best, staging)")
+parser.add_argument("--version", help="promote this version (or alias) instead of the best recorded run")
+parser.add_argument("--data-hash", help="only consider runs trained on this design matrix")
+parser.add_argument("--source", default="train",
+                    help="only consider runs of this protocol (default: the supervised trainers; "
+                         "also out_of_core, normal_only)")
+parser.add_argument("--rollback", action="store_true", help="point the alias back at its previous version")
+args = parser.parse_args()
 
-# Ensure folders exist
-models_folder.mkdir(parents=True, exist_ok=True)
-best_folder.mkdir(parents=True, exist_ok=True)
+# Paths
+registry = ModelRegistry()
+print(f"📂 Model registry: {registry.path}")
 
-# Load comparison summary
-summary_file = log_folder / "model_comparison_summary.csv"
-if not summary_file.exists():
-    raise FileNotFoundError("⚠️ Run compare_models.py first to generate model_comparison_summary.csv")
+if args.rollback:
+    version = registry.rollback(args.alias)
+    print(f"↩️ '{args.alias}' rolled back to version {version}")
 
-df = pd.read_csv(summary_file)
-best_model_name = df.iloc[0]['ModelType']
-print(f"🏆 Best model detected: {best_model_name}")
+else:
+    if args.version:
+        version = registry.resolve(args.version)
+        runs = query_runs(model_version=version, limit=1)
+    else:
+        # Best recorded run that has a registered model (see 06_compare_models.py)
+        runs = best_per_model(data_hash=args.data_hash, source=args.source, registered=True)
+        if runs.empty:
+            raise FileNotFoundError(f"⚠️ No registered '{args.source}' runs found; "
+                                    f"train a model first (see train_models.py)")
+        version = runs.iloc[0]["model_version"]
 
-# Look for saved model
-model_file = models_folder / f"{best_model_name}.pkl"
-if not model_file.exists():
-    raise FileNotFoundError(f"❌ Model file not found: {model_file}")
+    if len(runs):
+        best = runs.iloc[0]
+        print(f"🏆 Run {best['run_id']}: {best['model']} | F1-Score: {best['f1']:.4f} | version {version}")
 
-# Copy to best_model folder
-best_model_path = best_folder / "best_model.pkl"
-shutil.copy(model_file, best_model_path)
-print(f"✅ Best model saved as: {best_model_path}")
+    # Swap the alias atomically: readers see the old or the new version, never a partial file
+    registry.promote(version, args.alias)
+    print(f"✅ '{args.alias}' now points to {registry.model_path(version)}")
@@ -0,0 +1,163 @@
+# anomaly_models.py
+# Anomaly detectors trained on normal segments only.
+#
+#   IsolationForest   short isolation paths = anomalous
+#   Mahalanobis       distance to the normal mean under a Ledoit-Wolf shrunk covariance
+#   Autoencoder       reconstruction error of a small MLP trained to copy normal rows (CPU)
+#
+# The detectors are estimators on the output of the usual encode + scale
+# preprocessor (model_artifact.build_preprocessor) over the numeric signal
+# features plus the domain column. They model the numeric columns and read
+# each row's domain from its one-hot block, because every domain gets its own
+# threshold: the `quantile` of the scores of held-out normal rows of that
+# domain (the global one for domains with too few rows, or unseen ones).
+# predict_proba() maps the score through a sigmoid centred on the row's
+# threshold, so P(anomaly) > 0.5 exactly when the score exceeds it, and a
+# fitted detector is a drop-in model for ModelArtifact, the registry, the
+# exports, score.py and streaming.py.
+#
+# Scoring is plain vectorized NumPy on whole batches: the isolation forest
+# is flattened into node arrays (tree_inference.py) and the autoencoder's
+# forward pass is a few matrix products.
+import numpy as np
+from sklearn.base import BaseEstimator
+from sklearn.covariance import LedoitWolf
+from sklearn.ensemble import IsolationForest
+from sklearn.neural_network import MLPRegressor
+
+from tree_inference import FlatForest, sklearn_tree_arrays
+
+MIN_CALIBRATION_ROWS = 5
+
+
+def average_path_length(n):
+    """Expected path length of an unsuccessful BST search among n points (as in sklearn)."""
+    n = np.asarray(n, dtype=np.float64)
+    safe = np.maximum(n, 3.0)
+    return np.where(n <= 1, 0.0, np.where(n == 2, 1.0,
+                    2.0 * (np.log(safe - 1.0) + np.euler_gamma) - 2.0 * (safe - 1.0) / safe))
+
+
+class NormalModel(BaseEstimator):
+    """Base for detectors fitted on normal rows with per-domain thresholds.
+
+    n_numeric   number of leading (numeric) columns the detector models; the
+                remaining columns are the scaled one-hot domain block
+    quantile    share of held-out normal rows scored below their threshold
+    """
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, n_numeric, quantile=0.95):
+        self.n_numeric = n_numeric
+        self.quantile = quantile
+
+    def fit(self, X, y=None):
+        X = np.asarray(X, dtype=np.float64)
+        self.n_features_in_ = X.shape[1]
+        # Value every one-hot column takes when its domain is hot
+        self.domain_hot_ = X[:, self.n_numeric:].max(axis=0)
+        self._fit(X[:, :self.n_numeric])
+        return self
+
+    def domain_index(self, X):
+        """Domain column of every row, -1 for a domain the detector hasn't seen."""
+        hot = np.isclose(np.asarray(X)[:, self.n_numeric:], self.domain_hot_)
+        return np.where(hot.any(axis=1), hot.argmax(axis=1), -1)
+
+    def calibrate(self, X):
+        """Per-domain thresholds and score spreads from held-out normal rows."""
+        scores, domains = self.anomaly_score(X), self.domain_index(X)
+
+        def threshold(s):
+            spread = np.subtract(*np.percentile(s, [75, 25])) / 1.349 if len(s) > 1 else 0.0
+            return np.quantile(s, self.quantile), spread or np.std(s) or 1.0
+
+        # Row 0: global; row d + 1: domain column d
+        table = [threshold(scores)]
+        for d in range(len(self.domain_hot_)):
+            own = scores[domains == d]
+            table.append(threshold(own) if len(own) >= MIN_CALIBRATION_ROWS else table[0])
+        self.thresholds_ = np.array(table)
+        return self
+
+    def anomaly_score(self, X):
+        """Raw anomaly score of every row (higher = more anomalous)."""
+        return self._score(np.asarray(X, dtype=np.float64)[:, :self.n_numeric])
+
+    def predict_proba(self, X):
+        threshold, spread = self.thresholds_[self.domain_index(X) + 1].T
+        z = (self.anomaly_score(X) - threshold) / spread
+        p = 1.0 / (1.0 + np.exp(-np.clip(z, -50, 50)))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+
+class IsolationForestDetector(NormalModel):
+    def __init__(self, n_numeric, quantile=0.95, n_estimators=200, max_samples="auto", random_state=42, n_jobs=None):
+        super().__init__(n_numeric, quantile)
+        self.n_estimators = n_estimators
+        self.max_samples = max_samples
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+
+    def _fit(self, X):
+        forest = IsolationForest(n_estimators=self.n_estimators, max_samples=self.max_samples,
+                                 random_state=self.random_state, n_jobs=self.n_jobs).fit(X)
+        # Keep only node arrays: the path length to each leaf, plus the
+        # expected remaining length for the samples the leaf still holds
+        arrays, depth = sklearn_tree_arrays(forest.estimators_)
+        path = []
+        for e in forest.estimators_:
+            left, right = e.tree_.children_left, e.tree_.children_right
+            node_depth = np.zeros(e.tree_.node_count)
+            for node in range(e.tree_.node_count):  # parents come before their children
+                if left[node] != -1:
+                    node_depth[left[node]] = node_depth[right[node]] = node_depth[node] + 1
+            path.append(node_depth + average_path_length(e.tree_.n_node_samples))
+        self.trees_ = FlatForest(**arrays, value=np.concatenate(path)[:, None], classes=[0], depth=depth)
+        self.normalizer_ = len(forest.estimators_) * float(average_path_length(forest.max_samples_))
+
+    def _score(self, X):
+        leaves = self.trees_.apply(X)
+        depths = np.cumsum(self.trees_.value[leaves.T, 0], axis=0)[-1]
+        return 2.0 ** (-depths / self.normalizer_)
+
+
+class MahalanobisDetector(NormalModel):
+    def _fit(self, X):
+        covariance = LedoitWolf().fit(X)
+        self.location_ = covariance.location_
+        self.precision_ = covariance.precision_
+        self.shrinkage_ = covariance.shrinkage_
+
+    def _score(self, X):
+        d = X - self.location_
+        return np.einsum("ij,jk,ik->i", d, self.precision_, d)
+
+
+class AutoencoderDetector(NormalModel):
+    def __init__(self, n_numeric, quantile=0.95, hidden=(16, 4, 16), alpha=1e-4, max_iter=2000, random_state=42):
+        super().__init__(n_numeric, quantile)
+        self.hidden = hidden
+        self.alpha = alpha
+        self.max_iter = max_iter
+        self.random_state = random_state
+
+    def _fit(self, X):
+        mlp = MLPRegressor(hidden_layer_sizes=self.hidden, activation="relu", alpha=self.alpha,
+                           max_iter=self.max_iter, early_stopping=len(X) >= 100,
+                           random_state=self.random_state).fit(X, X)
+        self.weights_ = [(w, b) for w, b in zip(mlp.coefs_, mlp.intercepts_)]
+
+    def reconstruct(self, X):
+        h = X
+        for w, b in self.weights_[:-1]:
+            h = np.maximum(h @ w + b, 0.0)
+        w, b = self.weights_[-1]
+        return h @ w + b
+
+    def _score(self, X):
+        return np.mean((self.reconstruct(X) - X) ** 2, axis=1)
@@ -0,0 +1,83 @@
+# bench_features.py
+# Throughput of the per-segment vs batched feature extractor, the speedup of
+# the multi-process mode, plus a regression check that every path produces
+# the same eight feature columns.
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import FEATURE_COLUMNS, extract_features, extract_store_features
+from waveform_store import WaveformStore
+
+
+def per_segment(store, rows):
+    records = [extract_features(np.asarray(w, dtype=np.float64)) for _, w in store.iter_segments(rows)]
+    return pd.DataFrame(records, index=rows.index)[FEATURE_COLUMNS]
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def compare(name, expected, actual):
+    """Max relative difference per column; freq_peak must match exactly."""
+    worst = 0.0
+    for col in FEATURE_COLUMNS:
+        a, b = expected[col].to_numpy(float), actual[col].to_numpy(float)
+        if col == "freq_peak":
+            mismatches = int((a != b).sum())
+            print(f"   {col:<14} mismatches: {mismatches}")
+            worst = max(worst, float(mismatches))
+            continue
+        diff = np.abs(a - b) / np.maximum(np.abs(a), 1.0)
+        print(f"   {col:<14} max rel diff: {diff.max():.2e}")
+        worst = max(worst, diff.max())
+    ok = worst <= 1e-9
+    print(f"{'✅' if ok else '❌'} {name}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feature extraction")
+    parser.add_argument("--limit", type=int, default=0, help="only use the first N segments")
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, 8, os.cpu_count() or 1}),
+                        help="worker counts to time the parallel mode with")
+    parser.add_argument("--check-csv", action="store_true",
+                        help="also compare against data/features_train.csv / features_test.csv")
+    args = parser.parse_args()
+
+    store = WaveformStore()
+    rows = store.index.head(args.limit) if args.limit else store.index
+    print(f"{len(rows)} segments, {os.cpu_count()} cores")
+
+    reference, t_ref = timed(per_segment, store, rows)
+    print(f"per-segment:        {len(rows) / t_ref:8.1f} segments/sec ({t_ref:.2f}s)")
+
+    ok = True
+    t_serial = None
+    for workers in args.workers:
+        result, t = timed(extract_store_features, store, rows, args.chunk_size, workers)
+        t_serial = t_serial or t
+        print(f"batched, {workers:>2} worker(s): {len(rows) / t:8.1f} segments/sec ({t:.2f}s), "
+              f"x{t_ref / t:.2f} vs per-segment, x{t_serial / t:.2f} vs 1 worker")
+        ok &= compare(f"{workers} worker(s) match extract_features()", reference, result)
+
+    if args.check_csv:
+        saved = pd.concat([pd.read_csv("../data/features_train.csv"),
+                           pd.read_csv("../data/features_test.csv")])
+        saved = saved.set_index("segment_id").loc[rows["segment_id"]]
+        saved.index = rows.index
+        ok &= compare("batched matches saved feature CSVs", saved[FEATURE_COLUMNS], result)
+
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
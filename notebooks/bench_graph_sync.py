@@ -0,0 +1,82 @@
+# bench_graph_sync.py
+# Throughput of the knowledge-graph loader (graph_loader.py) on synthetic segments.
+#
+#   python bench_graph_sync.py                     # 1M segments
+#   python bench_graph_sync.py --segments 200000 --changed 0.05
+#
+# Builds metadata for N made-up segments shaped like the IMAD-DS one and
+# times, against a throw-away SQLite graph:
+#   initial    first sync, every row written
+#   unchanged  the nightly sync when nothing changed (hash comparison only)
+#   changed    the nightly sync after --changed of the segments got a new environment
+#              (new IN_ENVIRONMENT relationships written, the old ones deleted)
+#   import     writing the neo4j-admin import CSVs of the full graph
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from graph_loader import SQLiteGraph, SyncState, segment_graph, sync, write_import_files
+from ingestion import SENSORS
+
+
+def synthetic_metadata(n, seed=42):
+    rng = np.random.default_rng(seed)
+    ids = pd.Series(np.arange(n)).map("segment_{}".format)
+    meta = pd.DataFrame({
+        "segment_id": ids,
+        "split": rng.choice(["train", "test"], n, p=[0.8, 0.2]),
+        "domain": rng.choice(["source", "target"], n, p=[0.9, 0.1]),
+        "label": (rng.random(n) < 0.1).astype(int),
+        "domain_shift_op": rng.choice([f"spd{s}" for s in range(1500, 2900, 100)], n),
+        "domain_shift_env": rng.choice([f"Bckg{c}" for c in "ABCDEFG"], n),
+    })
+    meta["split_label"] = meta["split"]
+    meta["anomaly_label"] = np.where(meta["label"] == 1, rng.choice(["belt", "magnetic"], n), "normal")
+    for column, _ in SENSORS.values():
+        meta[column] = column + "_" + ids + ".parquet"
+    return meta
+
+
+def timed(graph, meta, state, batch_size):
+    start = time.perf_counter()
+    nodes, edges = segment_graph(meta)
+    report = sync(graph, nodes, edges, state, batch_size)
+    return time.perf_counter() - start, report[["rows", "written", "deleted"]].sum().astype(int)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the knowledge-graph loader")
+    parser.add_argument("--segments", type=int, default=1_000_000)
+    parser.add_argument("--changed", type=float, default=0.01, help="share of segments changed between syncs")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    meta = synthetic_metadata(args.segments)
+    changed = meta.copy()
+    rows = np.random.default_rng(0).random(len(meta)) < args.changed
+    changed.loc[rows, "domain_shift_env"] = "BckgZ"
+
+    with tempfile.TemporaryDirectory(prefix="graph-bench-") as folder:
+        graph, state = SQLiteGraph(Path(folder) / "graph.sqlite"), SyncState(Path(folder) / "state.sqlite")
+        results = []
+        for name, frame in [("initial", meta), ("unchanged", meta), ("changed", changed)]:
+            seconds, counts = timed(graph, frame, state, args.batch_size)
+            results.append({"sync": name, **counts, "seconds": seconds, "rows_per_sec": counts["rows"] / seconds})
+            print(f"{name:<10} {counts['written']:>9} of {counts['rows']} rows written, "
+                  f"{counts['deleted']} deleted in {seconds:6.1f}s")
+        start = time.perf_counter()
+        write_import_files(Path(folder) / "import", *segment_graph(meta))
+        seconds = time.perf_counter() - start
+        print(f"{'import':<10} CSVs of {counts['rows']} rows written in {seconds:6.1f}s")
+        graph.close()
+        state.close()
+
+    print("\n" + pd.DataFrame(results).round(1).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
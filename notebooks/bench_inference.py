@@ -0,0 +1,82 @@
+# bench_inference.py
+# Scoring latency and throughput of pickled vs compiled (exported) models.
+#
+#   python bench_inference.py                     # every registered version
+#   python bench_inference.py best --batch-sizes 1 16 256
+#
+# For each version the feature CSV rows are scored by the pickled sklearn /
+# xgboost pipeline (DataFrame in) and by the registry export (row dicts in,
+# as the streaming scorer sends them), whose tree ensembles run as flat
+# NumPy arrays (tree_inference.py). The export must be bit-identical to the
+# pickle on every row; forests are compared single-threaded, because a
+# multi-threaded forest sums its trees in thread completion order.
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_registry import ModelRegistry
+from preprocessing import FEATURE_FILES
+
+
+def latencies(score, batches, repeat):
+    """Seconds per call of score(batch), cycling through the batches."""
+    times = []
+    for i in range(repeat):
+        batch = batches[i % len(batches)]
+        start = time.perf_counter()
+        score(batch)
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pickled vs compiled model scoring")
+    parser.add_argument("refs", nargs="*", help="registry aliases or versions (default: all versions)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 64, 512])
+    parser.add_argument("--repeat", type=int, default=200, help="timed calls per batch size")
+    args = parser.parse_args()
+
+    frame = pd.concat([pd.read_csv(f) for f in FEATURE_FILES], ignore_index=True)
+    records = frame.to_dict("records")
+    registry = ModelRegistry()
+    refs = args.refs or list(registry.versions()["version"])
+
+    rows = []
+    for ref in refs:
+        version = registry.resolve(ref)
+        registry.export(version)
+        pickled = registry.load(version, exported=False)
+        compiled = registry.load(version)
+        model = pickled.pipeline.named_steps["model"]
+        if type(model).__name__ != "XGBClassifier" and hasattr(model, "n_jobs"):
+            model.set_params(n_jobs=1)
+
+        # Bit-identity on every row, for whole-file and single-row scoring
+        identical = np.array_equal(pickled.predict_proba(frame), compiled.predict_proba(records))
+        sample = range(0, len(frame), max(1, len(frame) // 50))
+        identical_single = all(np.array_equal(pickled.predict_proba(frame.iloc[i:i + 1]),
+                                              compiled.predict_proba(records[i])) for i in sample)
+        print(f"{pickled.model_type:<20} {version} {type(compiled.model).__name__:<18} "
+              f"bit-identical: all rows {identical}, single rows {identical_single}")
+
+        for size in args.batch_sizes:
+            starts = range(0, len(frame) - size + 1, size)
+            frames = [frame.iloc[s:s + size] for s in starts]
+            dicts = [records[s:s + size] for s in starts]
+            # The pickled pipelines are far slower; fewer calls give the same picture
+            slow = latencies(pickled.predict_proba, frames, max(10, args.repeat // 10))
+            fast = latencies(compiled.predict_proba, dicts, args.repeat)
+            for fmt, t in (("pickle", slow), ("compiled", fast)):
+                rows.append({"model": pickled.model_type, "format": fmt, "batch": size,
+                             "p50_us": 1e6 * np.percentile(t, 50), "p99_us": 1e6 * np.percentile(t, 99),
+                             "rows_per_sec": size / t.mean(), "identical": identical and identical_single})
+            print(f"  batch {size:>4}: pickle p50 {1e6 * np.median(slow):9.0f} us | "
+                  f"compiled p50 {1e6 * np.median(fast):9.0f} us | speedup {np.median(slow) / np.median(fast):6.1f}x")
+
+    print("\n" + pd.DataFrame(rows).round(1).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
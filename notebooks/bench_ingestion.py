@@ -0,0 +1,61 @@
+# bench_ingestion.py
+# Segments/sec and peak RSS of the parquet ingestion for 1, 4 and N workers.
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from ingestion import build_metadata, iter_segments, iter_waveforms
+
+
+def peak_rss_mb():
+    """Peak RSS of this process plus the largest (terminated) child, in MB."""
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # macOS reports bytes
+    return self_kb / scale, child_kb / scale
+
+
+def run_once(workers, executor, limit, all_sensors):
+    meta = build_metadata()
+    if limit:
+        meta = meta.head(limit)
+    if all_sensors:
+        stream = iter_segments(meta, workers=workers, executor=executor)
+    else:
+        stream = iter_waveforms(meta, workers=workers, executor=executor)
+    start = time.perf_counter()
+    n = sum(1 for _, w in stream if w is not None)
+    elapsed = time.perf_counter() - start
+    self_mb, child_mb = peak_rss_mb()
+    print(f"{workers},{executor},{n},{elapsed:.3f},{n / elapsed:.1f},{self_mb:.1f},{child_mb:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parallel parquet ingestion")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--limit", type=int, default=0, help="only read the first N segments")
+    parser.add_argument("--all-sensors", action="store_true",
+                        help="read mic, acc and gyro per segment instead of the mic only")
+    parser.add_argument("--workers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.workers:
+        run_once(args.workers, args.executor, args.limit, args.all_sensors)
+        return
+
+    # Each configuration runs in a fresh interpreter so peak RSS isn't shared between runs
+    n_cores = os.cpu_count() or 1
+    print("workers,executor,segments,seconds,segments_per_sec,peak_rss_main_mb,peak_rss_worker_mb")
+    for workers in sorted({1, 4, n_cores}):
+        cmd = [sys.executable, __file__, "--workers", str(workers),
+               "--executor", args.executor, "--limit", str(args.limit)]
+        if args.all_sensors:
+            cmd.append("--all-sensors")
+        subprocess.run(cmd, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# bench_log_parser.py
+# Throughput of the maintenance-log parser (log_parser.py) on a synthetic log.
+#
+#   python bench_log_parser.py                         # 2M lines, 1 and all cores
+#   python bench_log_parser.py --lines 10000000 --workers 1 4 8
+#
+# The log mixes the README's line shapes: timestamped sensor reports with
+# fault and action vocabulary, and lines without entities (status chatter).
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from log_parser import parse_logs
+
+TEMPLATES = [
+    "[{ts}] Sensor {sensor} reported overheating condition",
+    "[{ts}] Technician replaced thermal paste on {sensor}",
+    "[{ts}] {sensor} returned to normal operation",
+    "[{ts}] High vibration and belt slippage detected near {sensor}; inspection scheduled",
+    "[{ts}] Heartbeat ok, queue depth 12, no action required",
+    "[{ts}] Operator shift change, handover notes filed",
+]
+
+
+def write_log(path, n_lines, seed=42):
+    rng = np.random.default_rng(seed)
+    stamps = np.datetime64("2024-01-01T00:00:00") + np.sort(rng.integers(0, 365 * 86400, n_lines))
+    sensors = rng.integers(1000, 9999, n_lines)
+    templates = rng.integers(0, len(TEMPLATES), n_lines)
+    with open(path, "w") as f:
+        for start in range(0, n_lines, 100_000):
+            f.write("\n".join(TEMPLATES[t].format(ts=str(ts).replace("T", " "), sensor=f"S{s}")
+                              for ts, s, t in zip(stamps[start:start + 100_000], sensors[start:start + 100_000],
+                                                  templates[start:start + 100_000])) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the maintenance-log parser")
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--chunk-mb", type=float, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="log-bench-") as folder:
+        path = os.path.join(folder, "maintenance.log")
+        write_log(path, args.lines)
+        size = os.path.getsize(path) / 2 ** 20
+        for workers in args.workers:
+            start = time.perf_counter()
+            frames = list(parse_logs([path], workers, int(args.chunk_mb * 2 ** 20)))
+            seconds = time.perf_counter() - start
+            lines = sum(frame.attrs["lines"] for frame in frames)
+            print(f"{workers:>2} worker(s): {lines} lines ({size:.0f} MB) in {seconds:6.2f}s | "
+                  f"{lines / seconds:>12,.0f} lines/sec | {size / seconds:6.1f} MB/sec | "
+                  f"{sum(len(f) for f in frames)} entities")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# bench_model_load.py
+# Cold-start time and per-worker memory of pickled vs exported models.
+#
+#   python bench_model_load.py                 # every registered version, 4 workers
+#   python bench_model_load.py best --workers 8
+#
+# For each version, N fresh worker processes load the model (pickle or the
+# memory-mapped export) and score one batch, then stay alive while their
+# memory is measured. The private memory (USS) a worker gains by loading is
+# what every extra worker costs; PSS splits shared pages between the workers
+# mapping them, so memory-mapped model arrays only count once across all.
+import argparse
+import multiprocessing as mp
+import time
+
+import pandas as pd
+import psutil
+
+from preprocessing import FEATURE_FILES
+
+
+def _worker(ref, exported, rows_file, ready, done):
+    from model_registry import ModelRegistry
+    registry = ModelRegistry()
+    rows = pd.read_csv(rows_file)
+    me = psutil.Process()
+    before = me.memory_full_info()
+    start = time.perf_counter()
+    artifact = registry.load(ref, exported=exported)
+    load_seconds = time.perf_counter() - start
+    loaded = me.memory_full_info()
+    artifact.predict_proba(rows)
+    ready.put((load_seconds, loaded.uss - before.uss))
+    done.wait()
+
+
+def measure(ref, exported, workers, rows_file):
+    ctx = mp.get_context("spawn")
+    ready, done = ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=_worker, args=(ref, exported, rows_file, ready, done)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    results = [ready.get() for _ in procs]
+    # Everyone has loaded and scored: now the shared pages are mapped by all workers
+    pss = sum(psutil.Process(p.pid).memory_full_info().pss for p in procs)
+    done.set()
+    for p in procs:
+        p.join()
+    return {
+        "load_ms": 1000 * sum(r[0] for r in results) / workers,
+        "load_uss_mb": sum(r[1] for r in results) / workers / 2 ** 20,
+        "total_pss_mb": pss / 2 ** 20,
+    }
+
+
+def main():
+    from model_registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Benchmark model load time and worker memory")
+    parser.add_argument("refs", nargs="*", help="registry aliases or versions (default: all versions)")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    registry = ModelRegistry()
+    refs = args.refs or list(registry.versions()["version"])
+    rows = []
+    for ref in refs:
+        version = registry.resolve(ref)
+        registry.export(version)
+        model_type = registry.info(version)["model_type"]
+        for exported in (False, True):
+            result = measure(version, exported, args.workers, FEATURE_FILES[1])
+            rows.append({"model": model_type, "version": version, "format": "export" if exported else "pickle",
+                         "pickle_mb": registry.model_path(version).stat().st_size / 2 ** 20, **result})
+            print(f"{model_type:<20} {rows[-1]['format']:<7} load {result['load_ms']:8.1f} ms | "
+                  f"private memory after load {result['load_uss_mb']:7.2f} MB/worker | "
+                  f"PSS of {args.workers} workers {result['total_pss_mb']:8.1f} MB")
+
+    print("\n" + pd.DataFrame(rows).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_retrieval.py
+# Query latency of the retrieval index (retrieval.py) on synthetic vectors.
+#
+#   python bench_retrieval.py                              # 1M items, every installed backend
+#   python bench_retrieval.py --items 200000 --dim 256 --backends numpy
+#
+# Items are drawn around a few thousand random centres, like embedded log
+# lines, with a domain (10% "target") and a label (1% anomalous). For every
+# backend it times the inserts, a save and reopen, and the p50 / p99 of:
+#   plain      top-k over every item
+#   domain     top-k among the "target" items (filtered after the HNSW lookup)
+#   rare       top-k among anomalous target items (scanned exactly)
+#   cached     a repeated query
+# plus recall@k of the HNSW backends against the exact answer.
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from retrieval import BACKENDS, VectorIndex, _available
+
+
+def synthetic_items(n, dim, seed=42):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, n // 500), dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, len(centres), n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    meta = pd.DataFrame({"domain": np.where(rng.random(n) < 0.1, "target", "source"),
+                         "label": (rng.random(n) < 0.01).astype(int)})
+    return pd.Index(np.arange(n)).map("item_{}".format), vectors, meta
+
+
+def latencies(index, queries, k, where):
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(q, k, where)
+        times.append(time.perf_counter() - start)
+    return np.percentile(times, [50, 99]) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval index")
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS,
+                        default=[b for b in BACKENDS if b == "numpy" or _available(b)])
+    args = parser.parse_args()
+
+    ids, vectors, meta = synthetic_items(args.items, args.dim)
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)] + 0.1 * rng.standard_normal(
+        (args.queries, args.dim)).astype(np.float32)
+    exact = None
+    results = []
+    for backend in args.backends:
+        with tempfile.TemporaryDirectory(prefix="retrieval-bench-") as folder:
+            index = VectorIndex(folder, args.dim, backend)
+            start = time.perf_counter()
+            for begin in range(0, len(ids), 100_000):
+                index.add(ids[begin:begin + 100_000], vectors[begin:begin + 100_000], meta.iloc[begin:begin + 100_000])
+            insert_seconds = time.perf_counter() - start
+            index.save()
+            start = time.perf_counter()
+            index = VectorIndex(folder)
+            open_seconds = time.perf_counter() - start
+
+            row = {"backend": backend, "items": len(index), "insert_s": insert_seconds, "open_s": open_seconds}
+            for name, where in [("plain", None), ("domain", {"domain": "target"}),
+                                ("rare", {"domain": "target", "label": 1})]:
+                row[f"{name}_p50_ms"], row[f"{name}_p99_ms"] = latencies(index, queries, args.k, where)
+            row["cached_p50_ms"], _ = latencies(index, queries, args.k, None)
+            found = [set(index.search(q, args.k)["id"]) for q in queries]
+            if backend == "numpy":
+                exact = found
+            elif exact is not None:
+                row["recall"] = np.mean([len(f & e) / args.k for f, e in zip(found, exact)])
+            results.append(row)
+            print(f"{backend:<8} {len(index)} items inserted in {insert_seconds:.1f}s, reopened in {open_seconds:.1f}s, "
+                  f"plain p50 {row['plain_p50_ms']:.2f} ms")
+
+    print("\n" + pd.DataFrame(results).round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
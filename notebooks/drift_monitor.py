@@ -0,0 +1,350 @@
+# drift_monitor.py
+# Incremental domain-shift monitor: feature sketches per machine and operating condition vs the training baseline.
+#
+#   python drift_monitor.py baseline                            # training baseline from features_train.csv
+#   python drift_monitor.py update ../data/features_test.csv    # stream rows in, print what drifted
+#   python drift_monitor.py report --all                        # every slice and feature
+#   python score.py score new_segments/*.parquet --domain target --drift
+#
+# Every feature of extract_features() is summarised by a FeatureSketch:
+#   moments     count, mean, central moments, max, min, merged batch by batch
+#               (Welford / Pebay, shared with streaming.py)
+#   t-digest    ~TDIGEST_COMPRESSION centroids; quantiles within ~1/compression
+#               in rank, tighter in the tails
+#   histogram   counts over N_BINS bins whose edges are baseline quantiles
+# so memory per feature is fixed however many segments go through.
+#
+# The baseline holds one sketch per feature and machine, built from the
+# training rows. Monitored rows update one slice per machine and condition:
+# its domain (source / target), operating speed (domain_shift_op, e.g.
+# spd2400) and background (domain_shift_env); the domain and conditions of
+# known segments come from the IMAD-DS metadata. A slice's feature has drifted
+# when, with at least MIN_ROWS rows:
+#   PSI > PSI_ALERT over the baseline-quantile bins, or
+#   KS (the largest CDF gap at the bin edges) is above its critical value
+#   at significance KS_ALPHA for the two sample sizes.
+# The mean shift in baseline standard deviations is reported alongside.
+# State is one JSON file, rewritten atomically after every update.
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from features import FEATURE_COLUMNS
+from ingestion import build_metadata, data_folder, with_segment_labels
+from preprocessing import DATA_FOLDER
+from streaming import Moments, block_moments, merge_moments
+
+DRIFT_STATE = DATA_FOLDER / 'drift' / 'monitor.json'
+BASELINE_FILES = [DATA_FOLDER / 'features_train.csv']
+
+MACHINE = data_folder.name
+CONDITIONS = ["domain", "domain_shift_op", "domain_shift_env"]
+TDIGEST_COMPRESSION = 100
+N_BINS = 20
+MIN_ROWS = 30
+PSI_ALERT = 0.25
+KS_ALPHA = 0.01
+# A baseline spread below this share of the feature's scale is float noise
+# (std and mean of z-scored signals): such features get a single bin
+CONSTANT_RTOL = 1e-6
+
+
+class TDigest:
+    """Merging t-digest (Dunning & Ertl) over a stream of values.
+
+    Values are buffered and merged into the centroids in one vectorized pass:
+    sorted, and grouped so every centroid spans at most one unit of the k1
+    scale function, which keeps centroids small near the tails.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min, self.max = np.inf, -np.inf
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def n(self):
+        return self.weights.sum() + self._buffered
+
+    def update(self, values, weights=None):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+        keep = ~np.isnan(values)
+        values, weights = values[keep], weights[keep]
+        if not len(values):
+            return self
+        self.min, self.max = min(self.min, values.min()), max(self.max, values.max())
+        self._buffer.append((values, weights))
+        self._buffered += weights.sum()
+        if sum(len(v) for v, _ in self._buffer) >= 5 * self.compression:
+            self._compress()
+        return self
+
+    def merge(self, other):
+        other._compress()
+        self.update(other.means, other.weights)
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        means = np.concatenate([self.means] + [v for v, _ in self._buffer])
+        weights = np.concatenate([self.weights] + [w for _, w in self._buffer])
+        self._buffer, self._buffered = [], 0
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        # k1(q) = compression / (2 pi) * asin(2q - 1), at each item's centre rank
+        q = (np.cumsum(weights) - weights / 2) / weights.sum()
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.diff(cluster, prepend=-1))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def _knots(self):
+        """(value, rank) points the quantile function interpolates between."""
+        self._compress()
+        ranks = np.cumsum(self.weights) - self.weights / 2
+        return (np.concatenate([[self.min], self.means, [self.max]]),
+                np.concatenate([[0.0], ranks, [self.weights.sum()]]))
+
+    def quantile(self, q):
+        values, ranks = self._knots()
+        return np.interp(np.asarray(q) * ranks[-1], ranks, values)
+
+    def cdf(self, x):
+        values, ranks = self._knots()
+        return np.interp(x, values, ranks) / ranks[-1]
+
+    def to_dict(self):
+        self._compress()
+        return {"compression": self.compression, "means": self.means.tolist(), "weights": self.weights.tolist(),
+                "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, state):
+        digest = cls(state["compression"])
+        digest.means, digest.weights = np.array(state["means"]), np.array(state["weights"])
+        digest.min, digest.max = state["min"], state["max"]
+        return digest
+
+
+class FeatureSketch:
+    """Moments, t-digest and (once bin edges are known) histogram of one feature."""
+
+    def __init__(self, edges=None):
+        self.moments = None
+        self.digest = TDigest()
+        self.edges = None if edges is None else np.asarray(edges)
+        self.counts = None if edges is None else np.zeros(len(self.edges) + 1)
+
+    @property
+    def n(self):
+        return 0 if self.moments is None else self.moments.n
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return self
+        self.moments = merge_moments(self.moments, block_moments(values))
+        self.digest.update(values)
+        if self.edges is not None:
+            # bin i holds edges[i - 1] < x <= edges[i]
+            self.counts += np.bincount(np.searchsorted(self.edges, values, side="left"),
+                                       minlength=len(self.counts))
+        return self
+
+    @property
+    def mean(self):
+        return self.moments.mean
+
+    @property
+    def std(self):
+        return np.sqrt(self.moments.m2 / self.moments.n)
+
+    def to_dict(self):
+        return {"moments": None if self.moments is None else [float(v) for v in self.moments],
+                "digest": self.digest.to_dict(),
+                "edges": None if self.edges is None else self.edges.tolist(),
+                "counts": None if self.counts is None else self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state["edges"])
+        sketch.moments = None if state["moments"] is None else Moments(*state["moments"])
+        sketch.digest = TDigest.from_dict(state["digest"])
+        if state["counts"] is not None:
+            sketch.counts = np.array(state["counts"])
+        return sketch
+
+
+def _spread(baseline):
+    """Baseline standard deviation, floored at the float noise level."""
+    return max(baseline.std, CONSTANT_RTOL * max(abs(baseline.mean), 1.0))
+
+
+def baseline_edges(baseline):
+    """N_BINS equal-probability bins of the baseline (fewer for discrete
+    features, none for constant ones)."""
+    if baseline.std <= CONSTANT_RTOL * max(abs(baseline.mean), 1.0):
+        return np.empty(0)
+    return np.unique(baseline.digest.quantile(np.linspace(0, 1, N_BINS + 1)[1:-1]))
+
+
+def compare(baseline, sketch):
+    """Drift statistics of a monitored feature sketch against its baseline."""
+    n, m = sketch.n, baseline.n
+    expected = np.diff(np.concatenate([[0.0], baseline.digest.cdf(sketch.edges), [1.0]]))
+    actual = sketch.counts / max(n, 1)
+    # Smoothed, so empty bins don't make PSI infinite
+    e, a = np.maximum(expected, 1e-4), np.maximum(actual, 1e-4)
+    psi = float(np.sum((a - e) * np.log(a / e)))
+    ks = float(np.max(np.abs(np.cumsum(actual)[:-1] - np.cumsum(expected)[:-1]))) if len(sketch.edges) else 0.0
+    ks_critical = np.sqrt(-np.log(KS_ALPHA / 2) / 2) * np.sqrt((n + m) / (n * m)) if n and m else np.inf
+    return {
+        "rows": int(n),
+        "mean": sketch.mean if n else np.nan,
+        "baseline_mean": baseline.mean,
+        "shift_sd": abs(sketch.mean - baseline.mean) / _spread(baseline) if n else np.nan,
+        "psi": psi,
+        "ks": ks,
+        "ks_critical": ks_critical,
+        "drift": bool(n >= MIN_ROWS and (psi > PSI_ALERT or ks > ks_critical)),
+    }
+
+
+def with_conditions(frame):
+    """Add the machine, and take the domain and operating conditions of
+    segments found in the metadata from it (the domain from split_label,
+    since feature tables mislabel test segments). Other rows keep their own."""
+    frame = frame.copy()
+    if "machine" not in frame.columns:
+        frame["machine"] = MACHINE
+    if "segment_id" in frame.columns:
+        meta = build_metadata()
+        frame = with_segment_labels(frame, meta)
+        conditions = meta.drop_duplicates("segment_id").set_index("segment_id")
+        for column in CONDITIONS[1:]:
+            known = frame["segment_id"].map(conditions[column])
+            frame[column] = known.fillna(frame[column]) if column in frame.columns else known
+    return frame
+
+
+class DriftMonitor:
+    """Baseline sketches per machine, monitored sketches per (machine, condition, value)."""
+
+    def __init__(self, features=FEATURE_COLUMNS):
+        self.features = list(features)
+        self.baseline = {}  # machine -> {feature: FeatureSketch}
+        self.slices = {}    # (machine, condition, value) -> {feature: FeatureSketch}
+
+    def fit_baseline(self, frame):
+        """Baseline sketches (and bin edges) from the training rows; clears the slices."""
+        frame = with_conditions(frame)
+        self.baseline, self.slices = {}, {}
+        for machine, rows in frame.groupby("machine"):
+            self.baseline[machine] = {f: FeatureSketch().update(rows[f]) for f in self.features}
+        return self
+
+    def update(self, frame):
+        """Add monitored rows to the slice of every condition they carry."""
+        frame = with_conditions(frame)
+        unknown = set(frame["machine"]) - set(self.baseline)
+        if unknown:
+            raise ValueError(f"no baseline for machine(s) {sorted(unknown)}; run `drift_monitor.py baseline`")
+        for condition in CONDITIONS:
+            if condition not in frame.columns:
+                continue
+            for (machine, value), rows in frame.dropna(subset=[condition]).groupby(["machine", condition]):
+                sketches = self.slices.setdefault((machine, condition, str(value)), {})
+                for f in self.features:
+                    sketch = sketches.get(f) or sketches.setdefault(
+                        f, FeatureSketch(baseline_edges(self.baseline[machine][f])))
+                    sketch.update(rows[f])
+        return self
+
+    def report(self):
+        """One row per slice and feature, most drifted first."""
+        rows = [{"machine": machine, "condition": condition, "value": value, "feature": f,
+                 **compare(self.baseline[machine][f], sketch)}
+                for (machine, condition, value), sketches in self.slices.items() for f, sketch in sketches.items()]
+        columns = ["machine", "condition", "value", "feature", "rows", "mean", "baseline_mean", "shift_sd",
+                   "psi", "ks", "ks_critical", "drift"]
+        return pd.DataFrame(rows, columns=columns).sort_values(["drift", "psi"], ascending=False,
+                                                                ignore_index=True)
+
+    def save(self, path=DRIFT_STATE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {"features": self.features,
+                 "baseline": {m: {f: s.to_dict() for f, s in sketches.items()} for m, sketches in self.baseline.items()},
+                 "slices": [{"key": list(key), "sketches": {f: s.to_dict() for f, s in sketches.items()}}
+                            for key, sketches in self.slices.items()]}
+        tmp = path.with_name(f".{path.name}-{os.getpid()}")
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=DRIFT_STATE):
+        state = json.loads(Path(path).read_text())
+        monitor = cls(state["features"])
+        monitor.baseline = {m: {f: FeatureSketch.from_dict(s) for f, s in sketches.items()}
+                            for m, sketches in state["baseline"].items()}
+        monitor.slices = {tuple(entry["key"]): {f: FeatureSketch.from_dict(s) for f, s in entry["sketches"].items()}
+                          for entry in state["slices"]}
+        return monitor
+
+
+def print_report(report, show_all=False):
+    drifted = report[report["drift"]]
+    print(f"⚠️ {len(drifted)} of {len(report)} slice features drifted "
+          f"(PSI > {PSI_ALERT} or KS above its {KS_ALPHA} critical value, >= {MIN_ROWS} rows)")
+    if len(drifted):
+        summary = drifted.groupby(["machine", "condition", "value"])["feature"].agg(", ".join)
+        print(summary.to_string())
+    shown = report if show_all else drifted
+    if len(shown):
+        print("\n" + shown.round(4).to_string(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor feature drift against the training baseline")
+    parser.add_argument("--state", default=DRIFT_STATE, help="monitor state file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    baseline = sub.add_parser("baseline", help="build the baseline from training feature tables (resets slices)")
+    baseline.add_argument("files", nargs="*", default=BASELINE_FILES)
+    update = sub.add_parser("update", help="add feature rows (CSV / parquet tables) and report")
+    update.add_argument("files", nargs="+")
+    update.add_argument("--all", action="store_true", help="show every slice feature, not only the drifted ones")
+    report = sub.add_parser("report", help="report the current state")
+    report.add_argument("--all", action="store_true", help="show every slice feature, not only the drifted ones")
+    args = parser.parse_args()
+
+    read = lambda p: pd.read_csv(p) if Path(p).suffix == ".csv" else pd.read_parquet(p)  # noqa: E731
+    if args.command == "baseline":
+        frame = pd.concat([read(p) for p in args.files], ignore_index=True)
+        monitor = DriftMonitor().fit_baseline(frame)
+        monitor.save(args.state)
+        print(f"✅ Baseline of {len(frame)} rows for {', '.join(monitor.baseline)} saved to {args.state}")
+        return
+
+    monitor = DriftMonitor.load(args.state)
+    if args.command == "update":
+        frame = pd.concat([read(p) for p in args.files], ignore_index=True)
+        monitor.update(frame)
+        monitor.save(args.state)
+        print(f"📈 {len(frame)} rows added to {len(monitor.slices)} slices")
+    print_report(monitor.report(), args.all)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# embedding.py
+# 2-D embeddings of the design matrix for the visualizers, at any size.
+#
+# PCA is fitted with IncrementalPCA over chunks of the memory-mapped design
+# matrix (see preprocessing.py), so only one chunk is in memory at a time.
+# t-SNE (Barnes-Hut, O(n log n)) and UMAP (if umap-learn is installed) run
+# on a stratified subsample -- every label / split / domain group keeps its
+# share and small groups are kept whole -- after the same incremental PCA
+# down to PCA_DIMS dimensions. Only the numeric signal features are
+# embedded, not the one-hot categorical columns (e.g. domain) the groups are
+# colored by. Embeddings are cached per design matrix key
+# and parameters, so re-plotting is instant. Plots are written to images/
+# with the Agg backend, no display needed.
+import hashlib
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+from matplotlib.lines import Line2D  # noqa: E402
+from sklearn.decomposition import IncrementalPCA  # noqa: E402
+from sklearn.manifold import TSNE  # noqa: E402
+
+from preprocessing import DATA_FOLDER  # noqa: E402
+
+IMAGES_FOLDER = Path(__file__).parent.parent / 'images'
+EMBEDDING_FOLDER = DATA_FOLDER / 'embedding_cache'
+
+# Bump when the way embeddings are computed changes
+EMBEDDING_VERSION = "2"
+STRATA = ["label", "split", "domain"]
+PCA_DIMS = 50
+CHUNK_ROWS = 8192
+
+Embedding = namedtuple("Embedding", "coords index method")
+
+
+def strata(design, columns=STRATA):
+    """Group key of every row: its label / split / domain combination."""
+    meta = design.meta.assign(label=design.y)
+    present = [c for c in columns if c in meta.columns]
+    return meta[present].astype(str).agg("|".join, axis=1).to_numpy()
+
+
+def stratified_sample(groups, max_rows, min_per_group=50, seed=0):
+    """Sorted row indices: at most ~max_rows, each group proportionally
+    represented and never cut below min_per_group rows."""
+    groups = np.asarray(groups)
+    if max_rows is None or len(groups) <= max_rows:
+        return np.arange(len(groups))
+    rng = np.random.default_rng(seed)
+    picked = []
+    for group in np.unique(groups):
+        rows = np.flatnonzero(groups == group)
+        quota = max(min_per_group, round(max_rows * len(rows) / len(groups)))
+        picked.append(rows if len(rows) <= quota else rng.choice(rows, quota, replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def _chunks(n_rows, min_rows):
+    # Equal chunks of at least CHUNK_ROWS rows (each partial_fit needs >= n_components)
+    n_chunks = max(1, n_rows // max(CHUNK_ROWS, min_rows))
+    bounds = np.linspace(0, n_rows, n_chunks + 1).astype(int)
+    return zip(bounds[:-1], bounds[1:])
+
+
+def signal_columns(design):
+    """Positions of the numeric (signal feature) columns of a design matrix."""
+    return np.array([i for i, name in enumerate(design.columns) if name.startswith("numeric__")])
+
+
+def incremental_pca(X, n_components, index=None, columns=None):
+    """IncrementalPCA fitted on all rows of X (restricted to `columns`, all if
+    None) chunk by chunk; returns the projection of the rows in `index` (all
+    rows if None) as float32."""
+    columns = slice(None) if columns is None else columns
+    n_components = min(n_components, X[:1, columns].shape[1], len(X))
+    pca = IncrementalPCA(n_components=n_components)
+    for start, stop in _chunks(len(X), n_components):
+        pca.partial_fit(np.asarray(X[start:stop][:, columns], dtype=np.float32))
+    index = np.arange(len(X)) if index is None else np.asarray(index)
+    out = np.empty((len(index), n_components), dtype=np.float32)
+    for start, stop in _chunks(len(index), 1):
+        out[start:stop] = pca.transform(np.asarray(X[index[start:stop]][:, columns], dtype=np.float32))
+    return out
+
+
+def _nonlinear(Z, method, perplexity, seed):
+    if method == "tsne":
+        tsne = TSNE(n_components=2, method="barnes_hut", perplexity=min(perplexity, (len(Z) - 1) / 3),
+                    init="pca", learning_rate="auto", random_state=seed)
+        return tsne.fit_transform(Z)
+    try:
+        import umap
+    except ImportError:
+        raise ImportError("method='umap' needs umap-learn (pip install umap-learn); "
+                          "use method='tsne' instead") from None
+    reducer = umap.UMAP(n_components=2, n_neighbors=min(15, len(Z) - 1), random_state=seed)
+    return reducer.fit_transform(Z)
+
+
+def _cache_file(design, params, cache_folder):
+    digest = hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=6).hexdigest()
+    return Path(cache_folder) / design.key / f"{params['method']}-{digest}.npz"
+
+
+def embed(design, method="pca", max_rows=None, seed=42, perplexity=30, cache_folder=EMBEDDING_FOLDER,
+          rebuild=False):
+    """2-D embedding of a DesignMatrix with the rows it covers.
+
+    method     "pca" (all rows by default), "tsne" or "umap"
+    max_rows   stratified subsample size; t-SNE / UMAP default to 5000 rows
+    """
+    if method not in ("pca", "tsne", "umap"):
+        raise ValueError(f"unknown embedding method '{method}'")
+    if max_rows is None and method != "pca":
+        max_rows = 5000
+    params = {"version": EMBEDDING_VERSION, "method": method, "max_rows": max_rows, "seed": seed,
+              "perplexity": perplexity if method == "tsne" else None, "pca_dims": PCA_DIMS}
+    path = _cache_file(design, params, cache_folder)
+    if path.exists() and not rebuild:
+        with np.load(path) as cached:
+            return Embedding(cached["coords"], cached["index"], method)
+
+    index = stratified_sample(strata(design), max_rows, seed=seed)
+    columns = signal_columns(design)
+    if method == "pca":
+        coords = incremental_pca(design.X, 2, index, columns)
+    else:
+        coords = _nonlinear(incremental_pca(design.X, PCA_DIMS, index, columns), method, perplexity, seed)
+    coords = np.asarray(coords, dtype=np.float32)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.stem}-{os.getpid()}.npz")
+    np.savez(tmp, coords=coords, index=index)
+    os.replace(tmp, path)
+    return Embedding(coords, index, method)
+
+
+def scatter(coords, groups, legend, title, filename, axes=("Dim1", "Dim2"), seed=0):
+    """Scatter plot of `coords` colored by `groups`, saved to images/`filename`.
+
+    legend maps a group value to (label, color). Points are drawn in random
+    order so no group hides another, and marker size and opacity shrink as
+    the number of points grows.
+    """
+    groups = np.asarray(groups)
+    keep = np.isin(groups, list(legend))
+    order = np.random.default_rng(seed).permutation(np.flatnonzero(keep))
+    colors = [legend[g][1] for g in groups[order]]
+    n = len(order)
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.scatter(coords[order, 0], coords[order, 1], c=colors, s=min(20.0, max(1.0, 20000 / max(n, 1))),
+               alpha=0.6 if n < 20000 else 0.3, linewidths=0, rasterized=True)
+    handles = [Line2D([], [], marker="o", linestyle="", color=color, label=f"{label} ({np.sum(groups == g)})")
+               for g, (label, color) in legend.items() if np.any(groups == g)]
+    ax.legend(handles=handles)
+    ax.set_title(title)
+    ax.set_xlabel(axes[0])
+    ax.set_ylabel(axes[1])
+
+    IMAGES_FOLDER.mkdir(parents=True, exist_ok=True)
+    path = IMAGES_FOLDER / filename
+    fig.savefig(path, dpi=120, bbox_inches="tight")
+    plt.close(fig)
+    print(f"🖼️ Saved {path}")
+    return path
@@ -0,0 +1,138 @@
+# feature_cache.py
+# Persistent feature cache keyed by segment_id + source parquet hash +
+# feature-set version, so reruns only extract new or changed segments.
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from features import DEFAULT_BANKS, FEATURE_SET_VERSION, bank_columns
+from ingestion import segment_path
+
+CACHE_PATH = Path(__file__).parent.parent / 'data' / 'feature_cache'
+
+SOURCES_FILE = "sources.parquet"
+KEY_COLUMNS = ["segment_id", "source_hash", "feature_version"]
+
+
+def file_hash(path, block_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_atomic(df, path):
+    tmp = path.with_name(path.name + ".tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+class FeatureCache:
+    """Feature rows for previously extracted segments.
+
+    Each feature-bank configuration gets its own features file, so switching
+    between feature sets doesn't evict the other one. Content hashes of the
+    source parquet files are shared and remembered together with their size
+    and mtime, so an unchanged file is never read twice.
+    """
+
+    def __init__(self, path=CACHE_PATH, banks=DEFAULT_BANKS, layout=None):
+        self.path = Path(path)
+        self.sensors = list(banks)
+        self.columns = bank_columns(banks, layout or {"mic": ["waveform"]})
+        signature = FEATURE_SET_VERSION + "|" + "|".join(
+            f"{sensor}:{bank.signature}" for sensor, bank in banks.items())
+        self.version = hashlib.blake2b(signature.encode(), digest_size=6).hexdigest()
+        self._features_file = self.path / f"features_{self.version}.parquet"
+        sources_file = self.path / SOURCES_FILE
+        if self._features_file.exists():
+            self.features = pd.read_parquet(self._features_file)
+        else:
+            self.features = pd.DataFrame(columns=KEY_COLUMNS + self.columns)
+        if sources_file.exists():
+            sources = pd.read_parquet(sources_file)
+            self._sources = {r.path: (r.size, r.mtime_ns, r.hash) for r in sources.itertuples()}
+        else:
+            self._sources = {}
+
+    def __len__(self):
+        return len(self.features)
+
+    def source_hash(self, path):
+        """Content hash of a source file, or "" if it doesn't exist."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return ""
+        known = self._sources.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+        digest = file_hash(path)
+        self._sources[path] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def keys(self, index):
+        """Cache keys for waveform store index rows (same index as `index`).
+
+        With several sensors the key combines the hashes of all their files.
+        """
+        hashes = []
+        sources = zip(*(index[f"{sensor}_source"] for sensor in self.sensors))
+        for split, files in zip(index["split"], sources):
+            parts = [self.source_hash(segment_path(f, split)) for f in files]
+            hashes.append("" if "" in parts else "+".join(parts))
+        return pd.DataFrame({"segment_id": index["segment_id"].to_numpy(),
+                             "source_hash": hashes,
+                             "feature_version": self.version}, index=index.index)
+
+    def lookup(self, keys):
+        """Split keys into (cached feature rows, keys that still need extraction).
+
+        Keys without a source hash (missing parquet file) are never cache hits.
+        """
+        merged = keys[KEY_COLUMNS].merge(self.features, on=KEY_COLUMNS, how="left", indicator=True)
+        merged.index = keys.index
+        hit = (merged["_merge"] == "both") & (keys["source_hash"] != "")
+        # The left join upcasts columns when some keys miss; restore cached dtypes
+        cached = merged.loc[hit, self.columns].astype(self.features[self.columns].dtypes.to_dict())
+        return cached, keys[~hit]
+
+    def update(self, keys, features):
+        """Insert or replace the cached rows for the given segments."""
+        new = pd.concat([keys[KEY_COLUMNS], features[self.columns]], axis=1)
+        new = new[new["source_hash"] != ""]
+        kept = self.features[~self.features["segment_id"].isin(new["segment_id"])]
+        self.features = pd.concat([kept, new], ignore_index=True) if len(kept) else new.reset_index(drop=True)
+
+    def invalidate(self, segment_ids=None, all_banks=False):
+        """Drop the given segments, or everything if None/empty, from the
+        features of this bank configuration, or of every one with all_banks."""
+        if not segment_ids:
+            self.features = self.features.iloc[0:0]
+            self._sources = {}
+        else:
+            self.features = self.features[~self.features["segment_id"].isin(segment_ids)]
+        if not all_banks:
+            return
+        # The other configurations' files are rewritten right away; ours on save()
+        for path in self.path.glob("features_*.parquet"):
+            if path == self._features_file:
+                continue
+            if not segment_ids:
+                path.unlink()
+            else:
+                other = pd.read_parquet(path)
+                _write_atomic(other[~other["segment_id"].isin(segment_ids)], path)
+
+    def save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self.features.reset_index(drop=True), self._features_file)
+        sources = pd.DataFrame([(p, size, mtime, digest) for p, (size, mtime, digest) in self._sources.items()],
+                               columns=["path", "size", "mtime_ns", "hash"])
+        sources["size"] = sources["size"].astype(np.int64)
+        sources["mtime_ns"] = sources["mtime_ns"].astype(np.int64)
+        _write_atomic(sources, self.path / SOURCES_FILE)
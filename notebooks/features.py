@@ -0,0 +1,438 @@
+# features.py
+# Statistical & frequency features for waveform segments, per signal or batched.
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import skew, kurtosis
+from scipy.fft import fft, rfft
+
+from waveform_store import WaveformStore
+
+FEATURE_COLUMNS = ["mean", "std", "skew", "kurt", "max", "min", "freq_peak", "signal_energy"]
+
+# Bump whenever the feature definitions change; cached features of an older
+# version are then re-extracted (see feature_cache.py)
+FEATURE_SET_VERSION = "1"
+
+
+# Helper: extract statistical & frequency features
+def extract_features(signal):
+    # Handle NaNs or empty signals
+    if signal is None or len(signal) == 0:
+        return {
+            "mean": np.nan, "std": np.nan, "skew": np.nan, "kurt": np.nan,
+            "max": np.nan, "min": np.nan, "freq_peak": np.nan, "signal_energy": np.nan
+        }
+
+    # Normalize (z-score)
+    signal = (signal - np.mean(signal)) / (np.std(signal) + 1e-8)
+
+    # Statistical features
+    mean_val = np.mean(signal)
+    std_val = np.std(signal)
+    skew_val = skew(signal)
+    kurt_val = kurtosis(signal)
+    max_val = np.max(signal)
+    min_val = np.min(signal)
+
+    # Frequency-domain features
+    fft_vals = np.abs(fft(signal))
+    freq_peak = np.argmax(fft_vals)
+    energy = np.sum(fft_vals**2)
+
+    return {
+        "mean": mean_val, "std": std_val, "skew": skew_val, "kurt": kurt_val,
+        "max": max_val, "min": min_val, "freq_peak": freq_peak, "signal_energy": energy
+    }
+
+
+# ---- Feature bank -------------------------------------------------------
+# Features are registered by name and computed on a whole (n_segments,
+# n_samples) batch. They read shared intermediate results (z-scored signal,
+# moments, spectra) from a SpectralContext, which computes each of them at
+# most once per batch and only if an enabled feature asks for it.
+
+# Sampling rates (Hz) of the STWIN.box sensors as configured for IMAD-DS
+SAMPLE_RATES = {"mic": 16000, "acc": 7680, "gyro": 7680}
+
+FEATURE_REGISTRY = {}
+
+
+def register_feature(name, columns=None):
+    """Register fn(ctx) -> array (or {column: array}) under `name`.
+
+    `columns(bank)` lists the output columns when there are several of them
+    (e.g. one per frequency band); by default the feature is one column.
+    """
+    def decorator(fn):
+        FEATURE_REGISTRY[name] = (fn, columns or (lambda bank: [name]))
+        return fn
+    return decorator
+
+
+class SpectralContext:
+    """Lazily computed intermediates shared by all features of one batch."""
+
+    def __init__(self, signals, bank):
+        self.x = signals
+        self.bank = bank
+        self.n = signals.shape[1]
+        self._cache = {}
+
+    def _get(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def z(self):
+        # Normalize (z-score), like extract_features()
+        def compute():
+            z = self.x - np.mean(self.x, axis=1, keepdims=True)
+            z /= np.std(self.x, axis=1, keepdims=True) + 1e-8
+            return z
+        return self._get("z", compute)
+
+    @property
+    def moments(self):
+        """(mean, m2, m3, m4) of the z-scored signal.
+
+        Same operation order as np.std and scipy's skew/kurtosis, without
+        re-centring the array once per statistic.
+        """
+        def compute():
+            mean = np.mean(self.z, axis=1)
+            d = self.z - mean[:, None]
+            d2 = d * d
+            m2 = np.mean(d2, axis=1)
+            d *= d2
+            m3 = np.mean(d, axis=1)
+            d2 *= d2
+            m4 = np.mean(d2, axis=1)
+            return mean, m2, m3, m4
+        return self._get("moments", compute)
+
+    @property
+    def power(self):
+        """One-sided power |rfft(z)|^2 over the full segment length.
+
+        Only the whole-segment peak needs it: the STFT frames are too short
+        for its resolution, and the energy comes from the moments.
+        """
+        def compute():
+            spectrum = rfft(self.z, axis=1)
+            power = spectrum.real ** 2
+            power += spectrum.imag ** 2
+            return power
+        return self._get("power", compute)
+
+    @property
+    def frames(self):
+        """STFT periodograms (n_segments, n_frames, n_bins), PSD-scaled.
+
+        Hann-windowed, mean-removed frames of `nperseg` samples with 50%
+        overlap. This is the only framed FFT: the Welch PSD and every STFT
+        statistic are derived from it.
+        """
+        def compute():
+            nperseg = min(self.bank.nperseg, self.n)
+            hop = max(nperseg // 2, 1)
+            window = np.hanning(nperseg + 1)[:-1]  # periodic Hann, as scipy.signal.get_window
+            framed = np.lib.stride_tricks.sliding_window_view(self.x, nperseg, axis=1)[:, ::hop]
+            framed = framed - framed.mean(axis=2, keepdims=True)
+            framed *= window
+            spectrum = rfft(framed, axis=2)
+            frames = spectrum.real ** 2
+            frames += spectrum.imag ** 2
+            frames /= self.bank.fs * np.sum(window ** 2)
+            # one-sided density: double everything but DC (and Nyquist)
+            if nperseg % 2 == 0:
+                frames[..., 1:-1] *= 2
+            else:
+                frames[..., 1:] *= 2
+            return frames
+        return self._get("frames", compute)
+
+    @property
+    def frame_freqs(self):
+        nperseg = min(self.bank.nperseg, self.n)
+        return np.fft.rfftfreq(nperseg, d=1.0 / self.bank.fs)
+
+    @property
+    def psd(self):
+        """Welch PSD: the mean of the STFT periodograms."""
+        return self._get("psd", lambda: self.frames.mean(axis=1))
+
+
+@register_feature("mean")
+def _mean(ctx):
+    return ctx.moments[0]
+
+
+@register_feature("std")
+def _std(ctx):
+    return np.sqrt(ctx.moments[1])
+
+
+@register_feature("skew")
+def _skew(ctx):
+    _, m2, m3, _ = ctx.moments
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return m3 / m2 ** 1.5
+
+
+@register_feature("kurt")
+def _kurt(ctx):
+    _, m2, _, m4 = ctx.moments
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return m4 / m2 ** 2.0 - 3.0
+
+
+@register_feature("max")
+def _max(ctx):
+    return np.max(ctx.z, axis=1)
+
+
+@register_feature("min")
+def _min(ctx):
+    return np.min(ctx.z, axis=1)
+
+
+@register_feature("freq_peak")
+def _freq_peak(ctx):
+    # For real input the full FFT is conjugate-symmetric, so the peak bin of
+    # the mirrored spectrum is found in the one-sided half
+    return np.argmax(ctx.power, axis=1)
+
+
+@register_feature("freq_peak_hz")
+def _freq_peak_hz(ctx):
+    return np.argmax(ctx.power, axis=1) * ctx.bank.fs / ctx.n
+
+
+@register_feature("signal_energy")
+def _signal_energy(ctx):
+    # Energy of the full spectrum without an FFT (Parseval):
+    # sum |FFT(z)|^2 = n * sum(z^2) = n^2 * (m2 + mean^2)
+    mean, m2, _, _ = ctx.moments
+    return ctx.n * ctx.n * (m2 + mean * mean)
+
+
+@register_feature("rms")
+def _rms(ctx):
+    return np.sqrt(np.mean(ctx.x ** 2, axis=1))
+
+
+@register_feature("crest_factor")
+def _crest_factor(ctx):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.max(np.abs(ctx.x), axis=1) / _rms(ctx)
+
+
+@register_feature("zero_crossing_rate")
+def _zero_crossing_rate(ctx):
+    signs = np.signbit(ctx.z)
+    return np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(ctx.n - 1, 1)
+
+
+def _band_columns(bank):
+    return [f"band_power_{lo:g}_{hi:g}" for lo, hi in bank.bands]
+
+
+@register_feature("band_power", columns=_band_columns)
+def _band_power(ctx):
+    freqs, psd = ctx.frame_freqs, ctx.psd
+    df = freqs[1] - freqs[0] if len(freqs) > 1 else 0.0
+    out = {}
+    for col, (lo, hi) in zip(_band_columns(ctx.bank), ctx.bank.bands):
+        in_band = (freqs >= lo) & (freqs < hi)
+        out[col] = psd[:, in_band].sum(axis=1) * df
+    return out
+
+
+@register_feature("spectral_centroid")
+def _spectral_centroid(ctx):
+    psd = ctx.psd
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return psd @ ctx.frame_freqs / psd.sum(axis=1)
+
+
+@register_feature("spectral_rolloff")
+def _spectral_rolloff(ctx):
+    cumulative = np.cumsum(ctx.psd, axis=1)
+    reached = cumulative >= ctx.bank.rolloff * cumulative[:, -1:]
+    return ctx.frame_freqs[np.argmax(reached, axis=1)]
+
+
+@register_feature("spectral_flatness")
+def _spectral_flatness(ctx):
+    psd = ctx.psd + 1e-20
+    return np.exp(np.mean(np.log(psd), axis=1)) / np.mean(psd, axis=1)
+
+
+_STFT_COLUMNS = ["stft_energy_mean", "stft_energy_std", "stft_centroid_std", "stft_flux_mean"]
+
+
+@register_feature("stft_stats", columns=lambda bank: list(_STFT_COLUMNS))
+def _stft_stats(ctx):
+    frames = ctx.frames
+    energy = frames.sum(axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        centroid = frames @ ctx.frame_freqs / energy
+        shape = frames / energy[..., None]
+    flux = np.sqrt((np.diff(shape, axis=1) ** 2).sum(axis=2))
+    return {
+        "stft_energy_mean": energy.mean(axis=1),
+        "stft_energy_std": energy.std(axis=1),
+        "stft_centroid_std": centroid.std(axis=1),
+        "stft_flux_mean": flux.mean(axis=1) if flux.shape[1] else np.zeros(len(frames)),
+    }
+
+
+DEFAULT_BANDS = [(0, 250), (250, 500), (500, 1000), (1000, 2000), (2000, 4000), (4000, 8000)]
+
+# Enabled features per sensor; the mic keeps the original eight columns by default
+SENSOR_FEATURES = {
+    "mic": list(FEATURE_COLUMNS),
+    "acc": ["rms", "crest_factor", "kurt", "freq_peak_hz", "band_power", "spectral_centroid"],
+    "gyro": ["rms", "crest_factor", "kurt", "freq_peak_hz", "spectral_centroid"],
+}
+ALL_FEATURES = list(FEATURE_COLUMNS) + [
+    "freq_peak_hz", "rms", "crest_factor", "zero_crossing_rate", "band_power",
+    "spectral_centroid", "spectral_rolloff", "spectral_flatness", "stft_stats",
+]
+
+
+class FeatureBank:
+    """A named subset of registered features with its spectral settings."""
+
+    def __init__(self, features=FEATURE_COLUMNS, fs=SAMPLE_RATES["mic"], bands=None,
+                 nperseg=1024, rolloff=0.85):
+        unknown = [name for name in features if name not in FEATURE_REGISTRY]
+        if unknown:
+            raise ValueError(f"Unknown feature(s): {unknown}; registered: {sorted(FEATURE_REGISTRY)}")
+        self.features = list(features)
+        self.fs = fs
+        self.bands = [(lo, hi) for lo, hi in (bands or DEFAULT_BANDS) if lo < fs / 2]
+        self.nperseg = nperseg
+        self.rolloff = rolloff
+
+    @classmethod
+    def for_sensor(cls, sensor, features=None, **kwargs):
+        features = SENSOR_FEATURES[sensor] if features is None else features
+        return cls(features, fs=SAMPLE_RATES[sensor], **kwargs)
+
+    @property
+    def columns(self):
+        return [col for name in self.features for col in FEATURE_REGISTRY[name][1](self)]
+
+    @property
+    def signature(self):
+        """Identifies the configuration, e.g. for feature cache keys."""
+        return f"{self.features}|{self.fs}|{self.bands}|{self.nperseg}|{self.rolloff}"
+
+    def compute(self, signals):
+        """{column: array} for a 2-D (n_segments, n_samples) batch."""
+        signals = np.asarray(signals, dtype=np.float64)
+        if signals.shape[1] == 0:
+            return {col: np.full(len(signals), np.nan) for col in self.columns}
+        ctx = SpectralContext(signals, self)
+        out = {}
+        for name in self.features:
+            values = FEATURE_REGISTRY[name][0](ctx)
+            out.update(values if isinstance(values, dict) else {name: values})
+        return out
+
+
+def extract_features_batch(signals):
+    """Vectorized extract_features() for a 2-D (n_segments, n_samples) array.
+
+    Every statistic is computed along axis 1 in one call; the spectrum comes
+    from a single real FFT per segment. Returns {column: array}.
+    """
+    return FeatureBank().compute(signals)
+
+
+def _column_prefix(sensor, axis):
+    # The mic keeps the historical, unprefixed column names
+    return "" if sensor == "mic" else f"{sensor}_{axis}_"
+
+
+def bank_columns(banks, layout):
+    """Output columns of {sensor: FeatureBank} over a store layout."""
+    return [_column_prefix(sensor, axis) + col
+            for sensor, bank in banks.items() for axis in layout[sensor] for col in bank.columns]
+
+
+DEFAULT_BANKS = {"mic": FeatureBank()}
+
+
+def _plan_chunks(rows, chunk_size, sensors):
+    """Split index rows into chunks whose segments have equal lengths per sensor."""
+    length_cols = [f"{sensor}_length" for sensor in sensors]
+    for lengths, group in rows.groupby(length_cols, sort=False):
+        for start in range(0, len(group), chunk_size):
+            yield group.iloc[start:start + chunk_size]
+
+
+def _chunk_features(store, positions, banks):
+    out = {}
+    for sensor, bank in banks.items():
+        length = int(store.index.at[positions[0], f"{sensor}_length"])
+        for axis in store.layout[sensor]:
+            batch = np.empty((len(positions), length), dtype=np.float64)
+            for j, i in enumerate(positions):
+                batch[j] = store.segment(i, sensor, axis)
+            prefix = _column_prefix(sensor, axis)
+            out.update({prefix + col: values for col, values in bank.compute(batch).items()})
+    return out
+
+
+_worker_stores = {}
+
+
+def _worker_chunk(args):
+    # Each worker opens the store once and slices segments out of the shared
+    # memory map; only the store path, row positions and the (small) feature
+    # banks cross the process boundary
+    path, positions, banks = args
+    if path not in _worker_stores:
+        _worker_stores[path] = WaveformStore(path)
+    return _chunk_features(_worker_stores[path], positions, banks)
+
+
+def iter_feature_chunks(store, rows=None, chunk_size=64, workers=1, banks=None):
+    """Yield (index rows, {column: array}) for a WaveformStore, chunk by chunk.
+
+    `banks` maps sensor -> FeatureBank (default: the original eight mic
+    features); multi-axis sensors get one set of columns per axis.
+    Segments are grouped by length so each chunk stacks into one 2-D array.
+    Empty segments get NaN features, like extract_features(). With
+    workers > 1 the chunks are spread over a process pool whose workers
+    attach to the store's memmap instead of receiving pickled waveforms;
+    chunks are still yielded in the order they were planned.
+    """
+    rows = store.index if rows is None else rows
+    banks = banks or DEFAULT_BANKS
+    chunks = list(_plan_chunks(rows, chunk_size, banks))
+    if workers == 1:
+        for chunk in chunks:
+            yield chunk, _chunk_features(store, list(chunk.index), banks)
+        return
+
+    tasks = [(str(store.path), list(chunk.index), banks) for chunk in chunks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from zip(chunks, pool.map(_worker_chunk, tasks))
+
+
+def extract_store_features(store, rows=None, chunk_size=64, workers=1, banks=None):
+    """Feature DataFrame for the given index rows, in the same (segment) order."""
+    rows = store.index if rows is None else rows
+    banks = banks or DEFAULT_BANKS
+    columns = bank_columns(banks, store.layout)
+    frames = [pd.DataFrame(feats, index=chunk.index)
+              for chunk, feats in iter_feature_chunks(store, rows, chunk_size, workers, banks)]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames).loc[rows.index, columns]
@@ -0,0 +1,551 @@
+# graph_loader.py
+# Load segments, sensors, faults, training runs, predictions and maintenance logs into the knowledge graph.
+#
+#   python graph_loader.py sync                                     # in-process SQLite graph
+#   python graph_loader.py --neo4j bolt://localhost:7687 sync       # Neo4j, password from $NEO4J_PASSWORD
+#   python graph_loader.py --predictions predictions.csv --neo4j neo4j+s://<id>.databases.neo4j.io sync
+#   python graph_loader.py --logs ../data/unstructured/maintenance.log sync
+#   python graph_loader.py import-files ../data/graph/import        # CSVs for neo4j-admin database import
+#   python graph_loader.py --neo4j bolt://localhost:7687 import-files ../data/graph/import --mark-synced
+#
+# Graph (every node is keyed by its first property):
+#   (:Segment {segment_id, split, domain, label, split_label})
+#   (:Segment)-[:RECORDED_BY {file}]->(:Sensor {name, kind})      parquet file of each sensor
+#   (:Segment)-[:HAS_FAULT]->(:Fault {name})                       anomalous segments only
+#   (:Segment)-[:AT_SPEED]->(:Speed {name})                        domain_shift_op
+#   (:Segment)-[:IN_ENVIRONMENT]->(:Environment {name})            domain_shift_env
+#   (:Run {run_id, model, f1, ...})-[:PRODUCED]->(:ModelVersion {version, model})   metrics_store.py
+#   (:ModelVersion)-[:PREDICTED {score, prediction}]->(:Segment)   score.py --out files
+#   (:LogEntry {entry_id, timestamp, text, source})                 one per log line with entities (log_parser.py)
+#   (:LogEntry)-[:MENTIONS]->(:Sensor), -[:REPORTS]->(:Fault), -[:PERFORMED]->(:Action {name})
+#
+# Nodes are MERGEd on their key (backed by a unique constraint) and
+# relationships on their two endpoints, so loading twice changes nothing.
+# Syncs are incremental: the hash of every row written to a graph is kept in
+# a small SQLite state file, and only new or changed rows are sent again.
+# Rows gone from the metadata or the runs store are deleted from the graph
+# (a segment whose environment changed loses its old IN_ENVIRONMENT);
+# predictions and log entries only accumulate. Deleting a node also deletes
+# its relationships, so those are dropped from the state too: a prediction
+# for a deleted segment is written again (onto a bare Segment) next time.
+# Nodes go first, then relationships, in batches of --batch-size rows per
+# UNWIND transaction. Millions of segments are best loaded offline once
+# (import-files --mark-synced); the nightly sync then only sends what
+# changed since.
+#
+# Without a server, SQLiteGraph keeps the same graph in one SQLite file and
+# SQLiteGraph.to_networkx() turns it into a networkx MultiDiGraph to query.
+import argparse
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ingestion import SENSORS, build_metadata
+from log_parser import entry_ids, parse_logs
+from metrics_store import query_runs
+
+GRAPH_FOLDER = Path(__file__).parent.parent / 'data' / 'graph'
+GRAPH_DB = GRAPH_FOLDER / 'graph.sqlite'
+SYNC_DB = GRAPH_FOLDER / 'sync_state.sqlite'
+BATCH_SIZE = 10_000
+
+# label -> key property
+NODE_KEYS = {
+    "Segment": "segment_id",
+    "Sensor": "name",
+    "Fault": "name",
+    "Speed": "name",
+    "Environment": "name",
+    "Run": "run_id",
+    "ModelVersion": "version",
+    "LogEntry": "entry_id",
+    "Action": "name",
+}
+# log_parser.py entity kind -> relationship from its LogEntry
+LOG_RELATIONSHIPS = {"sensor": ("MENTIONS", "Sensor"), "fault": ("REPORTS", "Fault"),
+                     "action": ("PERFORMED", "Action")}
+RUN_PROPERTIES = ["run_id", "created", "model", "source", "data_hash", "params",
+                  "accuracy", "precision", "recall", "f1", "fit_seconds", "n_jobs"]
+
+# frame: the key column plus properties. A complete set is a snapshot of its
+# source: rows synced earlier but missing from it are deleted from the graph
+NodeSet = namedtuple("NodeSet", "label frame complete")
+# frame: "src" and "dst" keys plus properties
+EdgeSet = namedtuple("EdgeSet", "type src_label dst_label frame complete")
+
+
+def node_set(label, frame, complete=True):
+    key = NODE_KEYS[label]
+    frame = frame.astype({key: str}).drop_duplicates(key, keep="last")
+    return NodeSet(label, frame.reset_index(drop=True), complete)
+
+
+def edge_set(type, src_label, dst_label, frame, complete=True):
+    frame = frame.astype({"src": str, "dst": str}).drop_duplicates(["src", "dst"], keep="last")
+    return EdgeSet(type, src_label, dst_label, frame.reset_index(drop=True), complete)
+
+
+def segment_graph(meta=None):
+    """Segments with their sensors, faults and operating conditions (ingestion.build_metadata())."""
+    meta = build_metadata() if meta is None else meta
+    nodes = [
+        node_set("Segment", meta[["segment_id", "split", "domain", "label", "split_label"]]),
+        node_set("Sensor", pd.DataFrame({"name": [column for column, _ in SENSORS.values()],
+                                         "kind": list(SENSORS)})),
+    ]
+    faults = meta[meta["anomaly_label"] != "normal"]
+    edges = []
+    for type, label, rows, column in [("HAS_FAULT", "Fault", faults, "anomaly_label"),
+                                      ("AT_SPEED", "Speed", meta, "domain_shift_op"),
+                                      ("IN_ENVIRONMENT", "Environment", meta, "domain_shift_env")]:
+        nodes.append(node_set(label, pd.DataFrame({"name": rows[column].dropna().unique()})))
+        edges.append(edge_set(type, "Segment", label,
+                              pd.DataFrame({"src": rows["segment_id"], "dst": rows[column]}).dropna()))
+    recorded = [pd.DataFrame({"src": meta["segment_id"], "dst": column, "file": meta[column]})
+                for column, _ in SENSORS.values() if column in meta.columns]
+    edges.append(edge_set("RECORDED_BY", "Segment", "Sensor", pd.concat(recorded).dropna()))
+    return nodes, edges
+
+
+def run_graph(runs=None):
+    """Training runs and the model versions they registered (metrics_store.py)."""
+    runs = query_runs() if runs is None else runs
+    nodes = [node_set("Run", runs[[c for c in RUN_PROPERTIES if c in runs.columns]])]
+    versioned = runs.dropna(subset=["model_version"]) if "model_version" in runs.columns else runs.iloc[:0]
+    nodes.append(node_set("ModelVersion", pd.DataFrame({"version": versioned["model_version"],
+                                                        "model": versioned["model"]})))
+    edges = [edge_set("PRODUCED", "Run", "ModelVersion",
+                      pd.DataFrame({"src": versioned["run_id"], "dst": versioned["model_version"]}))]
+    return nodes, edges
+
+
+def prediction_graph(paths, model_version=None):
+    """PREDICTED relationships from score.py --out files.
+
+    Files without a model_version column (a model scored from a plain file)
+    need `model_version`. The latest row wins for a version and segment.
+    Predictions only add up: those of files not given again are kept.
+    """
+    frame = pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+    if "model_version" not in frame.columns or frame["model_version"].isna().any():
+        if model_version is None:
+            raise ValueError("predictions without a model_version column need --model-version")
+        frame["model_version"] = frame.get("model_version", pd.Series(index=frame.index, dtype=object)) \
+            .fillna(model_version)
+    edges = [edge_set("PREDICTED", "ModelVersion", "Segment",
+                      pd.DataFrame({"src": frame["model_version"], "dst": frame["segment_id"],
+                                    "score": frame["score"], "prediction": frame["prediction"]}),
+                      complete=False)]
+    return [], edges
+
+
+def log_graph(paths, workers=None):
+    """Log lines and the sensors, faults and actions they mention (log_parser.py).
+
+    Entries are keyed by file name and line number, so a log that grows only
+    sends its new lines. Like predictions, entries only add up.
+    """
+    entities = pd.concat(parse_logs(paths, workers), ignore_index=True)
+    entities["entry_id"] = entry_ids(entities)
+    entries = entities.drop_duplicates("entry_id")
+    nodes = [node_set("LogEntry", pd.DataFrame({"entry_id": entries["entry_id"],
+                                                "timestamp": entries["timestamp"].dt.strftime("%Y-%m-%dT%H:%M:%S"),
+                                                "text": entries["text"], "source": entries["source"]}),
+                      complete=False)]
+    edges = []
+    for kind, (type, label) in LOG_RELATIONSHIPS.items():
+        rows = entities[entities["kind"] == kind]
+        edges.append(edge_set(type, "LogEntry", label, pd.DataFrame({"src": rows["entry_id"], "dst": rows["value"]}),
+                              complete=False))
+    return nodes, edges
+
+
+def _records(frame):
+    """Row dicts with plain Python values and None for missing ones."""
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+
+def _edge_records(frame):
+    props = frame.drop(columns=["src", "dst"])
+    # A frame without columns has no records at all
+    props = _records(props) if len(props.columns) else [{}] * len(frame)
+    return [{"src": s, "dst": d, "props": p} for s, d, p in zip(frame["src"], frame["dst"], props)]
+
+
+class SyncState:
+    """Hash of every row last written to each graph target, to skip unchanged rows."""
+
+    def __init__(self, path=SYNC_DB):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS synced (
+            target TEXT, kind TEXT, key TEXT, hash INTEGER, dst TEXT,
+            PRIMARY KEY (target, kind, key)) WITHOUT ROWID""")
+        # Relationship keys are "src \x1f dst": src is a prefix of the primary
+        # key, dst gets an index of its own (added to state files from before)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(synced)")]
+        with self.conn:
+            if "dst" not in columns:
+                self.conn.execute("ALTER TABLE synced ADD COLUMN dst TEXT")
+                self.conn.execute("UPDATE synced SET dst = substr(key, instr(key, char(31)) + 1) "
+                                  "WHERE kind LIKE 'edge:%'")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS synced_by_dst ON synced (target, kind, dst) "
+                              "WHERE dst IS NOT NULL")
+
+    def known(self, target, kind):
+        """Keys and row hashes of one set as last written to `target`."""
+        known = pd.read_sql_query("SELECT key, hash FROM synced WHERE target = ? AND kind = ?",
+                                  self.conn, params=[target, kind])
+        return pd.Index(known["key"]), known["hash"].to_numpy(dtype=np.int64)
+
+    def mark(self, target, kind, keys, hashes):
+        edge = kind.startswith("edge:")
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO synced VALUES (?, ?, ?, ?, ?)",
+                                  ((target, kind, k, h, k.split("\x1f", 1)[1] if edge else None)
+                                   for k, h in zip(keys, hashes.tolist())))
+
+    def unmark(self, target, kind, keys):
+        with self.conn:
+            self.conn.executemany("DELETE FROM synced WHERE target = ? AND kind = ? AND key = ?",
+                                  ((target, kind, k) for k in keys))
+
+    def kinds(self, target):
+        """Sets recorded for `target`, found by skipping through the primary key."""
+        return [kind for (kind,) in self.conn.execute("""
+            WITH RECURSIVE kinds(kind) AS (
+                SELECT MIN(kind) FROM synced WHERE target = ?1
+                UNION ALL
+                SELECT (SELECT MIN(kind) FROM synced WHERE target = ?1 AND kind > kinds.kind)
+                FROM kinds WHERE kinds.kind IS NOT NULL)
+            SELECT kind FROM kinds WHERE kind IS NOT NULL""", (target,))]
+
+    def unmark_incident(self, target, label, keys):
+        """Forget the relationships of deleted `label` nodes, with one indexed
+        lookup per node and relationship set."""
+        with self.conn:
+            for kind in self.kinds(target):
+                if not kind.startswith("edge:"):
+                    continue
+                _, _, src_label, dst_label = kind.split(":")
+                if src_label == label:
+                    # Keys "k\x1f..." sort between "k\x1f" and "k\x20"
+                    self.conn.executemany("DELETE FROM synced WHERE target = ? AND kind = ? "
+                                          "AND key >= ? AND key < ?",
+                                          ((target, kind, k + "\x1f", k + "\x20") for k in keys))
+                if dst_label == label:
+                    self.conn.executemany("DELETE FROM synced WHERE target = ? AND kind = ? AND dst = ?",
+                                          ((target, kind, k) for k in keys))
+
+    def forget(self, target):
+        with self.conn:
+            self.conn.execute("DELETE FROM synced WHERE target = ?", (target,))
+
+    def close(self):
+        self.conn.close()
+
+
+class Neo4jGraph:
+    """Batched UNWIND ... MERGE writes through the official driver (pip install neo4j)."""
+
+    def __init__(self, uri, user="neo4j", password=None, database=None):
+        from neo4j import GraphDatabase
+
+        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        self.database = database
+        self.target = self.target_name(uri, database)
+
+    @staticmethod
+    def target_name(uri, database=None):
+        """Name of a database in the sync state."""
+        return f"{uri}/{database or 'default'}"
+
+    def prepare(self):
+        with self.driver.session(database=self.database) as session:
+            for label, key in NODE_KEYS.items():
+                session.run(f"CREATE CONSTRAINT {label.lower()}_{key} IF NOT EXISTS "
+                            f"FOR (n:{label}) REQUIRE n.{key} IS UNIQUE").consume()
+
+    def _write(self, query, rows):
+        with self.driver.session(database=self.database) as session:
+            session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+
+    def write_nodes(self, label, frame):
+        key = NODE_KEYS[label]
+        self._write(f"UNWIND $rows AS row MERGE (n:{label} {{{key}: row.{key}}}) SET n += row", _records(frame))
+
+    def write_edges(self, type, src_label, dst_label, frame):
+        # Endpoints are MERGEd too: a prediction for a segment the metadata
+        # doesn't know still lands on a (bare) Segment node
+        self._write(f"UNWIND $rows AS row "
+                    f"MERGE (a:{src_label} {{{NODE_KEYS[src_label]}: row.src}}) "
+                    f"MERGE (b:{dst_label} {{{NODE_KEYS[dst_label]}: row.dst}}) "
+                    f"MERGE (a)-[r:{type}]->(b) SET r += row.props", _edge_records(frame))
+
+    def delete_nodes(self, label, keys):
+        self._write(f"UNWIND $rows AS key MATCH (n:{label} {{{NODE_KEYS[label]}: key}}) DETACH DELETE n",
+                    list(keys))
+
+    def delete_edges(self, type, src_label, dst_label, frame):
+        self._write(f"UNWIND $rows AS row "
+                    f"MATCH (:{src_label} {{{NODE_KEYS[src_label]}: row.src}})-[r:{type}]->"
+                    f"(:{dst_label} {{{NODE_KEYS[dst_label]}: row.dst}}) DELETE r", _records(frame))
+
+    def close(self):
+        self.driver.close()
+
+
+class SQLiteGraph:
+    """The same graph in one SQLite file, for running everything without a server."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS nodes (
+        label TEXT, key TEXT, props TEXT NOT NULL DEFAULT '{}',
+        PRIMARY KEY (label, key)) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS edges (
+        type TEXT, src_label TEXT, src TEXT, dst_label TEXT, dst TEXT, props TEXT NOT NULL DEFAULT '{}',
+        PRIMARY KEY (type, src_label, src, dst_label, dst)) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS edges_by_dst ON edges (dst_label, dst, type);
+    """
+
+    def __init__(self, path=GRAPH_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.target = f"sqlite:{self.path.resolve()}"
+
+    def prepare(self):
+        self.conn.executescript(self.SCHEMA)
+
+    def write_nodes(self, label, frame):
+        key = NODE_KEYS[label]
+        rows = ((label, row[key], json.dumps(row)) for row in _records(frame))
+        with self.conn:
+            # Like SET n += row: new properties overwrite, others are kept
+            self.conn.executemany("""INSERT INTO nodes VALUES (?, ?, ?) ON CONFLICT (label, key)
+                                     DO UPDATE SET props = json_patch(props, excluded.props)""", rows)
+
+    def write_edges(self, type, src_label, dst_label, frame):
+        records = _edge_records(frame)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO nodes (label, key, props) VALUES (?, ?, ?)",
+                [(label, r[end], json.dumps({NODE_KEYS[label]: r[end]}))
+                 for r in records for label, end in ((src_label, "src"), (dst_label, "dst"))])
+            self.conn.executemany(
+                """INSERT INTO edges VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (type, src_label, src, dst_label, dst)
+                   DO UPDATE SET props = json_patch(props, excluded.props)""",
+                [(type, src_label, r["src"], dst_label, r["dst"], json.dumps(r["props"])) for r in records])
+
+    def delete_nodes(self, label, keys):
+        with self.conn:
+            for end in ("src", "dst"):
+                self.conn.executemany(f"DELETE FROM edges WHERE {end}_label = ? AND {end} = ?",
+                                      ((label, k) for k in keys))
+            self.conn.executemany("DELETE FROM nodes WHERE label = ? AND key = ?", ((label, k) for k in keys))
+
+    def delete_edges(self, type, src_label, dst_label, frame):
+        with self.conn:
+            self.conn.executemany("DELETE FROM edges WHERE type = ? AND src_label = ? AND src = ? "
+                                  "AND dst_label = ? AND dst = ?",
+                                  ((type, src_label, s, dst_label, d) for s, d in zip(frame["src"], frame["dst"])))
+
+    def counts(self):
+        """Number of nodes per label and relationships per type."""
+        return pd.read_sql_query("SELECT 'node' AS kind, label AS name, COUNT(*) AS count FROM nodes GROUP BY label "
+                                 "UNION ALL SELECT 'relationship', type, COUNT(*) FROM edges GROUP BY type",
+                                 self.conn)
+
+    def to_networkx(self):
+        """MultiDiGraph with (label, key) nodes and relationship types as edge
+        keys; attributes are the properties."""
+        import networkx as nx
+
+        graph = nx.MultiDiGraph()
+        for label, key, props in self.conn.execute("SELECT label, key, props FROM nodes"):
+            graph.add_node((label, key), **json.loads(props))
+        for type, src_label, src, dst_label, dst, props in self.conn.execute("SELECT * FROM edges"):
+            graph.add_edge((src_label, src), (dst_label, dst), key=type, **json.loads(props))
+        return graph
+
+    def close(self):
+        self.conn.close()
+
+
+def _row_hashes(frame):
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view(np.int64)
+
+
+def _edge_keys(frame):
+    return (frame["src"] + "\x1f" + frame["dst"]).to_numpy()
+
+
+def _split_edge_keys(keys):
+    return pd.Series(keys, dtype=object).str.split("\x1f", n=1, expand=True).set_axis(["src", "dst"], axis=1)
+
+
+def sync(graph, node_sets, edge_sets, state, batch_size=BATCH_SIZE, full=False):
+    """Write the new and changed rows of every set to `graph`, nodes first,
+    and delete the rows that disappeared from complete sets.
+
+    The state is updated after every batch, so an interrupted sync resumes
+    where it stopped. full=True rewrites everything. Returns one row per set.
+    """
+    graph.prepare()
+    if full:
+        state.forget(graph.target)
+    jobs = [(f"node:{n.label}", n.label, n.frame, n.frame[NODE_KEYS[n.label]].to_numpy(), n.complete,
+             lambda batch, n=n: graph.write_nodes(n.label, batch),
+             lambda keys, n=n: graph.delete_nodes(n.label, keys)) for n in node_sets]
+    jobs += [(f"edge:{e.type}:{e.src_label}:{e.dst_label}", e.type, e.frame, _edge_keys(e.frame), e.complete,
+              lambda batch, e=e: graph.write_edges(e.type, e.src_label, e.dst_label, batch),
+              lambda keys, e=e: graph.delete_edges(e.type, e.src_label, e.dst_label, _split_edge_keys(keys)))
+             for e in edge_sets]
+
+    report = []
+    for kind, name, frame, keys, complete, write, delete in jobs:
+        start = time.perf_counter()
+        hashes = _row_hashes(frame)
+        known, known_hashes = state.known(graph.target, kind)
+        position = known.get_indexer(keys)
+        # position -1 (a new row) picks the appended placeholder
+        todo = np.flatnonzero((position < 0) | (np.append(known_hashes, 0)[position] != hashes))
+        for i in range(0, len(todo), batch_size):
+            rows = todo[i:i + batch_size]
+            write(frame.iloc[rows])
+            state.mark(graph.target, kind, keys[rows], hashes[rows])
+        stale = known.difference(keys).to_numpy() if complete else np.empty(0, dtype=object)
+        for i in range(0, len(stale), batch_size):
+            delete(stale[i:i + batch_size])
+            state.unmark(graph.target, kind, stale[i:i + batch_size])
+            if kind.startswith("node:"):
+                state.unmark_incident(graph.target, name, stale[i:i + batch_size])
+        report.append({"set": name, "kind": kind.split(":")[0], "rows": len(frame), "written": len(todo),
+                       "deleted": len(stale), "seconds": time.perf_counter() - start})
+    return pd.DataFrame(report)
+
+
+def _typed_header(frame, skip):
+    types = {"i": ":long", "u": ":long", "f": ":double", "b": ":boolean"}
+    return {c: c + types.get(frame[c].dtype.kind, "") for c in frame.columns if c not in skip}
+
+
+def write_import_files(folder, node_sets, edge_sets, state=None, target=None):
+    """CSV files and the command for an offline `neo4j-admin database import full`.
+
+    Relationship endpoints missing from the node sets are added as bare
+    nodes. With `state` and `target` the rows are recorded as synced to that
+    target, so the next sync() after the import only sends changes.
+    Returns the import command.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    nodes = {n.label: n.frame for n in node_sets}
+    for e in edge_sets:
+        for label, end in ((e.src_label, "src"), (e.dst_label, "dst")):
+            key = NODE_KEYS[label]
+            known = nodes.get(label, pd.DataFrame(columns=[key]))
+            missing = pd.Index(e.frame[end].unique()).difference(known[key])
+            if len(missing):
+                nodes[label] = pd.concat([known, pd.DataFrame({key: missing})], ignore_index=True)
+
+    command = ["neo4j-admin", "database", "import", "full", "--overwrite-destination"]
+    for label, frame in nodes.items():
+        key = NODE_KEYS[label]
+        header = {key: f"{key}:ID({label})", **_typed_header(frame, [key])}
+        frame.rename(columns=header).to_csv(folder / f"nodes_{label}.csv", index=False)
+        command.append(f"--nodes={label}={folder / f'nodes_{label}.csv'}")
+    for e in edge_sets:
+        name = f"rels_{e.type}_{e.src_label}_{e.dst_label}.csv"
+        header = {"src": f":START_ID({e.src_label})", "dst": f":END_ID({e.dst_label})",
+                  **_typed_header(e.frame, ["src", "dst"])}
+        e.frame.rename(columns=header).to_csv(folder / name, index=False)
+        command.append(f"--relationships={e.type}={folder / name}")
+    command.append("neo4j")
+
+    if state is not None and target is not None:
+        state.forget(target)
+        for n in node_sets:
+            state.mark(target, f"node:{n.label}", n.frame[NODE_KEYS[n.label]].to_numpy(), _row_hashes(n.frame))
+        for e in edge_sets:
+            state.mark(target, f"edge:{e.type}:{e.src_label}:{e.dst_label}", _edge_keys(e.frame),
+                       _row_hashes(e.frame))
+    return " ".join(command)
+
+
+def graph_sets(predictions=(), model_version=None, logs=()):
+    """Node and relationship sets of the metadata, the runs, prediction files and logs."""
+    node_sets, edge_sets = [], []
+    for nodes, edges in [segment_graph(), run_graph()] + (
+            [prediction_graph(predictions, model_version)] if predictions else []) + (
+            [log_graph(logs)] if logs else []):
+        node_sets += nodes
+        edge_sets += edges
+    return node_sets, edge_sets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the knowledge graph")
+    parser.add_argument("--predictions", action="append", default=[], metavar="CSV",
+                        help="score.py --out file (repeatable)")
+    parser.add_argument("--model-version", help="model version of prediction files without that column")
+    parser.add_argument("--logs", action="append", default=[], metavar="LOG",
+                        help="maintenance log file (repeatable)")
+    parser.add_argument("--state", default=SYNC_DB, help="sync state file")
+    parser.add_argument("--neo4j", help="bolt/neo4j URI (default: the SQLite graph)")
+    parser.add_argument("--user", default=os.environ.get("NEO4J_USER", "neo4j"))
+    parser.add_argument("--password", default=os.environ.get("NEO4J_PASSWORD"))
+    parser.add_argument("--database", default=os.environ.get("NEO4J_DATABASE"))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sync_cmd = sub.add_parser("sync", help="incremental load into Neo4j or the SQLite graph")
+    sync_cmd.add_argument("--sqlite", default=GRAPH_DB, help="SQLite graph file when not using Neo4j")
+    sync_cmd.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per transaction")
+    sync_cmd.add_argument("--full", action="store_true", help="rewrite every row, not only the changed ones")
+
+    files_cmd = sub.add_parser("import-files", help="write CSVs for neo4j-admin database import")
+    files_cmd.add_argument("folder")
+    files_cmd.add_argument("--mark-synced", action="store_true",
+                           help="record the rows as loaded into --neo4j / --database, so the next sync "
+                                "after the import only sends changes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    node_sets, edge_sets = graph_sets(args.predictions, args.model_version, args.logs)
+    print(f"📦 {sum(len(n.frame) for n in node_sets)} nodes and {sum(len(e.frame) for e in edge_sets)} "
+          f"relationships prepared in {time.perf_counter() - start:.1f}s")
+    state = SyncState(args.state)
+    try:
+        if args.command == "import-files":
+            if args.mark_synced and not args.neo4j:
+                parser.error("--mark-synced needs the --neo4j URI the files will be imported into")
+            target = Neo4jGraph.target_name(args.neo4j, args.database) if args.mark_synced else None
+            command = write_import_files(args.folder, node_sets, edge_sets, state, target)
+            print(f"✅ Import files written to {args.folder}; with the database stopped, run:\n{command}")
+            return
+        graph = Neo4jGraph(args.neo4j, args.user, args.password, args.database) if args.neo4j \
+            else SQLiteGraph(args.sqlite)
+        try:
+            report = sync(graph, node_sets, edge_sets, state, args.batch_size, args.full)
+            print(report.round(3).to_string(index=False))
+            print(f"✅ {report['written'].sum()} rows written to {graph.target} "
+                  f"in {report['seconds'].sum():.1f}s")
+        finally:
+            graph.close()
+    finally:
+        state.close()
+
+
+if __name__ == "__main__":
+    main()
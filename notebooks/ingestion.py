@@ -0,0 +1,177 @@
+# ingestion.py
+# Parallel, column-projected parquet reader for the IMAD-DS waveform segments.
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Base paths
+data_folder = Path(__file__).parent.parent / 'data' / 'imad' / 'BrushlessMotor'
+train_folder = data_folder / 'train'
+test_folder = data_folder / 'test'
+
+MIC_COLUMN = "MIC [Waveform]"
+
+# sensor -> (metadata column with the parquet file, {axis: parquet column})
+SENSORS = {
+    "mic": ("imp23absu_mic", {"waveform": MIC_COLUMN}),
+    "acc": ("ism330dhcx_acc", {"x": "A_x [g]", "y": "A_y [g]", "z": "A_z [g]"}),
+    "gyro": ("ism330dhcx_gyro", {"x": "G_x [dps]", "y": "G_y [dps]", "z": "G_z [dps]"}),
+}
+
+# (split, domain, label, metadata csv), in the canonical segment order.
+# Feature tables built before the test entries were corrected tag the test
+# segments with the wrong domain / label: read those from segment_labels().
+META_SOURCES = [
+    ("train", "source", 0, train_folder / "attributes_normal_source_train.csv"),
+    ("train", "target", 0, train_folder / "attributes_normal_target_train.csv"),
+    ("test", "source", 1, test_folder / "attributes_anomaly_source_test.csv"),
+    ("test", "target", 1, test_folder / "attributes_anomaly_target_test.csv"),
+    ("test", "source", 0, test_folder / "attributes_normal_source_test.csv"),
+    ("test", "target", 0, test_folder / "attributes_normal_target_test.csv"),
+]
+LABEL_COLUMNS = ["split", "domain", "label"]
+
+
+def load_meta(file, split, domain, label):
+    """Load one metadata CSV and tag it with split/domain/label."""
+    df = pd.read_csv(file)
+    df["split"] = split
+    df["domain"] = domain      # source vs target
+    df["label"] = label        # normal=0, anomaly=1
+    return df
+
+
+def build_metadata():
+    """All metadata CSVs concatenated in the canonical segment order."""
+    frames = [load_meta(file, split, domain, label) for split, domain, label, file in META_SOURCES]
+    return pd.concat(frames, ignore_index=True)
+
+
+def segment_labels(meta=None):
+    """segment_id, split, domain and label of every segment, read from its own
+    metadata (split_label "Anomaly_Source_Test", anomaly_label "belt")."""
+    meta = build_metadata() if meta is None else meta
+    parts = meta["split_label"].str.lower().str.split("_")
+    return pd.DataFrame({
+        "segment_id": meta["segment_id"],
+        "split": parts.str[2],
+        "domain": parts.str[1],
+        "label": (meta["anomaly_label"] != "normal").astype(int),
+    }).drop_duplicates("segment_id")
+
+
+def with_segment_labels(frame, meta=None):
+    """`frame` with split / domain / label replaced by segment_labels() for
+    the segments found in the metadata (unknown ones keep their own)."""
+    labels = segment_labels(meta).set_index("segment_id")
+    frame = frame.copy()
+    for column in LABEL_COLUMNS:
+        known = frame["segment_id"].map(labels[column])
+        frame[column] = known.fillna(frame[column]) if column in frame.columns else known
+    if "label" in frame.columns and frame["label"].notna().all():
+        frame["label"] = frame["label"].astype(int)
+    return frame
+
+
+def segment_path(parquet_file, split):
+    folder = train_folder if split == "train" else test_folder
+    return os.path.join(folder, parquet_file)
+
+
+def read_waveform(file_path, column=MIC_COLUMN):
+    """Decode a single column of a parquet file (pyarrow column projection).
+
+    Returns a numpy array, or None if the file can't be read.
+    """
+    try:
+        table = pq.read_table(file_path, columns=[column], use_threads=False)
+        return table.column(0).to_numpy()
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return None
+
+
+def read_sensor(file_path, axes):
+    """Decode the projected axis columns of one sensor file in a single read.
+
+    Returns {axis: numpy array}, or None if the file can't be read.
+    """
+    try:
+        table = pq.read_table(file_path, columns=list(axes.values()), use_threads=False)
+        return {axis: table.column(col).to_numpy() for axis, col in axes.items()}
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return None
+
+
+def read_segment(files, sensors=SENSORS):
+    """Read every sensor of one segment; `files` maps sensor -> parquet path."""
+    return {sensor: read_sensor(path, sensors[sensor][1]) for sensor, path in files.items()}
+
+
+def _read_task(args):
+    return read_waveform(*args)
+
+
+def _read_segment_task(args):
+    return read_segment(*args)
+
+
+def _make_executor(workers, executor):
+    if executor == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    if executor == "thread":
+        return ThreadPoolExecutor(max_workers=workers)
+    raise ValueError(f"Unknown executor '{executor}' (expected 'process' or 'thread')")
+
+
+def _iter_ordered(meta, fn, tasks, workers, executor, chunksize):
+    """Run fn over tasks on a pool and yield (row, result) in metadata order.
+
+    Work is submitted in bounded windows so only a few chunks of decoded
+    waveforms are ever held in memory, no matter how many segments there are.
+    """
+    workers = workers or os.cpu_count() or 1
+    rows = meta.itertuples(index=False)
+
+    if workers == 1:
+        for row, task in zip(rows, tasks):
+            yield row, fn(task)
+        return
+
+    window = chunksize * workers * 2
+    with _make_executor(workers, executor) as pool:
+        for start in range(0, len(tasks), window):
+            batch = tasks[start:start + window]
+            # map() preserves input order, so results line up with the metadata
+            results = pool.map(fn, batch, chunksize=chunksize)
+            for result in results:
+                yield next(rows), result
+
+
+def iter_waveforms(meta, workers=None, executor="process", chunksize=8,
+                   sensor_col="imp23absu_mic", column=MIC_COLUMN):
+    """Yield (row, waveform) for every metadata row, in metadata order.
+
+    Files are decoded by a pool of `workers` processes or threads.
+    """
+    tasks = [(segment_path(f, s), column) for f, s in zip(meta[sensor_col], meta["split"])]
+    return _iter_ordered(meta, _read_task, tasks, workers, executor, chunksize)
+
+
+def iter_segments(meta, sensors=SENSORS, workers=None, executor="process", chunksize=4):
+    """Yield (row, {sensor: {axis: waveform}}) for every metadata row, in order.
+
+    Each task reads all sensors of one segment, so every parquet file is
+    opened and decoded exactly once and the sensors of a segment are read by
+    the same worker. A sensor that failed to load maps to None.
+    """
+    tasks = []
+    for row in meta.itertuples(index=False):
+        files = {sensor: segment_path(getattr(row, col), row.split)
+                 for sensor, (col, _) in sensors.items()}
+        tasks.append((files, sensors))
+    return _iter_ordered(meta, _read_segment_task, tasks, workers, executor, chunksize)
@@ -0,0 +1,172 @@
+# metrics_store.py
+# Append-only store of training runs (loghub/runs.sqlite).
+#
+# Every run is one row: model, params, design-matrix hash, metrics, timings
+# and registered model version, inserted in a single transaction. The database runs in
+# WAL mode, so concurrent trainers append without clashing and readers are
+# never blocked; comparisons are indexed queries instead of re-parsing logs.
+import json
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+RUNS_DB = Path(__file__).parent.parent / 'loghub' / 'runs.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    created       TEXT NOT NULL,
+    model         TEXT NOT NULL,
+    params        TEXT NOT NULL DEFAULT '{}',
+    data_hash     TEXT,
+    accuracy      REAL,
+    precision     REAL,
+    recall        REAL,
+    f1            REAL,
+    fit_seconds   REAL,
+    n_jobs        INTEGER,
+    artifact_path TEXT,
+    log_file      TEXT UNIQUE,
+    source        TEXT NOT NULL DEFAULT 'train',
+    model_version TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_f1 ON runs (f1 DESC, created DESC);
+CREATE INDEX IF NOT EXISTS runs_by_model ON runs (model, f1 DESC, created DESC);
+CREATE INDEX IF NOT EXISTS runs_by_data ON runs (data_hash, f1 DESC);
+"""
+# Columns added after the first release of the store: name -> declaration
+MIGRATIONS = {"model_version": "TEXT"}
+
+# metrics dict key (as training.evaluate() names them) -> column
+METRIC_COLUMNS = {"Accuracy": "accuracy", "Precision": "precision", "Recall": "recall", "F1-Score": "f1"}
+
+
+def connect(path=RUNS_DB):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(runs)")}
+    for column, declaration in MIGRATIONS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {declaration}")
+    conn.execute("CREATE INDEX IF NOT EXISTS runs_by_version ON runs (model_version)")
+    return conn
+
+
+def record_run(model, metrics, params=None, data_hash=None, fit_seconds=None, n_jobs=None,
+               artifact_path=None, log_file=None, source="train", created=None, model_version=None,
+               path=RUNS_DB):
+    """Append one run atomically; returns its run_id."""
+    row = {
+        "created": created or datetime.now().isoformat(timespec="seconds"),
+        "model": model,
+        "params": json.dumps(params or {}, sort_keys=True),
+        "data_hash": data_hash,
+        "fit_seconds": fit_seconds,
+        "n_jobs": n_jobs,
+        "artifact_path": None if artifact_path is None else str(artifact_path),
+        "log_file": None if log_file is None else str(log_file),
+        "source": source,
+        "model_version": model_version,
+    }
+    row.update({column: metrics.get(name) for name, column in METRIC_COLUMNS.items()})
+    conn = connect(path)
+    try:
+        with conn:  # one transaction: the row is either fully there or not at all
+            cursor = conn.execute(
+                f"INSERT OR IGNORE INTO runs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                list(row.values()))
+        return cursor.lastrowid if cursor.rowcount else None
+    finally:
+        conn.close()
+
+
+def query_runs(model=None, data_hash=None, model_version=None, limit=None, path=RUNS_DB):
+    """Runs sorted best F1 first (newest first among ties)."""
+    where, args = [], []
+    if model_version:
+        where.append("model_version = ?")
+        args.append(model_version)
+    if model:
+        where.append("model = ?")
+        args.append(model)
+    if data_hash:
+        where.append("data_hash = ?")
+        args.append(data_hash)
+    sql = "SELECT * FROM runs" + (" WHERE " + " AND ".join(where) if where else "")
+    sql += " ORDER BY f1 DESC, created DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    conn = connect(path)
+    try:
+        return pd.read_sql_query(sql, conn, params=args)
+    finally:
+        conn.close()
+
+
+def best_per_model(data_hash=None, source=None, registered=False, path=RUNS_DB):
+    """The best run of every model type, best first.
+
+    `source` keeps the runs of one protocol ('train' for the supervised
+    trainers, 'out_of_core', 'normal_only', 'legacy'); registered=True only
+    those with a model version. Both filter before ranking, so an
+    unregistered run never hides a model's registered ones.
+    """
+    where, args = [], []
+    if data_hash:
+        where.append("data_hash = ?")
+        args.append(data_hash)
+    if source:
+        where.append("source = ?")
+        args.append(source)
+    if registered:
+        where.append("model_version IS NOT NULL")
+    where = "WHERE " + " AND ".join(where) if where else ""
+    sql = f"""
+        SELECT * FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY model ORDER BY f1 DESC, created DESC) AS rank
+            FROM runs {where}
+        ) WHERE rank = 1 ORDER BY f1 DESC, created DESC
+    """
+    conn = connect(path)
+    try:
+        return pd.read_sql_query(sql, conn, params=args).drop(columns="rank")
+    finally:
+        conn.close()
+
+
+# Text logs written before the store existed
+LEGACY_PATTERN = re.compile(
+    r"Accuracy:\s*([\d.]+).*?"
+    r"Precision:\s*([\d.]+).*?"
+    r"Recall:\s*([\d.]+).*?"
+    r"F1-Score:\s*([\d.]+)",
+    re.DOTALL
+)
+LEGACY_MODELS = {"LogisticRegression": "Logistic Regression", "RandomForest": "Random Forest",
+                 "XGBoost": "XGBoost"}
+LEGACY_TIMESTAMP = re.compile(r"^(\d{4}-\d\d-\d\d) (\d\d:\d\d:\d\d)")
+
+
+def import_legacy_logs(folder, path=RUNS_DB):
+    """Add the metrics of old loghub text logs once (keyed by log file); returns how many were new."""
+    added = 0
+    for log_file in sorted(Path(folder).glob("*.txt")):
+        text = log_file.read_text(errors="ignore")
+        match = LEGACY_PATTERN.search(text)
+        model = next((name for name, title in LEGACY_MODELS.items() if f"=== {title} Evaluation" in text), None)
+        if not match or model is None:
+            continue
+        metrics = dict(zip(METRIC_COLUMNS, map(float, match.groups())))
+        stamp = LEGACY_TIMESTAMP.match(text)
+        created = ("T".join(stamp.groups()) if stamp
+                   else datetime.fromtimestamp(log_file.stat().st_mtime).isoformat(timespec="seconds"))
+        if record_run(model, metrics, log_file=log_file, source="legacy", created=created, path=path):
+            added += 1
+    return added
@@ -0,0 +1,90 @@
+# model_artifact.py
+# Self-contained model artifact: fitted encoder + scaler + model + the
+# feature column order, loaded and scored in one call.
+from datetime import datetime
+
+import joblib
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+
+# Never features: one-hot encoding the segment_id gives a column per segment,
+# and the split gives away the label of every training segment
+ID_COLUMNS = ["segment_id", "split"]
+
+
+def split_columns(X):
+    """(numeric, categorical) feature columns, as the trainers have always picked them
+    (leaving out ID_COLUMNS)."""
+    X = X.drop(columns=[c for c in ID_COLUMNS if c in X.columns])
+    categorical_cols = list(X.select_dtypes(include=['object']).columns)
+    numeric_cols = list(X.select_dtypes(include=['int64', 'float64']).columns)
+    return numeric_cols, categorical_cols
+
+
+def build_preprocessor(X):
+    """Unfitted encode + scale pipeline for a raw feature frame.
+
+    Numeric columns are passed through, string columns one-hot encoded
+    (numeric first, then encoded, like the original scripts), then everything
+    is standardized.
+    """
+    numeric_cols, categorical_cols = split_columns(X)
+    encode = ColumnTransformer(
+        [("numeric", "passthrough", numeric_cols),
+         ("categorical", OneHotEncoder(sparse_output=False, handle_unknown='ignore'), categorical_cols)],
+        sparse_threshold=0,
+    )
+    return Pipeline([("encode", encode), ("scale", StandardScaler())])
+
+
+class ModelArtifact:
+    """A fitted preprocessing + model pipeline that scores raw feature rows."""
+
+    def __init__(self, pipeline, feature_columns, model_type, metadata=None, categorical_columns=()):
+        self.pipeline = pipeline
+        self.feature_columns = list(feature_columns)
+        self.categorical_columns = list(categorical_columns)
+        self.model_type = model_type
+        self.metadata = dict(metadata or {})
+        self.metadata.setdefault("created", datetime.now().isoformat(timespec="seconds"))
+
+    @classmethod
+    def from_fitted(cls, preprocessor, model, feature_columns, model_type, metadata=None):
+        pipeline = Pipeline([("preprocess", preprocessor), ("model", model)])
+        categorical = dict((name, cols) for name, _, cols in preprocessor.named_steps["encode"].transformers)
+        return cls(pipeline, feature_columns, model_type, metadata, categorical.get("categorical", ()))
+
+    def _frame(self, rows):
+        # Same columns, same order as in training. Categorical columns the
+        # caller doesn't have (e.g. segment_id for a live feed) are treated as
+        # an unknown category, which the encoder ignores
+        rows = pd.DataFrame(rows)
+        missing = [col for col in self.categorical_columns if col not in rows.columns]
+        rows = rows.reindex(columns=self.feature_columns)
+        if missing:
+            rows[missing] = ""
+        return rows
+
+    def predict_proba(self, rows):
+        return self.pipeline.predict_proba(self._frame(rows))
+
+    def predict(self, rows):
+        return self.pipeline.predict(self._frame(rows))
+
+    def score(self, rows):
+        """Anomaly probability for each row."""
+        return self.predict_proba(rows)[:, 1]
+
+    def save(self, path):
+        joblib.dump(self, path)
+
+
+def load_artifact(path):
+    artifact = joblib.load(path)
+    if not isinstance(artifact, ModelArtifact):
+        raise TypeError(f"{path} holds a bare {type(artifact).__name__}, not a ModelArtifact; "
+                        "retrain it with the TrainClassifiers scripts")
+    return artifact
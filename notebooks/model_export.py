@@ -0,0 +1,279 @@
+# model_export.py
+# Export a ModelArtifact into a folder that loads fast and shares memory.
+#
+#   export.json          kind of model, feature columns, artifact metadata and,
+#                        when it applies, the encode + scale constants
+#   preprocessor.joblib  encode + scale pipeline (small)
+#   forest/*.npy         sklearn forests as flat node arrays (tree_inference.FlatForest)
+#   booster/*.npy        XGBoost boosters as flat node arrays (tree_inference.FlatBooster)
+#   model.ubj            XGBoost boosters in XGBoost's binary UBJSON format
+#   model.joblib         anything else, uncompressed so its arrays can be memory-mapped
+#
+# Forests and joblib models are loaded with mmap_mode="r": N scoring workers
+# map the same pages instead of each unpickling a private copy. Flat models
+# and the array preprocessing are only exported after they reproduced the
+# original predict_proba / transform bit for bit on probe inputs; otherwise
+# the export keeps the library model.
+import json
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from model_artifact import ModelArtifact
+from tree_inference import FlatBooster, FlatForest, UnsupportedModel, probe_inputs
+
+EXPORT_FORMAT = 2
+
+
+def export_kind(model):
+    if isinstance(model, RandomForestClassifier):
+        return "forest"
+    if type(model).__name__ == "XGBClassifier":
+        return "xgboost"
+    return "joblib"
+
+
+class FastPreprocessor:
+    """The fitted encode + scale pipeline of model_artifact as plain arrays.
+
+    Numeric columns pass through, string columns are one-hot encoded against
+    the fitted categories (unknown values encode as all zeros), then
+    (x - mean) / scale: the same float64 operations as the sklearn pipeline,
+    without its per-call validation. transform_records() goes straight from
+    row dicts to the matrix, with no DataFrame at all.
+    """
+
+    def __init__(self, numeric_columns, categories, mean, scale):
+        self.numeric_columns = list(numeric_columns)
+        self.categories = {col: list(values) for col, values in categories.items()}
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self._codes = {col: {value: i for i, value in enumerate(values)}
+                       for col, values in self.categories.items()}
+
+    @classmethod
+    def from_pipeline(cls, preprocessor):
+        """FastPreprocessor for a build_preprocessor() pipeline, or None if it doesn't fit the pattern."""
+        try:
+            encode, scale = preprocessor.named_steps["encode"], preprocessor.named_steps["scale"]
+            steps = {name: (transformer, list(cols)) for name, transformer, cols in encode.transformers}
+            passthrough, numeric = steps.pop("numeric")
+            categorical = steps.pop("categorical", (None, []))[1]
+            onehot = encode.named_transformers_.get("categorical")
+        except (AttributeError, KeyError, ValueError):
+            return None
+        if steps or passthrough != "passthrough" or encode.remainder != "drop":
+            return None
+        if scale.mean_ is None or scale.scale_ is None:
+            return None
+        categories = {}
+        if categorical:
+            if getattr(onehot, "drop_idx_", None) is not None:
+                return None
+            categories = {col: list(values) for col, values in zip(categorical, onehot.categories_)}
+        if not all(isinstance(value, str) for values in categories.values() for value in values):
+            return None
+        return cls(numeric, categories, scale.mean_, scale.scale_)
+
+    def _scale(self, numeric, onehot):
+        X = np.hstack([numeric] + onehot)
+        X -= self.mean
+        X /= self.scale
+        return X
+
+    def transform(self, frame):
+        """Matrix for a DataFrame of raw feature rows (missing columns: NaN / unknown category)."""
+        n = len(frame)
+        numeric = frame.reindex(columns=self.numeric_columns).to_numpy(dtype=np.float64)
+        onehot = []
+        for col, values in self.categories.items():
+            column = frame[col] if col in frame.columns else pd.Series("", index=frame.index)
+            codes = pd.Categorical(column, categories=values).codes
+            block = np.zeros((n, len(values)))
+            known = np.flatnonzero(codes >= 0)
+            block[known, codes[known]] = 1.0
+            onehot.append(block)
+        return self._scale(numeric, onehot)
+
+    def transform_records(self, records):
+        """Matrix for a list of row dicts."""
+        numeric = np.array([[rec.get(col, np.nan) for col in self.numeric_columns] for rec in records],
+                           dtype=np.float64).reshape(len(records), len(self.numeric_columns))
+        onehot = []
+        for col, codes in self._codes.items():
+            block = np.zeros((len(records), len(codes)))
+            for i, rec in enumerate(records):
+                code = codes.get(rec.get(col, ""))
+                if code is not None:
+                    block[i, code] = 1.0
+            onehot.append(block)
+        return self._scale(numeric, onehot)
+
+    def to_json(self):
+        return {"numeric_columns": self.numeric_columns, "categories": self.categories,
+                "mean": self.mean.tolist(), "scale": self.scale.tolist()}
+
+
+def _probe_frame(fast, n_rows=64, seed=0):
+    """Raw feature rows covering every fitted category, an unknown one and missing values."""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.standard_normal((n_rows, len(fast.numeric_columns))) * 1e3,
+                         columns=fast.numeric_columns)
+    frame.iloc[0, :] = np.nan
+    for col, values in fast.categories.items():
+        frame[col] = [(values + ["<unknown>"])[i % (len(values) + 1)] for i in range(n_rows)]
+    return frame
+
+
+def _same_transform(fast, preprocessor):
+    frame = _probe_frame(fast)
+    frame = frame.reindex(columns=getattr(preprocessor, "feature_names_in_", frame.columns))
+    expected = preprocessor.transform(frame)
+    return (np.array_equal(fast.transform(frame), expected, equal_nan=True)
+            and np.array_equal(fast.transform_records(frame.to_dict("records")), expected, equal_nan=True))
+
+
+def _same_proba(flat, model, n_features):
+    X = probe_inputs(flat, n_features)
+    n_jobs = getattr(model, "n_jobs", None)
+    try:
+        # A multi-threaded forest adds up its trees in whatever order the
+        # threads finish; the flat forest matches the single-threaded order
+        if n_jobs is not None:
+            model.set_params(n_jobs=1)
+        # Both the batch path and the row-by-row path (small batches) must match
+        return (np.array_equal(flat.predict_proba(X), model.predict_proba(X))
+                and np.array_equal(flat.predict_proba(X[:4]), model.predict_proba(X[:4])))
+    finally:
+        if n_jobs is not None:
+            model.set_params(n_jobs=n_jobs)
+
+
+def export_artifact(artifact, folder):
+    """Write `artifact` into `folder` in the fast-loading layout."""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    preprocessor = artifact.pipeline.named_steps["preprocess"]
+    model = artifact.pipeline.named_steps["model"]
+    kind = export_kind(model)
+    n_features = model.n_features_in_
+
+    flat = None
+    try:
+        if kind == "forest":
+            flat = FlatForest.from_sklearn(model)
+        elif kind == "xgboost":
+            flat = FlatBooster.from_xgboost(model)
+    except UnsupportedModel:
+        pass
+    if flat is not None and not _same_proba(flat, model, n_features):
+        # Keep the flat booster with expf on every row if only the vectorized sigmoid differs
+        if kind == "xgboost":
+            flat.vector_sigmoid = False
+        if kind != "xgboost" or not _same_proba(flat, model, n_features):
+            flat = None
+    if kind == "forest" and flat is None:
+        kind = "joblib"
+
+    joblib.dump(preprocessor, folder / "preprocessor.joblib")
+    if kind == "forest":
+        flat.save(folder / "forest")
+    elif kind == "xgboost":
+        model.save_model(folder / "model.ubj")
+        if flat is not None:
+            flat.save(folder / "booster")
+    else:
+        joblib.dump(model, folder / "model.joblib")
+
+    fast = FastPreprocessor.from_pipeline(preprocessor)
+    if fast is not None and not _same_transform(fast, preprocessor):
+        fast = None
+
+    with open(folder / "export.json", "w") as f:
+        json.dump({"format": EXPORT_FORMAT, "kind": kind, "model_type": artifact.model_type,
+                   "flat_booster": kind == "xgboost" and flat is not None,
+                   "preprocessing": fast.to_json() if fast is not None else None,
+                   "feature_columns": artifact.feature_columns,
+                   "categorical_columns": artifact.categorical_columns,
+                   "metadata": artifact.metadata}, f, indent=2, default=str)
+
+
+class ExportedArtifact(ModelArtifact):
+    """A ModelArtifact whose model was loaded from an export folder.
+
+    Besides a DataFrame, rows can be one row dict or a list of row dicts,
+    which skips pandas entirely when the preprocessing was exported as arrays.
+    """
+
+    def __init__(self, preprocessor, model, feature_columns, model_type, metadata=None, categorical_columns=()):
+        super().__init__(None, feature_columns, model_type, metadata, categorical_columns)
+        self.preprocessor = preprocessor
+        self.model = model
+
+    def _matrix(self, rows):
+        if isinstance(rows, dict):
+            rows = [rows]
+        if isinstance(self.preprocessor, FastPreprocessor):
+            if isinstance(rows, list):
+                return self.preprocessor.transform_records(rows)
+            return self.preprocessor.transform(pd.DataFrame(rows))
+        return self.preprocessor.transform(self._frame(rows))
+
+    def predict_proba(self, rows):
+        return self.model.predict_proba(self._matrix(rows))
+
+    def predict(self, rows):
+        return self.model.predict(self._matrix(rows))
+
+    def save(self, path):
+        raise TypeError("exported artifacts are read-only; save the original ModelArtifact instead")
+
+
+def export_format(folder):
+    """Format version of an export folder (None if there is none)."""
+    try:
+        with open(Path(folder) / "export.json") as f:
+            return json.load(f)["format"]
+    except FileNotFoundError:
+        return None
+
+
+def load_exported(folder, mmap_mode="r"):
+    folder = Path(folder)
+    with open(folder / "export.json") as f:
+        info = json.load(f)
+    if info["format"] != EXPORT_FORMAT:
+        raise ValueError(f"{folder} has export format {info['format']}, expected {EXPORT_FORMAT}")
+
+    if info["kind"] == "forest":
+        model = FlatForest.load(folder / "forest", mmap_mode=mmap_mode)
+    elif info["kind"] == "xgboost" and info["flat_booster"]:
+        model = FlatBooster.load(folder / "booster", mmap_mode=mmap_mode)
+    elif info["kind"] == "xgboost":
+        from xgboost import XGBClassifier
+        model = XGBClassifier()
+        model.load_model(folder / "model.ubj")
+    else:
+        model = joblib.load(folder / "model.joblib", mmap_mode=mmap_mode)
+
+    if info["preprocessing"] is not None:
+        preprocessor = FastPreprocessor(**info["preprocessing"])
+    else:
+        preprocessor = joblib.load(folder / "preprocessor.joblib", mmap_mode=mmap_mode)
+
+    return ExportedArtifact(
+        preprocessor=preprocessor,
+        model=model,
+        feature_columns=info["feature_columns"],
+        model_type=info["model_type"],
+        metadata=info["metadata"],
+        categorical_columns=info["categorical_columns"],
+    )
+
+
+def check_export(artifact, exported, rows):
+    """True if the export scores `rows` bit-identically to the original artifact."""
+    return np.array_equal(artifact.predict_proba(rows), exported.predict_proba(rows))
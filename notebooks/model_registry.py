@@ -0,0 +1,269 @@
+# model_registry.py
+# Versioned model registry with atomic alias promotion.
+#
+#   models/registry/
+#       versions/<version>/model.pkl      immutable; <version> is its content hash
+#       versions/<version>/meta.json      model type, metrics, params, data hash
+#       versions/<version>/export/        memory-mappable, compiled export (see model_export.py)
+#       aliases/<alias>.json              {"version": ..., "promoted": ...}
+#       aliases/<alias>.history.jsonl     every promotion of the alias, oldest first
+#
+# Versions are written to a scratch folder and renamed into place, and an
+# alias is a small file replaced with os.replace(), so a reader sees either
+# the old or the new model, never a half-written one. Writers of an alias
+# take aliases/<alias>.lock (created with O_EXCL) around the update, so two
+# concurrent promotions can't lose one another's history line. Training
+# runs link to their version through the model_version column of the
+# metrics store.
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import pandas as pd
+
+from model_artifact import load_artifact
+from model_export import EXPORT_FORMAT, export_artifact, export_format, load_exported
+
+REGISTRY_PATH = Path(__file__).parent.parent / 'models' / 'registry'
+LOCK_TIMEOUT = 30.0
+
+
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+@contextmanager
+def _locked(path, timeout=LOCK_TIMEOUT):
+    """Hold `path` as a lock file; it is created exclusively, so only one holder at a time."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{path} is still held after {timeout:.0f}s; "
+                                   f"remove it if no promotion is running")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        os.remove(path)
+
+
+class ModelRegistry:
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = Path(path)
+        self.versions_path = self.path / "versions"
+        self.aliases_path = self.path / "aliases"
+
+    def register(self, artifact, metadata=None):
+        """Store an artifact as an immutable version; returns the version id.
+
+        Registering identical bytes twice returns the existing version.
+        """
+        buffer = io.BytesIO()
+        joblib.dump(artifact, buffer)
+        payload = buffer.getvalue()
+        version = hashlib.sha256(payload).hexdigest()[:16]
+        folder = self.versions_path / version
+        if folder.exists():
+            return version
+
+        self.versions_path.mkdir(parents=True, exist_ok=True)
+        scratch = Path(tempfile.mkdtemp(dir=self.versions_path, prefix=f".{version}-"))
+        try:
+            (scratch / "model.pkl").write_bytes(payload)
+            export_artifact(artifact, scratch / "export")
+            meta = {"version": version, "model_type": artifact.model_type,
+                    "registered": datetime.now().isoformat(timespec="seconds"),
+                    "size": len(payload)}
+            meta.update(artifact.metadata)
+            meta.update(metadata or {})
+            (scratch / "meta.json").write_text(json.dumps(meta, indent=2, default=str))
+            os.rename(scratch, folder)
+        except OSError:
+            if not folder.exists():  # losing the rename race to the same bytes is fine
+                raise
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        return version
+
+    def model_path(self, version):
+        return self.versions_path / version / "model.pkl"
+
+    def export(self, ref):
+        """Add the fast-loading export to a version registered before exports
+        existed, or rebuild one written in an older export format."""
+        version = self.resolve(ref)
+        folder = self.versions_path / version / "export"
+        current = export_format(folder)
+        if current == EXPORT_FORMAT:
+            return folder
+        scratch = Path(tempfile.mkdtemp(dir=folder.parent, prefix=".export-"))
+        stale = folder.parent / f".export-stale-{current}"
+        try:
+            export_artifact(load_artifact(self.model_path(version)), scratch)
+            if current is not None:
+                # Readers that find no export meanwhile load the pickle
+                os.rename(folder, stale)
+            os.rename(scratch, folder)
+        except OSError:
+            if export_format(folder) != EXPORT_FORMAT:
+                raise
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+            shutil.rmtree(stale, ignore_errors=True)
+        return folder
+
+    def info(self, version):
+        with open(self.versions_path / version / "meta.json") as f:
+            return json.load(f)
+
+    def versions(self):
+        """Metadata of every registered version, newest first."""
+        if not self.versions_path.exists():
+            return pd.DataFrame()
+        metas = [self.info(p.name) for p in self.versions_path.iterdir()
+                 if not p.name.startswith(".") and (p / "meta.json").exists()]
+        frame = pd.DataFrame(metas)
+        return frame.sort_values("registered", ascending=False).reset_index(drop=True) if len(frame) else frame
+
+    def alias_version(self, alias):
+        """Version an alias points to, or None if it was never promoted."""
+        try:
+            with open(self.aliases_path / f"{alias}.json") as f:
+                return json.load(f)["version"]
+        except FileNotFoundError:
+            return None
+
+    def resolve(self, ref):
+        """Version id for an alias, a version id or a unique version prefix."""
+        version = self.alias_version(ref)
+        if version:
+            return version
+        matches = [p.name for p in self.versions_path.glob(f"{ref}*") if not p.name.startswith(".")]
+        if len(matches) != 1:
+            raise KeyError(f"'{ref}' is not an alias or {'an ambiguous' if matches else 'a known'} "
+                           f"model version in {self.path}")
+        return matches[0]
+
+    def promote(self, ref, alias="best", note=None):
+        """Point `alias` at a version atomically; returns the version id."""
+        version = self.resolve(ref)
+        if not self.model_path(version).exists():
+            raise KeyError(f"model version {version} is not in {self.path}")
+        self.aliases_path.mkdir(parents=True, exist_ok=True)
+        with _locked(self.aliases_path / f"{alias}.lock"):
+            self._set_alias(alias, version, note)
+        return version
+
+    def _set_alias(self, alias, version, note=None, rollback=False):
+        record = {"alias": alias, "version": version, "previous": self.alias_version(alias),
+                  "promoted": datetime.now().isoformat(timespec="seconds"), "note": note,
+                  "rollback": rollback}
+        _write_atomic(self.aliases_path / f"{alias}.json", json.dumps(record).encode())
+        with open(self.aliases_path / f"{alias}.history.jsonl", "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def history(self, alias="best"):
+        """Every promotion and rollback of an alias, oldest first."""
+        try:
+            with open(self.aliases_path / f"{alias}.history.jsonl") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def rollback(self, alias="best"):
+        """Point `alias` back at the version it held before its current one.
+
+        Rollbacks undo promotions in turn, so rolling back twice goes back
+        two promotions.
+        """
+        self.aliases_path.mkdir(parents=True, exist_ok=True)
+        with _locked(self.aliases_path / f"{alias}.lock"):
+            # Replay the history: a promotion pushes its version, a rollback pops one
+            stack = []
+            for record in self.history(alias):
+                # Histories written before the rollback flag mark rollbacks by their note
+                if record.get("rollback", record.get("note") == "rollback"):
+                    stack = stack[:-1]
+                else:
+                    stack.append(record["version"])
+            if len(stack) < 2:
+                raise KeyError(f"alias '{alias}' has no earlier version to roll back to")
+            self._set_alias(alias, stack[-2], note="rollback", rollback=True)
+        return stack[-2]
+
+    def load(self, ref, exported=True):
+        """Artifact of a version or alias; the memory-mapped export when there is
+        a current one (see export() to upgrade older exports)."""
+        version = self.resolve(ref)
+        folder = self.versions_path / version / "export"
+        if exported and export_format(folder) == EXPORT_FORMAT:
+            return load_exported(folder)
+        return load_artifact(self.model_path(version))
+
+
+def load_model(ref, registry=None):
+    """ModelArtifact from a file path, a registry alias or a version id."""
+    if Path(ref).is_file():
+        return load_artifact(ref)
+    return (registry or ModelRegistry()).load(str(ref))
+
+
+class LiveModel:
+    """A registry alias that follows promotions without interrupting scoring.
+
+    check() re-reads the tiny alias file. When the alias moved, the new
+    version is loaded first and then swapped in with a single assignment, so
+    calls already scoring finish on the old model and nothing waits for the load.
+    """
+
+    def __init__(self, alias="best", registry=None):
+        self.registry = registry or ModelRegistry()
+        self.alias = alias
+        version = self.registry.resolve(alias)
+        self._current = (version, self.registry.load(version))
+
+    @property
+    def version(self):
+        return self._current[0]
+
+    @property
+    def artifact(self):
+        return self._current[1]
+
+    def check(self):
+        """Load and swap in the alias's version if it changed; True if it did."""
+        version = self.registry.resolve(self.alias)
+        if version == self._current[0]:
+            return False
+        self._current = (version, self.registry.load(version))
+        return True
+
+    def predict_proba(self, rows):
+        return self._current[1].predict_proba(rows)
+
+    def score(self, rows):
+        return self._current[1].score(rows)
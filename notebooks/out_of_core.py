@@ -0,0 +1,264 @@
+# out_of_core.py
+# Train on feature tables that don't fit in memory, one chunk at a time.
+#
+#   python out_of_core.py                                   # SGD + external-memory XGBoost
+#   python out_of_core.py --models SGDLogisticRegression --chunk-rows 20000 --epochs 10
+#   python out_of_core.py --files big_features.parquet
+#
+# The feature files (CSV or parquet) are only ever read in chunks:
+#   pass 1  categories of every string column and the class balance
+#   pass 2  StandardScaler.partial_fit on the encoded chunks (streaming mean / variance)
+# which yields the same encode + scale pipeline as build_preprocessor(), so
+# the models register, export and serve like the in-memory ones. Then
+#   SGDLogisticRegression   SGDClassifier(log_loss).partial_fit, chunk by chunk, for a few epochs
+#   XGBoostExternal         XGBoost's external-memory ExtMemQuantileDMatrix fed by a DataIter;
+#                           the quantized pages live in a temporary on-disk cache
+# Evaluation streams the held-out rows and only keeps the confusion matrix.
+# Rows are assigned to the 20% hold-out by a hash of their segment_id, so
+# every pass agrees without keeping an index. Identifier columns (segment_id)
+# are not used as features: one-hot encoding them grows with the data.
+#
+# Peak memory is set by --chunk-rows, not by the size of the feature files.
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import confusion_matrix
+
+from ingestion import build_metadata, with_segment_labels
+from metrics_store import record_run
+from model_artifact import ID_COLUMNS, ModelArtifact, build_preprocessor, split_columns
+from model_registry import ModelRegistry
+from preprocessing import FEATURE_FILES, design_key
+from training import MODEL_REGISTRY, write_log
+
+CHUNK_ROWS = 50_000
+TEST_SHARE = 0.2
+
+# fit(batches, stats, n_jobs, params) -> fitted estimator; batches() yields
+# (X, y) training chunks and may be called once per epoch
+OutOfCoreSpec = namedtuple("OutOfCoreSpec", "name fit log_name title")
+OUT_OF_CORE_MODELS = {}
+
+
+def register_out_of_core(name, log_name, title):
+    def wrap(fit):
+        OUT_OF_CORE_MODELS[name] = OutOfCoreSpec(name, fit, log_name, title)
+        return fit
+    return wrap
+
+
+def _read_chunks(files, chunk_rows):
+    for path in files:
+        path = Path(path)
+        if path.suffix == ".parquet":
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+def iter_chunks(files=FEATURE_FILES, chunk_rows=CHUNK_ROWS):
+    """DataFrames of at most chunk_rows rows from CSV and parquet feature files,
+    with split / domain / label taken from the segment metadata (like the
+    in-memory design matrix; old feature tables carry inverted test tags)."""
+    meta = build_metadata()
+    for chunk in _read_chunks(files, chunk_rows):
+        yield with_segment_labels(chunk, meta) if "segment_id" in chunk.columns else chunk
+
+
+def test_mask(chunk, test_share=TEST_SHARE):
+    """Hold-out rows of a chunk, decided by a stable hash of their segment_id."""
+    keys = chunk[ID_COLUMNS[0]] if ID_COLUMNS[0] in chunk.columns else chunk
+    h = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    return (h % 10_000) < test_share * 10_000
+
+
+StreamStats = namedtuple("StreamStats", "preprocessor feature_columns class_counts n_rows")
+
+
+def fit_preprocessor(files=FEATURE_FILES, target="label", chunk_rows=CHUNK_ROWS):
+    """build_preprocessor() fitted in two streaming passes over the feature files."""
+    # 1️⃣ Categories of the string columns and the class balance of the training rows
+    first, categories, class_counts, n_rows = None, {}, np.zeros(2, dtype=np.int64), 0
+    for chunk in iter_chunks(files, chunk_rows):
+        X = chunk.drop(columns=[target] + ID_COLUMNS, errors="ignore")
+        if first is None:
+            first = X.head(1)
+            categorical = split_columns(first)[1]
+        for col in categorical:
+            categories.setdefault(col, set()).update(X[col].dropna().unique())
+        class_counts += np.bincount(chunk[target][~test_mask(chunk)], minlength=2)[:2]
+        n_rows += len(chunk)
+    if first is None:
+        raise ValueError(f"no rows in {[str(f) for f in files]}")
+
+    preprocessor = build_preprocessor(first)
+    encode, scale = preprocessor.named_steps["encode"], preprocessor.named_steps["scale"]
+    categories = [sorted(categories.get(col) or [""]) for col in categorical]
+    encode.set_params(categorical__categories=categories)
+    # With the categories given, fitting the encoder only needs rows of the right shape
+    n = max([len(values) for values in categories] + [1])
+    sample = first.iloc[np.zeros(n, dtype=int)].reset_index(drop=True)
+    for col, values in zip(categorical, categories):
+        sample[col] = (values * n)[:n]
+    encode.fit(sample)
+
+    # 2️⃣ Streaming mean / variance of the encoded columns
+    feature_columns = list(first.columns)
+    for chunk in iter_chunks(files, chunk_rows):
+        scale.partial_fit(encode.transform(chunk[feature_columns]))
+    return StreamStats(preprocessor, feature_columns, class_counts, n_rows)
+
+
+def batches(files, target, chunk_rows, stats, hold_out=False):
+    """Encoded (X, y) of the training rows (or the hold-out rows), chunk by chunk."""
+    for chunk in iter_chunks(files, chunk_rows):
+        rows = chunk[test_mask(chunk) == hold_out]
+        if len(rows):
+            yield stats.preprocessor.transform(rows[stats.feature_columns]), rows[target].to_numpy()
+
+
+@register_out_of_core('SGDLogisticRegression', 'model_run_sgd', 'SGD Logistic Regression (out-of-core)')
+def _sgd_logistic_regression(batches, stats, n_jobs, params=None, epochs=5, seed=42):
+    # partial_fit can't compute class_weight='balanced' itself; same weights, from pass 1
+    counts = np.maximum(stats.class_counts, 1)
+    model = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=seed,
+                          class_weight={c: counts.sum() / (2 * counts[c]) for c in (0, 1)})
+    model.set_params(**(params or {}))
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        for X, y in batches():
+            order = rng.permutation(len(y))
+            model.partial_fit(X[order], y[order], classes=np.array([0, 1]))
+    return model
+
+
+@register_out_of_core('XGBoostExternal', 'model_run_xgb_ext', 'XGBoost (external memory)')
+def _xgboost_external(batches, stats, n_jobs, params=None, epochs=None, seed=None):
+    import xgboost as xgb
+
+    # Same hyperparameters as the in-memory XGBoost model
+    template = MODEL_REGISTRY['XGBoost'].build(n_jobs).set_params(**(params or {}))
+
+    class Chunks(xgb.DataIter):
+        def __init__(self, cache_prefix):
+            self._chunks = None
+            super().__init__(cache_prefix=cache_prefix)
+
+        def next(self, input_data):
+            if self._chunks is None:
+                self._chunks = batches()
+            try:
+                X, y = next(self._chunks)
+            except StopIteration:
+                return False
+            input_data(data=X, label=y)
+            return True
+
+        def reset(self):
+            self._chunks = None
+
+    with tempfile.TemporaryDirectory(prefix="xgb-external-") as cache:
+        train = xgb.ExtMemQuantileDMatrix(Chunks(os.path.join(cache, "pages")),
+                                          max_bin=template.max_bin or 256, nthread=n_jobs)
+        booster = xgb.train(dict(template.get_xgb_params(), tree_method="hist"), train,
+                            num_boost_round=template.n_estimators)
+        raw = booster.save_raw("ubj")
+        del booster, train  # both hold on to the cache pages until released
+    # Wrap the booster in the sklearn API the artifacts and exports expect
+    model = xgb.XGBClassifier()
+    model.load_model(bytearray(raw))
+    return model
+
+
+def metrics_from_confusion(cm):
+    """training.evaluate() metrics from a 2x2 confusion matrix."""
+    (tn, fp), (fn, tp) = cm
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "Accuracy": (tp + tn) / cm.sum(),
+        "Precision": precision,
+        "Recall": recall,
+        "F1-Score": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+def train_out_of_core(name, files=FEATURE_FILES, target="label", chunk_rows=CHUNK_ROWS, epochs=5,
+                      n_jobs=-1, params=None, stats=None):
+    """Fit, evaluate, log and register one out-of-core model, like training.train_model()."""
+    spec = OUT_OF_CORE_MODELS[name]
+    files = [Path(f) for f in files]
+    stats = stats or fit_preprocessor(files, target, chunk_rows)
+
+    start = time.perf_counter()
+    model = spec.fit(lambda: batches(files, target, chunk_rows, stats), stats, n_jobs, params, epochs=epochs)
+    fit_seconds = time.perf_counter() - start
+
+    cm = np.zeros((2, 2), dtype=np.int64)
+    for X, y in batches(files, target, chunk_rows, stats, hold_out=True):
+        cm += confusion_matrix(y, model.predict(X), labels=[0, 1])
+    metrics = metrics_from_confusion(cm)
+    log_filename = write_log(spec, metrics, cm)
+    print(f"Evaluation logged to {log_filename}")
+
+    key = design_key(files, target)
+    artifact = ModelArtifact.from_fitted(stats.preprocessor, model, stats.feature_columns, name,
+                                         metadata={"design_key": key, "n_jobs": n_jobs,
+                                                   "params": dict(params or {}),
+                                                   "out_of_core": {"chunk_rows": chunk_rows, "epochs": epochs}})
+    registry = ModelRegistry()
+    version = registry.register(artifact, metadata={"metrics": metrics})
+    model_file = registry.model_path(version)
+    run_id = record_run(name, metrics, params=params, data_hash=key, fit_seconds=fit_seconds, n_jobs=n_jobs,
+                        artifact_path=model_file, log_file=log_filename, source="out_of_core",
+                        model_version=version)
+    print(f"Model registered as version {version}")
+    return dict(run_id=run_id, model=name, version=version, **metrics, n_jobs=n_jobs,
+                fit_seconds=fit_seconds, log_file=str(log_filename), model_file=str(model_file))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train models on feature files chunk by chunk")
+    parser.add_argument("--models", nargs="+", choices=list(OUT_OF_CORE_MODELS), default=list(OUT_OF_CORE_MODELS))
+    parser.add_argument("--files", nargs="+", default=FEATURE_FILES, help="feature CSV / parquet files")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per chunk (bounds memory)")
+    parser.add_argument("--epochs", type=int, default=5, help="passes over the data for SGD")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = fit_preprocessor(args.files, chunk_rows=args.chunk_rows)
+    print(f"📊 Streaming statistics of {stats.n_rows} rows in {time.perf_counter() - start:.1f}s "
+          f"(training classes: {stats.class_counts.tolist()})")
+    results = [train_out_of_core(name, args.files, chunk_rows=args.chunk_rows, epochs=args.epochs,
+                                 n_jobs=args.n_jobs, stats=stats) for name in args.models]
+
+    print("\n=== 🧩 Out-of-core Training Summary ===")
+    print(pd.DataFrame(results)[["model", "Accuracy", "Precision", "Recall", "F1-Score", "fit_seconds"]]
+          .to_string(index=False))
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"\nPeak memory: {peak:.0f} MB with {args.chunk_rows} rows per chunk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# preprocessing.py
+# Shared, cached design matrix for the trainers and visualizers.
+#
+# The feature CSVs are parsed, one-hot encoded (identifiers and the split
+# left out, see model_artifact.ID_COLUMNS) and scaled once; the result is
+# cached as a float32 .npy (memory-mapped on load) together with the fitted
+# preprocessor, keyed by a hash of the feature files' contents. Split, domain
+# and label come from the segment metadata (ingestion.with_segment_labels),
+# since feature tables built before META_SOURCES was fixed carry inverted
+# test tags, so the metadata files are part of the key too.
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from ingestion import META_SOURCES, build_metadata, with_segment_labels
+from model_artifact import ID_COLUMNS, build_preprocessor
+
+DATA_FOLDER = Path(__file__).parent.parent / 'data'
+FEATURE_FILES = [DATA_FOLDER / 'features_train.csv', DATA_FOLDER / 'features_test.csv']
+CACHE_FOLDER = DATA_FOLDER / 'design_cache'
+
+# Bump when the way the design matrix is built changes
+PREPROCESSING_VERSION = "3"
+META_COLUMNS = ["segment_id", "split", "domain", "label"]
+
+
+class DesignMatrix:
+    """Scaled float32 features plus everything needed to rebuild or reuse them.
+
+    X                 scaled design matrix (n_rows, n_encoded), memory-mapped
+    y                 target vector
+    meta              segment_id / split / domain / label of every row
+    feature_columns   raw input columns, in the order the preprocessor expects
+    columns           encoded output column names
+    preprocessor      the fitted encode + scale pipeline
+    key               hash of the inputs, shared by everything cached from them
+    """
+
+    def __init__(self, X, y, meta, feature_columns, columns, preprocessor, key):
+        self.X = X
+        self.y = y
+        self.meta = meta
+        self.feature_columns = feature_columns
+        self.columns = columns
+        self.preprocessor = preprocessor
+        self.key = key
+
+    def __len__(self):
+        return len(self.y)
+
+
+def design_key(files, target, protocol=None):
+    """Hash of the inputs; runs under other protocols (e.g. "normal_only") on
+    the same files get keys of their own."""
+    h = hashlib.blake2b(digest_size=10)
+    h.update(f"{PREPROCESSING_VERSION}|{target}".encode())
+    if protocol:
+        h.update(f"|{protocol}".encode())
+    for path in files:
+        h.update(Path(path).name.encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    for *_, path in META_SOURCES:
+        h.update(Path(path).name.encode())
+        h.update(Path(path).read_bytes())
+    return h.hexdigest()
+
+
+def _build(files, target, folder):
+    df = pd.concat([pd.read_csv(path) for path in files], ignore_index=True)
+    df = with_segment_labels(df, build_metadata())
+    X = df.drop(columns=[target] + [c for c in ID_COLUMNS if c in df.columns and c != target])
+    y = df[target].to_numpy()
+    preprocessor = build_preprocessor(X)
+    X_scaled = preprocessor.fit_transform(X).astype(np.float32)
+
+    np.save(folder / "X.npy", X_scaled)
+    np.save(folder / "y.npy", y)
+    df[[c for c in META_COLUMNS if c in df.columns]].to_parquet(folder / "meta.parquet", index=False)
+    joblib.dump(preprocessor, folder / "preprocessor.joblib")
+    with open(folder / "columns.json", "w") as f:
+        json.dump({"feature_columns": list(X.columns),
+                   "columns": list(preprocessor.get_feature_names_out())}, f)
+
+
+def load_design_matrix(files=FEATURE_FILES, target="label", cache_folder=CACHE_FOLDER, rebuild=False):
+    """Design matrix for the given feature files, built at most once per content hash."""
+    files = [Path(p) for p in files]
+    key = design_key(files, target)
+    folder = Path(cache_folder) / key
+
+    if rebuild and folder.exists():
+        shutil.rmtree(folder)
+    if not folder.exists():
+        # Build into a scratch folder and rename it into place, so concurrent
+        # runs never see a half-written cache; the first rename wins
+        Path(cache_folder).mkdir(parents=True, exist_ok=True)
+        scratch = Path(tempfile.mkdtemp(dir=cache_folder, prefix=f".{key}-"))
+        try:
+            _build(files, target, scratch)
+            os.rename(scratch, folder)
+        except OSError:
+            if not folder.exists():
+                raise
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    with open(folder / "columns.json") as f:
+        columns = json.load(f)
+    return DesignMatrix(
+        X=np.load(folder / "X.npy", mmap_mode="r"),
+        y=np.load(folder / "y.npy"),
+        meta=pd.read_parquet(folder / "meta.parquet"),
+        feature_columns=columns["feature_columns"],
+        columns=columns["columns"],
+        preprocessor=joblib.load(folder / "preprocessor.joblib"),
+        key=key,
+    )
@@ -0,0 +1,555 @@
+# retrieval.py
+# Nearest-neighbour retrieval over maintenance-log entries and fault segments (the RAG engine's lookup).
+#
+#   python retrieval.py index                                         # segments of the feature CSVs
+#   python retrieval.py index --logs ../data/unstructured/*.log       # + log lines, only new ones embedded
+#   python retrieval.py query "belt slipping after a pressure spike" --where sensor=S1023 -k 5
+#   python retrieval.py similar 20240423_15_30_05_segment_0 --where domain=target label=1
+#
+# Two collections live under data/retrieval/, each a VectorIndex:
+#   logs       log lines that mention a sensor, fault or action (log_parser.py),
+#              embedded from their text; filters: source, sensor, fault, action
+#   segments   segments of features_train.csv / features_test.csv, embedded
+#              as their standardized signal features; filters: split, domain, label
+#
+# Text is embedded offline: character n-grams hashed into TEXT_DIM
+# dimensions (no model file, nothing to train, "overheated" lands near
+# "overheating"), or a sentence-transformers model from a local folder with
+# --model. Vectors are L2-normalised and scored by cosine similarity.
+#
+# Search goes through hnswlib (HNSW graph) or faiss (IndexHNSWFlat) when
+# installed and an exact NumPy scan otherwise. Filters are applied before
+# the scan when they leave few rows (EXACT_ROWS) and after the HNSW lookup,
+# which then fetches more candidates, when they don't. Candidates are
+# always re-scored exactly. Recent queries are answered from an LRU cache
+# that every insert clears.
+#
+# An index is a folder of append-only parts (vectors .npy + metadata
+# .parquet) plus the HNSW file, so inserting a batch writes only that batch;
+# replacing an item appends it again and marks the old row dead.
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from features import FEATURE_COLUMNS
+from ingestion import build_metadata, with_segment_labels
+from log_parser import entry_ids, parse_logs
+from preprocessing import DATA_FOLDER, FEATURE_FILES
+
+RETRIEVAL_FOLDER = DATA_FOLDER / 'retrieval'
+
+# Bump when the on-disk layout changes
+INDEX_VERSION = "1"
+BACKENDS = ["hnswlib", "faiss", "numpy"]
+TEXT_DIM = 256
+EXACT_ROWS = 50_000  # filtered subsets up to this size are scanned exactly
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF = 64
+CACHE_SIZE = 1024
+EMBED_BATCH = 50_000
+
+
+class HashingEmbedder:
+    """Character 3-5-gram hashing: stateless, so any process embeds text the same way."""
+
+    def __init__(self, dim=TEXT_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        self._vectorizer = HashingVectorizer(analyzer="char_wb", ngram_range=(3, 5), n_features=dim,
+                                             alternate_sign=True, norm="l2")
+
+    def __call__(self, texts):
+        return self._vectorizer.transform(texts).astype(np.float32).toarray()
+
+
+class SentenceEmbedder:
+    """A sentence-transformers model loaded from a local folder, on the CPU."""
+
+    def __init__(self, path):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError("--model needs sentence-transformers (pip install sentence-transformers); "
+                              "leave it out for the hashing embedder") from None
+        self.model = SentenceTransformer(str(path), device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{Path(path).name}"
+
+    def __call__(self, texts):
+        return self.model.encode(list(texts), batch_size=256, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _top_k(scores, k):
+    """Positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _available(backend):
+    try:
+        __import__(backend)
+    except ImportError:
+        return False
+    return True
+
+
+class _Hnswlib:
+    keeps_deleted = False
+
+    def __init__(self, dim, path=None):
+        import hnswlib
+
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        if path is not None and path.exists():
+            self.index.load_index(str(path))
+        else:
+            self.index.init_index(max_elements=1024, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+
+    def __len__(self):
+        return self.index.get_current_count()
+
+    def add(self, vectors, rows):
+        needed = len(self) + len(rows)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, rows)
+
+    def delete(self, rows):
+        for row in rows:
+            self.index.mark_deleted(int(row))
+
+    def query(self, vector, k):
+        self.index.set_ef(max(HNSW_EF, k))
+        labels, _ = self.index.knn_query(vector[None], k=k)
+        return labels[0].astype(np.int64)
+
+    def save(self, path):
+        self.index.save_index(str(path))
+
+
+class _Faiss:
+    # IndexHNSWFlat can't remove vectors: dead rows stay and are filtered out
+    keeps_deleted = True
+
+    def __init__(self, dim, path=None):
+        import faiss
+
+        self.faiss = faiss
+        if path is not None and path.exists():
+            self.index = faiss.read_index(str(path))
+        else:
+            self.index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def add(self, vectors, rows):
+        self.index.add(vectors)  # faiss numbers vectors in insertion order, like the rows
+
+    def delete(self, rows):
+        pass
+
+    def query(self, vector, k):
+        self.index.hnsw.efSearch = max(HNSW_EF, k)
+        _, labels = self.index.search(vector[None], k)
+        return labels[0][labels[0] >= 0].astype(np.int64)
+
+    def save(self, path):
+        self.faiss.write_index(self.index, str(path))
+
+
+ANN_CLASSES = {"hnswlib": _Hnswlib, "faiss": _Faiss}
+
+
+class VectorIndex:
+    """Persistent top-k index of L2-normalised vectors with metadata filters.
+
+    folder      where the index lives; an existing one is reopened as is
+    dim         vector size, needed to create an index
+    backend     "hnswlib", "faiss", "numpy" or "auto" (the first one installed);
+                an index built with a library missing here is searched exactly
+    info        settings kept with the index (embedder name, feature scaling)
+    embed       texts -> vectors, so search() also takes a string
+    """
+
+    def __init__(self, folder, dim=None, backend="auto", info=None, embed=None, cache_size=CACHE_SIZE):
+        self.folder = Path(folder)
+        self.embed = embed
+        self.cache_size = cache_size
+        config_file = self.folder / "index.json"
+        if config_file.exists():
+            self.config = json.loads(config_file.read_text())
+            if self.config["version"] != INDEX_VERSION:
+                raise ValueError(f"{self.folder} was built by another version of retrieval.py; rebuild it")
+        else:
+            if dim is None:
+                raise ValueError(f"no index in {self.folder}; give dim to create one")
+            if backend == "auto":
+                backend = next(b for b in BACKENDS if b == "numpy" or _available(b))
+            self.config = {"version": INDEX_VERSION, "dim": int(dim), "backend": backend,
+                           "info": info or {}, "parts": 0}
+        self.dim = self.config["dim"]
+        self.info = self.config["info"]
+
+        parts = range(self.config["parts"])
+        vectors = [np.load(self._part(i, "vectors.npy")) for i in parts]
+        self._buffer = np.concatenate(vectors) if vectors else np.empty((0, self.dim), dtype=np.float32)
+        self.n_rows = len(self._buffer)
+        self.items = pd.concat([pd.read_parquet(self._part(i, "items.parquet")) for i in parts],
+                               ignore_index=True) if vectors else pd.DataFrame({"id": pd.Series(dtype=object)})
+        self.tags = pd.concat([pd.read_parquet(self._part(i, "tags.parquet")) for i in parts],
+                              ignore_index=True) if vectors else pd.DataFrame(
+            {"row": pd.Series(dtype=np.int64), "key": pd.Series(dtype=object), "value": pd.Series(dtype=object)})
+        self.live = np.ones(self.n_rows, dtype=bool)
+        if (self.folder / "dead.npy").exists():
+            self.live[np.load(self.folder / "dead.npy")] = False
+        self._pending = []
+        self._open_ann()
+        self._refresh()
+
+    def _part(self, i, name):
+        return self.folder / f"part-{i:05d}-{name}"
+
+    def _open_ann(self):
+        self.backend = self.config["backend"]
+        self._ann = None
+        if self.backend not in ANN_CLASSES:
+            return
+        if not _available(self.backend):
+            print(f"⚠️ {self.backend} is not installed: searching {self.folder} exactly with NumPy")
+            self.backend = "numpy"
+            return
+        ann_cls = ANN_CLASSES[self.backend]
+        self._ann = ann_cls(self.dim, self.folder / f"{self.backend}.index")
+        if len(self._ann) > self.n_rows:  # saved ahead of an interrupted save()
+            self._ann = ann_cls(self.dim)
+        # Parts are append-only, so the HNSW graph only misses the last rows
+        behind = np.arange(len(self._ann), self.n_rows)
+        if len(behind):
+            self._ann.add(self._buffer[behind], behind)
+            if not self._ann.keeps_deleted:
+                self._ann.delete(behind[~self.live[behind]])
+
+    def _refresh(self):
+        self._live_rows = np.flatnonzero(self.live)
+        self._ids = pd.Index(self.items["id"].to_numpy()[self._live_rows])
+        self._cache = OrderedDict()
+        self._masks = {}
+
+    @property
+    def vectors(self):
+        return self._buffer[:self.n_rows]
+
+    def __len__(self):
+        return len(self._live_rows)
+
+    def contains(self, ids):
+        """Whether each id is in the index."""
+        return self._ids.get_indexer(pd.Index(ids, dtype=object)) >= 0
+
+    def metadata(self, ids):
+        """Metadata rows of `ids`, NaN for the ones not in the index."""
+        position = self._ids.get_indexer(pd.Index(ids, dtype=object))
+        rows = np.where(position >= 0, self._live_rows[position], -1)
+        return self.items.reindex(rows).reset_index(drop=True)
+
+    def add(self, ids, vectors, meta=None, tags=None):
+        """Insert items; an id already in the index is replaced.
+
+        meta   DataFrame of scalar metadata, one row per id
+        tags   DataFrame of id, key, value for metadata with several values
+               per item (the sensors a log line mentions)
+        """
+        ids = pd.Index(ids, dtype=object).astype(str)
+        vectors = _normalize(vectors).reshape(len(ids), self.dim)
+        items = pd.DataFrame({"id": ids})
+        if meta is not None:
+            items = pd.concat([items, meta.reset_index(drop=True)], axis=1)
+        keep = ~ids.duplicated(keep="last")
+        ids, vectors, items = ids[keep], vectors[keep], items[keep].reset_index(drop=True)
+
+        position = self._ids.get_indexer(ids)
+        replaced = self._live_rows[position[position >= 0]]
+        rows = np.arange(self.n_rows, self.n_rows + len(ids))
+        if self.n_rows + len(ids) > len(self._buffer):
+            buffer = np.empty((max(self.n_rows + len(ids), 2 * len(self._buffer)), self.dim), dtype=np.float32)
+            buffer[:self.n_rows] = self.vectors
+            self._buffer = buffer
+        self._buffer[rows] = vectors
+        self.n_rows += len(ids)
+        self.live = np.concatenate([self.live, np.ones(len(ids), dtype=bool)])
+        self.live[replaced] = False
+        # Concatenating onto the empty initial frame would upcast int columns to
+        # float, and a label filter of 1 would no longer match "1.0"
+        self.items = pd.concat([self.items, items], ignore_index=True) if len(self.items) else items
+
+        if tags is not None and len(tags):
+            tag_rows = ids.get_indexer(tags["id"].astype(str))
+            tags = pd.DataFrame({"row": rows[tag_rows[tag_rows >= 0]],
+                                 "key": tags["key"].to_numpy()[tag_rows >= 0],
+                                 "value": tags["value"].astype(str).to_numpy()[tag_rows >= 0]})
+        else:
+            tags = self.tags.iloc[:0]
+        self.tags = pd.concat([self.tags, tags], ignore_index=True)
+        if self._ann is not None:
+            self._ann.add(vectors, rows)
+            self._ann.delete(replaced)
+        self._pending.append((vectors, items, tags))
+        self._refresh()
+        return len(ids)
+
+    def save(self):
+        """Write the items added since the last save as a new part."""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        for vectors, items, tags in self._pending:
+            part = self.config["parts"]
+            np.save(self._part(part, "vectors.npy"), vectors)
+            items.to_parquet(self._part(part, "items.parquet"), index=False)
+            tags.to_parquet(self._part(part, "tags.parquet"), index=False)
+            self.config["parts"] += 1
+        self._pending = []
+        np.save(self.folder / "dead.npy", np.flatnonzero(~self.live))
+        if self._ann is not None:
+            path = self.folder / f"{self.backend}.index"
+            tmp = path.with_name(f".{path.name}-{os.getpid()}")
+            self._ann.save(tmp)
+            os.replace(tmp, path)
+        # Last: the config is what makes the new parts part of the index
+        tmp = self.folder / f".index-{os.getpid()}.json"
+        tmp.write_text(json.dumps(self.config, indent=2, default=str))
+        os.replace(tmp, self.folder / "index.json")
+
+    def _allowed(self, where):
+        """Live rows matching every filter: {column: value or list of values},
+        looked up in the metadata columns first, then in the tags."""
+        key = json.dumps(where, sort_keys=True, default=str)
+        if key in self._masks:
+            return self._masks[key]
+        mask = self.live.copy()
+        for column, values in (where or {}).items():
+            values = [str(v) for v in (values if isinstance(values, (list, tuple, set)) else [values])]
+            if column in self.items.columns and column != "id":
+                mask &= self.items[column].astype(str).isin(values).to_numpy()
+            elif column in set(self.tags["key"]):
+                match = np.zeros(self.n_rows, dtype=bool)
+                match[self.tags.loc[(self.tags["key"] == column) & self.tags["value"].isin(values), "row"]] = True
+                mask &= match
+            else:
+                raise KeyError(f"no metadata or tag '{column}' to filter on in {self.folder}")
+        self._masks[key] = mask
+        return mask
+
+    def _search_rows(self, vector, k, allowed):
+        n_allowed = int(allowed.sum())
+        if self._ann is not None and n_allowed > EXACT_ROWS:
+            limit = self.n_rows if self._ann.keeps_deleted else len(self._live_rows)
+            # Ask for enough candidates that ~k survive the filter, and for
+            # more until they do
+            fetch = min(limit, max(2 * k, int(2 * k * len(self._live_rows) / n_allowed)))
+            while True:
+                candidates = self._ann.query(vector, fetch)
+                candidates = candidates[allowed[candidates]]
+                if len(candidates) >= k or fetch >= limit:
+                    break
+                fetch = min(limit, 4 * fetch)
+        elif n_allowed == self.n_rows:
+            candidates = None  # every row: scan without copying the vectors
+        else:
+            candidates = np.flatnonzero(allowed)
+        if candidates is None:
+            scores = self.vectors @ vector
+            rows = _top_k(scores, k)
+            return rows, scores[rows]
+        scores = self.vectors[candidates] @ vector
+        top = _top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def search(self, query, k=10, where=None):
+        """Top-k items by cosine similarity to `query` (a vector, or a text
+        when the index has an embedder), best first, as a DataFrame of id,
+        score and the metadata."""
+        if isinstance(query, str):
+            key = ("text", query, k, json.dumps(where, sort_keys=True, default=str))
+        else:
+            query = np.asarray(query, dtype=np.float32)
+            key = ("vector", hashlib.blake2b(query.tobytes(), digest_size=16).hexdigest(), k,
+                   json.dumps(where, sort_keys=True, default=str))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key].copy()
+
+        if isinstance(query, str):
+            if self.embed is None:
+                raise ValueError(f"{self.folder} has no embedder for text queries")
+            query = self.embed([query])[0]
+        rows, scores = self._search_rows(_normalize(query).reshape(self.dim), k, self._allowed(where))
+        result = self.items.iloc[rows].reset_index(drop=True)
+        result.insert(1, "score", scores)
+
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result.copy()
+
+    def vector(self, item_id):
+        """Stored vector of one item (for "more like this" queries)."""
+        position = self._ids.get_indexer([str(item_id)])[0]
+        if position < 0:
+            raise KeyError(f"'{item_id}' is not in {self.folder}")
+        return self.vectors[self._live_rows[position]]
+
+
+def _row_hashes(frame):
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view(np.int64)
+
+
+def _changed(index, ids, hashes):
+    """New ids and ids whose content hash differs from the indexed one."""
+    ids = np.asarray(ids, dtype=object)
+    known = index.contains(ids)
+    changed = ~known
+    if known.any():
+        changed[known] = index.metadata(ids[known])["row_hash"].to_numpy() != hashes[known]
+    return changed
+
+
+def open_segments(folder=RETRIEVAL_FOLDER, backend="auto"):
+    """Segment collection; search() takes a scaled feature vector or a
+    segment_id, which finds the segments most like that one."""
+    index = VectorIndex(Path(folder) / "segments", len(FEATURE_COLUMNS), backend)
+    index.embed = lambda ids: np.stack([index.vector(i) for i in ids])
+    return index
+
+
+def open_logs(folder=RETRIEVAL_FOLDER, backend="auto", model=None):
+    """Log collection, embedding text with the hashing embedder or a local model folder."""
+    embedder = HashingEmbedder() if model is None else SentenceEmbedder(model)
+    index = VectorIndex(Path(folder) / "logs", embedder.dim, backend, info={"embedder": embedder.name},
+                        embed=embedder)
+    if index.info["embedder"] != embedder.name:
+        raise ValueError(f"{index.folder} was built with {index.info['embedder']}, not {embedder.name}")
+    return index
+
+
+def scale_features(index, frame):
+    """Standardized signal features, with the scaling fitted on the first rows indexed."""
+    X = frame[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    if "scaler" not in index.info:
+        std = X.std(axis=0)
+        index.info["scaler"] = {"mean": X.mean(axis=0).tolist(), "scale": np.where(std > 0, std, 1.0).tolist()}
+    scaler = index.info["scaler"]
+    return ((X - scaler["mean"]) / scaler["scale"]).astype(np.float32)
+
+
+def index_segments(index, files=FEATURE_FILES):
+    """Insert new and changed segments of the feature CSVs; returns how many.
+
+    Split, domain and label come from the segment metadata: the CSVs' own
+    test tags are inverted in tables built before META_SOURCES was fixed.
+    """
+    frame = pd.concat([pd.read_csv(p) for p in files], ignore_index=True).drop_duplicates("segment_id", keep="last")
+    frame = with_segment_labels(frame, build_metadata())
+    meta = frame[[c for c in ["split", "domain", "label"] if c in frame.columns]].copy()
+    meta["row_hash"] = _row_hashes(frame[FEATURE_COLUMNS + list(meta.columns)])
+    todo = _changed(index, frame["segment_id"], meta["row_hash"].to_numpy())
+    if not todo.any():
+        return 0
+    return index.add(frame["segment_id"][todo], scale_features(index, frame[todo]), meta[todo])
+
+
+def index_logs(index, paths, workers=None):
+    """Insert the log lines with entities that are new or changed; returns how many."""
+    entities = pd.concat(parse_logs(paths, workers), ignore_index=True)
+    entities["entry_id"] = entry_ids(entities)
+    entries = entities.drop_duplicates("entry_id").reset_index(drop=True)
+    meta = entries[["source", "line", "timestamp", "text"]].copy()
+    meta["row_hash"] = _row_hashes(entries[["source", "line", "text"]])
+    todo = np.flatnonzero(_changed(index, entries["entry_id"], meta["row_hash"].to_numpy()))
+    tags = entities[["entry_id", "kind", "value"]].set_axis(["id", "key", "value"], axis=1)
+    tags["key"] = tags["key"].astype(str)
+    added = 0
+    for start in range(0, len(todo), EMBED_BATCH):
+        rows = todo[start:start + EMBED_BATCH]
+        ids = entries["entry_id"].iloc[rows]
+        added += index.add(ids, index.embed(entries["text"].iloc[rows]), meta.iloc[rows],
+                           tags[tags["id"].isin(ids)])
+    return added
+
+
+def _where(pairs):
+    """["domain=target", "sensor=S1023,S1024"] -> {"domain": "target", "sensor": ["S1023", "S1024"]}"""
+    where = {}
+    for pair in pairs or []:
+        column, _, values = pair.partition("=")
+        values = values.split(",")
+        where[column] = values if len(values) > 1 else values[0]
+    return where
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector retrieval over log entries and segments")
+    parser.add_argument("--folder", default=RETRIEVAL_FOLDER, help="where the indexes live")
+    parser.add_argument("--backend", choices=["auto"] + BACKENDS, default="auto", help="for new indexes")
+    parser.add_argument("--model", help="local sentence-transformers folder for log text (default: hashing)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    index_cmd = sub.add_parser("index", help="insert new and changed segments and log lines")
+    index_cmd.add_argument("--logs", nargs="+", default=[], help="maintenance log files")
+    index_cmd.add_argument("--no-segments", action="store_true", help="leave the segment index alone")
+    index_cmd.add_argument("--workers", type=int, default=None, help="log parser processes")
+
+    for name, help in [("query", "log lines closest to a text"), ("similar", "segments closest to a segment")]:
+        cmd = sub.add_parser(name, help=help)
+        cmd.add_argument("query", help="text" if name == "query" else "segment_id")
+        cmd.add_argument("-k", type=int, default=10)
+        cmd.add_argument("--where", nargs="+", metavar="KEY=VALUE[,VALUE]", help="metadata filters")
+    args = parser.parse_args()
+
+    if args.command == "index":
+        jobs = []
+        if not args.no_segments:
+            jobs.append((open_segments(args.folder, args.backend), index_segments))
+        if args.logs:
+            jobs.append((open_logs(args.folder, args.backend, args.model),
+                         lambda index: index_logs(index, args.logs, args.workers)))
+        for index, insert in jobs:
+            start = time.perf_counter()
+            added = insert(index)
+            index.save()
+            print(f"✅ {index.folder.name}: {added} items embedded and inserted in "
+                  f"{time.perf_counter() - start:.1f}s, {len(index)} in the {index.backend} index")
+        return
+
+    index = open_logs(args.folder, args.backend, args.model) if args.command == "query" \
+        else open_segments(args.folder, args.backend)
+    where = _where(args.where)
+    for run in ["cold", "cached"]:
+        start = time.perf_counter()
+        result = index.search(args.query, args.k, where)
+        print(f"🔎 {run}: top {len(result)} of {len(index)} in {(time.perf_counter() - start) * 1000:.2f} ms")
+    pd.set_option("display.max_colwidth", 100)
+    print(result.drop(columns="row_hash").to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+# score.py
+# Batch scoring CLI and a lightweight asyncio HTTP service around the
+# promoted model (the registry's "best" alias, see model_registry.py).
+#
+#   python score.py score ../data/features_test.csv --out predictions.csv
+#   python score.py score ../data/imad/BrushlessMotor/test/imp23absu_mic_*.parquet
+#   python score.py score new_segments/*.parquet --domain target --drift   # + drift_monitor.py update
+#   python score.py serve --port 8080
+#
+# The service accepts POST /score with {"rows": [{feature: value, ...}, ...]}
+# or {"parquet": ["path/to/segment.parquet", ...]}, and GET /stats.
+# Concurrent requests are grouped into micro-batches before predict_proba.
+# When serving an alias the service follows promotions: a new version is
+# loaded in the background and swapped in between batches.
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from drift_monitor import DRIFT_STATE, DriftMonitor, print_report
+from features import FEATURE_COLUMNS, extract_features_batch
+from ingestion import MIC_COLUMN, read_waveform
+from model_registry import LiveModel, ModelRegistry, load_model
+
+
+def features_from_parquet(paths, domain=None):
+    """Feature rows for raw mic parquet segments (one row per file)."""
+    waveforms = [(Path(p), read_waveform(p)) for p in paths]
+    rows = []
+    by_length = {}
+    for path, waveform in waveforms:
+        if waveform is not None:
+            by_length.setdefault(len(waveform), []).append((path, waveform))
+    for group in by_length.values():
+        feats = extract_features_batch(np.stack([w for _, w in group]))
+        frame = pd.DataFrame(feats)
+        frame["segment_id"] = [p.stem for p, _ in group]
+        frame["source"] = [str(p) for p, _ in group]
+        rows.append(frame)
+    frame = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(columns=FEATURE_COLUMNS)
+    if domain:
+        frame["domain"] = domain
+    return frame
+
+
+def is_raw_segment(path):
+    """True for a recorded mic parquet file (as opposed to a feature table)."""
+    return Path(path).suffix == ".parquet" and MIC_COLUMN in pq.read_schema(path).names
+
+
+def load_rows(paths, domain=None):
+    """Feature rows from feature CSV/parquet tables and raw parquet segments."""
+    raw = [p for p in paths if is_raw_segment(p)]
+    frames = [features_from_parquet(raw, domain)] if raw else []
+    for path in paths:
+        if path in raw:
+            continue
+        frames.append(pd.read_csv(path) if Path(path).suffix == ".csv" else pd.read_parquet(path))
+    return pd.concat(frames, ignore_index=True)
+
+
+class LatencyStats:
+    """Rolling request latencies and request rate."""
+
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def record(self, seconds, rows=1):
+        self.latencies.append(seconds)
+        self.requests += 1
+        self.rows += rows
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        lat = np.array(self.latencies) * 1000
+        return {
+            "requests": self.requests,
+            "rows": self.rows,
+            "requests_per_sec": self.requests / elapsed if elapsed else 0.0,
+            "rows_per_sec": self.rows / elapsed if elapsed else 0.0,
+            "latency_p50_ms": float(np.percentile(lat, 50)) if len(lat) else None,
+            "latency_p99_ms": float(np.percentile(lat, 99)) if len(lat) else None,
+        }
+
+
+def score_batches(artifact, frame, batch_size):
+    """Score a frame in batches; returns (scores, per-batch latency stats)."""
+    stats = LatencyStats()
+    scores = np.empty(len(frame))
+    for start in range(0, len(frame), batch_size):
+        t = time.perf_counter()
+        batch = frame.iloc[start:start + batch_size]
+        scores[start:start + len(batch)] = artifact.score(batch)
+        stats.record(time.perf_counter() - t, len(batch))
+    return scores, stats
+
+
+def _resolve(future, result=None, error=None):
+    # A request cancelled while its batch ran (client disconnected) is
+    # already done; setting it again would kill the batcher task
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class MicroBatcher:
+    """Groups concurrent score requests into one predict_proba call.
+
+    A batch is flushed when it holds `max_batch` rows or `max_delay` seconds
+    after its first request arrived, whichever comes first. The model runs in
+    a worker thread so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, artifact, max_batch=512, max_delay=0.005):
+        self.artifact = artifact
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.batches = 0
+
+    async def score(self, frame):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((frame, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            rows = len(pending[0][0])
+            deadline = loop.time() + self.max_delay
+            while rows < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                rows += len(item[0])
+
+            frames = [frame for frame, _ in pending]
+            try:
+                scores = await loop.run_in_executor(None, self.artifact.score,
+                                                    pd.concat(frames, ignore_index=True))
+            except Exception as e:
+                # One bad request must not fail the others: retry each on its own
+                if len(pending) == 1:
+                    _resolve(pending[0][1], error=e)
+                    continue
+                for frame, future in pending:
+                    if future.done():  # its client went away
+                        continue
+                    try:
+                        _resolve(future, await loop.run_in_executor(None, self.artifact.score, frame))
+                    except Exception as e:
+                        _resolve(future, error=e)
+                self.batches += 1
+                continue
+            self.batches += 1
+            start = 0
+            for frame, future in pending:
+                _resolve(future, scores[start:start + len(frame)])
+                start += len(frame)
+
+
+class ScoringService:
+    def __init__(self, artifact, max_batch, max_delay, domain=None, reload_interval=5.0):
+        self.batcher = MicroBatcher(artifact, max_batch, max_delay)
+        self.stats = LatencyStats()
+        self.domain = domain
+        self.reload_interval = reload_interval
+
+    async def follow_promotions(self, live):
+        """Poll the alias; loading happens off the event loop so scoring never pauses."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                if await loop.run_in_executor(None, live.check):
+                    print(f"🔄 Now serving '{live.alias}' version {live.version}")
+            except Exception as e:  # keep serving the current model on a bad promotion
+                print(f"⚠️ Could not reload '{live.alias}': {e}")
+
+    async def handle_score(self, payload):
+        start = time.perf_counter()
+        if "parquet" in payload:
+            loop = asyncio.get_running_loop()
+            frame = await loop.run_in_executor(None, features_from_parquet, payload["parquet"],
+                                               payload.get("domain", self.domain))
+        else:
+            frame = pd.DataFrame(payload["rows"])
+        scores = await self.batcher.score(frame) if len(frame) else np.empty(0)
+        self.stats.record(time.perf_counter() - start, len(frame))
+        response = {"scores": [float(s) for s in scores]}
+        if "segment_id" in frame.columns:
+            response["segment_id"] = frame["segment_id"].astype(str).tolist()
+        return response
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: enough for local clients and load tests
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers, framed = {}, False
+                status, response = 200, None
+                try:
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        key, _, value = line.decode("latin-1").partition(":")
+                        headers[key.strip().lower()] = value.strip()
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(f"bad Content-Length {length}")
+                    body = await reader.readexactly(length)
+                    framed = True
+                    if method == "POST" and target == "/score":
+                        response = await self.handle_score(json.loads(body or b"{}"))
+                    elif method == "GET" and target == "/stats":
+                        response = dict(self.stats.summary(), batches=self.batcher.batches,
+                                        version=getattr(self.batcher.artifact, "version", None))
+                    elif method == "GET" and target == "/health":
+                        response = {"status": "ok"}
+                    else:
+                        status, response = 404, {"error": f"no route for {method} {target}"}
+                except (asyncio.IncompleteReadError, ConnectionResetError):
+                    raise
+                except (KeyError, ValueError) as e:
+                    status, response = 400, {"error": str(e)}
+                except Exception as e:
+                    print(f"⚠️ {type(e).__name__} while serving a request: {e}")
+                    status, response = 500, {"error": f"{type(e).__name__}: {e}"}
+
+                data = json.dumps(response).encode()
+                reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+                writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+                # After a malformed request the next one can't be found in the stream
+                if not framed or headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        tasks = [asyncio.create_task(self.batcher.run())]
+        if isinstance(self.batcher.artifact, LiveModel):
+            tasks.append(asyncio.create_task(self.follow_promotions(self.batcher.artifact)))
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"✅ Scoring service listening on http://{host}:{port} (POST /score, GET /stats)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score motor segments with the promoted model")
+    parser.add_argument("--model", default="best",
+                        help="registry alias, model version or artifact file to load")
+    parser.add_argument("--domain", help="domain to assume for raw parquet segments (source/target)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    score = sub.add_parser("score", help="score feature tables or raw parquet segments")
+    score.add_argument("inputs", nargs="+", help="feature CSV/parquet files or raw mic parquet segments")
+    score.add_argument("--out", help="write predictions to this CSV (default: print a summary)")
+    score.add_argument("--batch-size", type=int, default=4096)
+    score.add_argument("--drift", nargs="?", const=DRIFT_STATE, metavar="STATE",
+                       help="also add the rows to the drift monitor (default state: %(const)s) and report")
+
+    serve = sub.add_parser("serve", help="run the micro-batching HTTP service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--max-batch", type=int, default=512, help="rows per micro-batch")
+    serve.add_argument("--max-delay-ms", type=float, default=5.0,
+                       help="how long a micro-batch waits for more requests")
+    serve.add_argument("--reload-interval", type=float, default=5.0,
+                       help="seconds between checks for a newly promoted version")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        # An alias or version is followed live; a plain file is served as is
+        model = load_model(args.model) if Path(args.model).is_file() else LiveModel(args.model)
+        service = ScoringService(model, args.max_batch, args.max_delay_ms / 1000, args.domain,
+                                 args.reload_interval)
+        asyncio.run(service.serve(args.host, args.port))
+        return
+    if args.drift and not Path(args.drift).exists():
+        parser.error(f"no drift monitor state at {args.drift}; run `python drift_monitor.py baseline` first")
+
+    artifact = load_model(args.model)
+    frame = load_rows(args.inputs, args.domain)
+
+    scores, stats = score_batches(artifact, frame, args.batch_size)
+    result = frame[[c for c in ["segment_id", "split", "domain", "label"] if c in frame.columns]].copy()
+    result["score"] = scores
+    result["prediction"] = (scores >= 0.5).astype(int)
+    # Links the predictions to their model in the knowledge graph (graph_loader.py)
+    result["model_version"] = None if Path(args.model).is_file() else ModelRegistry().resolve(args.model)
+
+    summary = stats.summary()
+    print(f"Scored {len(frame)} rows in {stats.requests} batch(es): "
+          f"{summary['rows_per_sec']:.0f} rows/sec, batch latency "
+          f"p50 {summary['latency_p50_ms']:.2f} ms, p99 {summary['latency_p99_ms']:.2f} ms")
+    if args.out:
+        result.to_csv(args.out, index=False)
+        print(f"✅ Predictions saved to {args.out}")
+    else:
+        print(result.head())
+    if args.drift:
+        monitor = DriftMonitor.load(args.drift).update(frame)
+        monitor.save(args.drift)
+        print_report(monitor.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# streaming.py
+# Sliding-window feature extraction and fault scoring for live sensor feeds.
+#
+# Samples arrive in fixed-size blocks and go into a ring buffer. Every `hop`
+# samples a window of the last `window` samples is scored. The statistics of
+# extract_features() are kept incrementally: each block is summarised once
+# (count, mean, central moments, max, min) and block summaries are merged
+# over the window with a two-stack sliding aggregation, so no statistic is
+# recomputed over the whole window. Only the FFT for freq_peak looks at the
+# full (overlapping) window.
+#
+# The window defaults to the segment length of the waveform store the
+# models were trained on, since the features (signal_energy in particular)
+# depend on the window length. Each file is replayed as a feed of its own
+# unless --continuous treats the files as consecutive parts of one feed.
+import argparse
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+from scipy.fft import rfft
+
+from features import SAMPLE_RATES
+from ingestion import SENSORS
+from model_registry import load_model
+from waveform_store import STORE_PATH, WaveformStore
+
+Moments = namedtuple("Moments", "n mean m2 m3 m4 max min")
+
+
+def block_moments(x):
+    """Moments of one block of samples."""
+    x = np.asarray(x, dtype=np.float64)
+    mean = x.mean()
+    d = x - mean
+    d2 = d * d
+    return Moments(len(x), mean, d2.sum(), (d2 * d).sum(), (d2 * d2).sum(), x.max(), x.min())
+
+
+def merge_moments(a, b):
+    """Combine the moments of two disjoint sample sets (Pebay's formulas)."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    n = a.n + b.n
+    delta = b.mean - a.mean
+    delta_n = delta / n
+    mean = a.mean + b.n * delta_n
+    m2 = a.m2 + b.m2 + delta * delta_n * a.n * b.n
+    m3 = (a.m3 + b.m3 + delta * delta_n ** 2 * a.n * b.n * (a.n - b.n)
+          + 3 * delta_n * (a.n * b.m2 - b.n * a.m2))
+    m4 = (a.m4 + b.m4
+          + delta * delta_n ** 3 * a.n * b.n * (a.n * a.n - a.n * b.n + b.n * b.n)
+          + 6 * delta_n ** 2 * (a.n * a.n * b.m2 + b.n * b.n * a.m2)
+          + 4 * delta_n * (a.n * b.m3 - b.n * a.m3))
+    return Moments(n, mean, m2, m3, m4, max(a.max, b.max), min(a.min, b.min))
+
+
+class SlidingMoments:
+    """Moments over the most recent blocks; O(1) amortised push/pop/query."""
+
+    def __init__(self):
+        self._front = []   # (block, aggregate of this block and everything older in front)
+        self._back = []
+        self._back_agg = None
+
+    def push(self, m):
+        self._back.append(m)
+        self._back_agg = merge_moments(self._back_agg, m)
+
+    def pop(self):
+        if not self._front:
+            agg = None
+            while self._back:
+                m = self._back.pop()
+                agg = merge_moments(m, agg)
+                self._front.append((m, agg))
+            self._back_agg = None
+        return self._front.pop()[0]
+
+    def query(self):
+        front_agg = self._front[-1][1] if self._front else None
+        return merge_moments(front_agg, self._back_agg)
+
+
+class RingBuffer:
+    """Fixed-capacity sample buffer whose latest window is always contiguous.
+
+    Every sample is written twice (at i and i + capacity), so the last
+    `capacity` samples can be returned as a view without copying.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=np.float64)
+        self._pos = 0
+        self.count = 0
+
+    def write(self, block):
+        block = np.asarray(block, dtype=np.float64)[-self.capacity:]
+        n = len(block)
+        first = min(n, self.capacity - self._pos)
+        for start, part in ((self._pos, block[:first]), (0, block[first:])):
+            self._data[start:start + len(part)] = part
+            self._data[start + self.capacity:start + self.capacity + len(part)] = part
+        self._pos = (self._pos + n) % self.capacity
+        self.count += n
+
+    def latest(self):
+        return self._data[self._pos:self._pos + self.capacity]
+
+
+class StreamingFeatures:
+    """extract_features() over a sliding window of a single channel.
+
+    `hop` must be a multiple of `block_size` and `window` a multiple of `hop`,
+    so windows are made of whole blocks.
+    """
+
+    def __init__(self, window, hop, block_size):
+        if hop % block_size or window % hop:
+            raise ValueError("hop must be a multiple of block_size and window a multiple of hop")
+        self.window, self.hop, self.block_size = window, hop, block_size
+        self.buffer = RingBuffer(window)
+        self.moments = SlidingMoments()
+        self._blocks_in_window = 0
+        self._since_emit = 0
+        self._pending = np.empty(0)
+
+    def push(self, samples):
+        """Feed samples; returns a list of feature dicts, one per completed window."""
+        samples = np.concatenate([self._pending, np.asarray(samples, dtype=np.float64)])
+        n_blocks = len(samples) // self.block_size
+        self._pending = samples[n_blocks * self.block_size:]
+        out = []
+        for b in range(n_blocks):
+            block = samples[b * self.block_size:(b + 1) * self.block_size]
+            self.buffer.write(block)
+            self.moments.push(block_moments(block))
+            self._blocks_in_window += 1
+            if self._blocks_in_window * self.block_size > self.window:
+                self.moments.pop()
+                self._blocks_in_window -= 1
+            self._since_emit += self.block_size
+            if self.buffer.count >= self.window and self._since_emit >= self.hop:
+                self._since_emit = 0
+                out.append(self.features())
+        return out
+
+    def features(self):
+        """Features of the current window, matching extract_features()."""
+        m = self.moments.query()
+        n = m.n
+        var = m.m2 / n
+        std = np.sqrt(var)
+        scale = std + 1e-8
+        # z-scoring only rescales the central moments, so skew/kurt are unchanged
+        with np.errstate(divide="ignore", invalid="ignore"):
+            skew = (m.m3 / n) / var ** 1.5
+            kurt = (m.m4 / n) / var ** 2 - 3.0
+        window = self.buffer.latest()
+        power = np.abs(rfft(window - m.mean))
+        return {
+            "mean": 0.0,
+            "std": std / scale,
+            "skew": skew,
+            "kurt": kurt,
+            "max": (m.max - m.mean) / scale,
+            "min": (m.min - m.mean) / scale,
+            "freq_peak": int(np.argmax(power)),
+            # Parseval: sum |FFT(z)|^2 = n * sum(z^2)
+            "signal_energy": n * n * var / scale ** 2,
+        }
+
+
+class StreamingScorer:
+    """Turns windows of a live feed into fault scores with a saved model.
+
+    The model must accept a list of row dicts with the feature columns plus
+    the `metadata` columns (e.g. domain) and expose predict_proba(); exported
+    registry models turn them into a feature matrix without pandas.
+    """
+
+    def __init__(self, model, window, hop, block_size, metadata=None):
+        self.model = model
+        self.metadata = metadata or {}
+        self.extractor = StreamingFeatures(window, hop, block_size)
+
+    def push(self, samples):
+        """Returns a list of (features, score) for every window completed by `samples`."""
+        windows = self.extractor.push(samples)
+        if not windows or self.model is None:
+            return [(f, None) for f in windows]
+        scores = self.model.predict_proba([dict(features, **self.metadata) for features in windows])[:, 1]
+        return list(zip(windows, scores))
+
+
+def training_window(sensor, store_path=STORE_PATH):
+    """Segment length of `sensor` in the waveform store features were extracted from."""
+    lengths = WaveformStore(store_path).index[f"{sensor}_length"].unique()
+    if len(lengths) != 1:
+        raise ValueError(f"{sensor} segments in {store_path} have {len(lengths)} different lengths")
+    return int(lengths[0])
+
+
+def replay(parquet_path, scorer, column, block_size, sample_rate, speed=0.0):
+    """Feed a recorded parquet file through the scorer block by block.
+
+    speed=1 paces blocks at real time, 2 at twice real time, and 0 (default)
+    as fast as possible. Returns per-window latencies and throughput.
+    """
+    signal = pq.read_table(parquet_path, columns=[column]).column(0).to_numpy()
+    latencies = []
+    start = time.perf_counter()
+    for i in range(0, len(signal), block_size):
+        if speed:
+            due = start + (i + block_size) / (sample_rate * speed)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        arrived = time.perf_counter()
+        results = scorer.push(signal[i:i + block_size])
+        if results:
+            latencies.append(time.perf_counter() - arrived)
+    elapsed = time.perf_counter() - start
+    return {
+        "samples": len(signal),
+        "windows": len(latencies),
+        "seconds": elapsed,
+        "samples_per_sec": len(signal) / elapsed,
+        "realtime_factor": len(signal) / sample_rate / elapsed,
+        "latency_p50_ms": 1000 * np.percentile(latencies, 50) if latencies else np.nan,
+        "latency_p99_ms": 1000 * np.percentile(latencies, 99) if latencies else np.nan,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay IMAD-DS parquet files through the streaming scorer")
+    parser.add_argument("parquet", nargs="+", help="recorded sensor parquet file(s)")
+    parser.add_argument("--sensor", choices=list(SENSORS), default="mic")
+    parser.add_argument("--axis", help="axis of a multi-axis sensor (default: first)")
+    parser.add_argument("--sample-rate", type=float, help="default: the rate of --sensor")
+    parser.add_argument("--block-size", type=int, help="default: window / 100")
+    parser.add_argument("--hop", type=int, help="default: 10 blocks")
+    parser.add_argument("--window", type=int,
+                        help="default: the training segment length in the waveform store "
+                             "(any other length needs --allow-window-mismatch)")
+    parser.add_argument("--allow-window-mismatch", action="store_true",
+                        help="score windows of another length than the training segments")
+    parser.add_argument("--store", default=STORE_PATH, help="waveform store the models were trained on")
+    parser.add_argument("--continuous", action="store_true",
+                        help="replay the files as one feed, so windows span file boundaries")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="1 = real time, N = N times real time, 0 = as fast as possible")
+    parser.add_argument("--model", default="best",
+                        help="registry alias, version or artifact file to score with "
+                             "('none' to only extract features)")
+    parser.add_argument("--domain", default="source", help="domain passed to the model")
+    args = parser.parse_args()
+
+    # The features only match the training rows over windows of the training segment length
+    try:
+        trained = training_window(args.sensor, args.store)
+    except (OSError, KeyError, ValueError) as e:
+        if args.window is None or not args.allow_window_mismatch:
+            parser.error(f"cannot read the training segment length ({e}); "
+                         f"pass --window with --allow-window-mismatch")
+        trained = None
+    window = args.window or trained
+    if window != trained and not args.allow_window_mismatch:
+        parser.error(f"--window {window} differs from the {trained}-sample training segments; "
+                     f"features would not match the model (see --allow-window-mismatch)")
+    block_size = args.block_size or window // 100
+    hop = args.hop or 10 * block_size
+    sample_rate = args.sample_rate or SAMPLE_RATES[args.sensor]
+
+    model = None if args.model == "none" else load_model(args.model)
+    axes = SENSORS[args.sensor][1]
+    column = axes[args.axis] if args.axis else next(iter(axes.values()))
+
+    def new_scorer():
+        try:
+            return StreamingScorer(model, window, hop, block_size, metadata={"domain": args.domain})
+        except ValueError as e:
+            parser.error(f"{e} (window {window}, hop {hop}, block size {block_size})")
+
+    scorer = new_scorer()
+    for path in args.parquet:
+        if not args.continuous:
+            scorer = new_scorer()
+        stats = replay(path, scorer, column, block_size, sample_rate, args.speed)
+        if not stats["windows"] and not args.continuous:
+            print(f"⚠️ {Path(path).name} is shorter than the {window}-sample window; "
+                  f"use --continuous to join consecutive files")
+        print(f"{Path(path).name}: " + ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                                                for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# test_features.py
+# The batched feature extractor must reproduce extract_features() segment by
+# segment. Run from notebooks/ with: python -m pytest -q test_features.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import FEATURE_COLUMNS, extract_features, extract_features_batch
+
+
+def synthetic_batch(n_samples, seed=0):
+    """Noise, tones, a square wave and constant signals of length n_samples.
+
+    (A lone spike is left out on purpose: its spectrum is flat, so the peak
+    bin is decided by rounding noise in either implementation.)
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_samples)
+    return np.vstack([
+        rng.standard_normal(n_samples),
+        3.0 + 0.5 * rng.standard_normal(n_samples),
+        np.sin(2 * np.pi * 7 * t / n_samples) + 0.1 * rng.standard_normal(n_samples),
+        np.sin(2 * np.pi * 0.37 * t) * 1e3,
+        np.sign(np.sin(2 * np.pi * 3 * t / n_samples + 0.1)) + 0.05 * rng.standard_normal(n_samples),
+        np.zeros(n_samples),
+        np.full(n_samples, -2.5),
+    ])
+
+
+@pytest.mark.parametrize("n_samples", [1, 2, 7, 64, 255, 1001])
+def test_batch_matches_per_segment(n_samples):
+    signals = synthetic_batch(n_samples, seed=n_samples)
+    expected = pd.DataFrame([extract_features(s) for s in signals])[FEATURE_COLUMNS]
+    actual = pd.DataFrame(extract_features_batch(signals))[FEATURE_COLUMNS]
+
+    np.testing.assert_array_equal(actual["freq_peak"].to_numpy(float), expected["freq_peak"].to_numpy(float))
+    for col in FEATURE_COLUMNS:
+        if col == "freq_peak":
+            continue
+        np.testing.assert_allclose(actual[col].to_numpy(float), expected[col].to_numpy(float),
+                                   rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=col)
+
+
+def test_empty_batch_is_nan():
+    out = extract_features_batch(np.empty((3, 0)))
+    assert all(np.isnan(out[col]).all() for col in FEATURE_COLUMNS)
@@ -0,0 +1,55 @@
+# train_models.py
+# Train any set of registered models concurrently on the shared design matrix.
+#
+#   python train_models.py                                  # every model, all cores
+#   python train_models.py --models RandomForest XGBoost --cpus 8
+#
+# Each model runs in its own process with a share of the CPU budget (its
+# n_jobs plus a matching BLAS/OpenMP limit), so XGBoost threads and forest
+# trees don't oversubscribe the cores; with fewer cores than models, at most
+# --cpus single-threaded models run at a time. The design matrix is built once and
+# memory-mapped by every worker.
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from preprocessing import load_design_matrix
+from training import MODEL_REGISTRY, max_concurrent, split_cpus, train_model
+
+
+def train_models(names, cpus):
+    """Train `names` concurrently within `cpus` cores; returns one result row per model."""
+    load_design_matrix()  # build the cache once, before the workers race for it
+    budget = split_cpus(names, cpus)
+    results = []
+    with ProcessPoolExecutor(max_workers=max_concurrent(names, cpus)) as pool:
+        futures = {pool.submit(train_model, name, budget[name]): name for name in names}
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"✅ {result['model']} ({result['n_jobs']} threads): "
+                  f"F1 {result['F1-Score']:.4f} in {result['fit_seconds']:.1f}s")
+            results.append(result)
+    return pd.DataFrame(results).sort_values(by="F1-Score", ascending=False).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train registered models concurrently")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_REGISTRY), default=list(MODEL_REGISTRY))
+    parser.add_argument("--cpus", type=int, default=os.cpu_count(), help="total cores to use")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = train_models(args.models, args.cpus)
+    wall = time.perf_counter() - start
+
+    print("\n=== 🧩 Training Summary ===")
+    print(summary[["model", "Accuracy", "Precision", "Recall", "F1-Score", "n_jobs", "fit_seconds"]]
+          .to_string(index=False))
+    print(f"\nSweep took {wall:.1f}s (fits sum to {summary['fit_seconds'].sum():.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
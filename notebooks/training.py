@@ -0,0 +1,182 @@
+# training.py
+# Registry of the classifiers we train, plus the split / fit / evaluate /
+# log / save steps shared by the TrainClassifiers scripts and train_models.py.
+import logging
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+from sklearn.model_selection import train_test_split
+from threadpoolctl import threadpool_limits
+
+from metrics_store import record_run
+from model_artifact import ModelArtifact
+from model_registry import ModelRegistry
+from preprocessing import load_design_matrix
+
+LOG_FOLDER = Path(__file__).parent.parent / 'loghub'
+
+# build(n_jobs) -> unfitted estimator. log_name is the loghub file prefix
+# 06_compare_models.py recognises; max_jobs caps models that can't use more
+# threads (None = scales with cores)
+ModelSpec = namedtuple("ModelSpec", "name build log_name title max_jobs")
+MODEL_REGISTRY = {}
+
+
+def register_model(name, log_name, title, max_jobs=None):
+    def wrap(build):
+        MODEL_REGISTRY[name] = ModelSpec(name, build, log_name, title, max_jobs)
+        return build
+    return wrap
+
+
+@register_model('LogisticRegression', 'model_run', 'Logistic Regression', max_jobs=1)
+def _logistic_regression(n_jobs):
+    return LogisticRegression(max_iter=1000, class_weight='balanced')  # class_weight for imbalanced dataset
+
+
+@register_model('RandomForest', 'Rfmodel_run_rf', 'Random Forest')
+def _random_forest(n_jobs):
+    return RandomForestClassifier(
+        n_estimators=200,
+        max_depth=10,
+        class_weight='balanced',
+        random_state=42,
+        n_jobs=n_jobs,
+    )
+
+
+@register_model('XGBoost', 'model_run_xgb', 'XGBoost')
+def _xgboost(n_jobs):
+    from xgboost import XGBClassifier
+    return XGBClassifier(
+        n_estimators=300,
+        learning_rate=0.05,
+        max_depth=6,
+        subsample=0.8,
+        colsample_bytree=0.8,
+        scale_pos_weight=1,
+        eval_metric='logloss',
+        random_state=42,
+        n_jobs=n_jobs,
+    )
+
+
+def split_cpus(names, cpus):
+    """Threads per model so that the models running at once use about `cpus` cores.
+
+    Every model gets one thread; the rest are handed out round-robin to the
+    models that can use more than one. With fewer cores than models each
+    model gets a single thread, and the caller must run at most
+    max_concurrent(names, cpus) of them at a time to stay within budget.
+    """
+    if cpus < 1:
+        raise ValueError(f"need at least one CPU, got {cpus}")
+    budget = {name: 1 for name in names}
+    spare = max(cpus - len(names), 0)
+    growing = [name for name in names if (MODEL_REGISTRY[name].max_jobs or cpus) > 1]
+    while spare > 0 and growing:
+        for name in list(growing):
+            if spare == 0:
+                break
+            budget[name] += 1
+            spare -= 1
+            if budget[name] == MODEL_REGISTRY[name].max_jobs:
+                growing.remove(name)
+    return budget
+
+
+def max_concurrent(names, cpus):
+    """How many of `names` to train at once so split_cpus() stays within `cpus`."""
+    return max(1, min(len(names), cpus))
+
+
+def split_design(design):
+    """The stratified 80/20 split every trainer has always used."""
+    return train_test_split(design.X, design.y, test_size=0.2, random_state=42, stratify=design.y)
+
+
+def evaluate(y_true, y_pred):
+    return {
+        "Accuracy": accuracy_score(y_true, y_pred),
+        "Precision": precision_score(y_true, y_pred),
+        "Recall": recall_score(y_true, y_pred),
+        "F1-Score": f1_score(y_true, y_pred),
+    }
+
+
+def next_log_file(base_name, folder=LOG_FOLDER):
+    """Claim the next free <base_name>_<i>.txt; safe with concurrent runs."""
+    folder.mkdir(parents=True, exist_ok=True)
+    i = 1
+    while True:
+        path = folder / f"{base_name}_{i}.txt"
+        try:
+            open(path, "x").close()
+            return path
+        except FileExistsError:
+            i += 1
+
+
+def write_log(spec, metrics, cm):
+    log_filename = next_log_file(spec.log_name)
+    logger = logging.getLogger(f"training.{spec.name}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logging.FileHandler(log_filename)
+    handler.setFormatter(logging.Formatter('%(asctime)s | %(levelname)s | %(message)s',
+                                          datefmt='%Y-%m-%d %H:%M:%S'))
+    logger.addHandler(handler)
+    try:
+        logger.info(f"=== {spec.title} Evaluation ===")
+        for name, value in metrics.items():
+            logger.info(f"{name}: {value:.4f}")
+        logger.info(f"Confusion Matrix:\n{cm}\n")
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    return log_filename
+
+
+def build_model(name, n_jobs=-1, params=None):
+    """Registered estimator with `params` (e.g. tuned ones) overriding its defaults."""
+    return MODEL_REGISTRY[name].build(n_jobs).set_params(**(params or {}))
+
+
+def train_model(name, n_jobs=-1, design=None, params=None):
+    """Fit one registered model on the shared design matrix, log and save it.
+
+    `params` override the registered hyperparameters (see tuning.py).
+    Returns the metrics plus fit time and output paths.
+    """
+    spec = MODEL_REGISTRY[name]
+    design = design if design is not None else load_design_matrix()
+    X_train, X_test, y_train, y_test = split_design(design)
+
+    model = build_model(name, n_jobs, params)
+    start = time.perf_counter()
+    # Also cap the BLAS / OpenMP pools, so concurrent runs stay within their share
+    with threadpool_limits(limits=None if n_jobs == -1 else n_jobs):
+        model.fit(X_train, y_train)
+        y_pred = model.predict(X_test)
+    fit_seconds = time.perf_counter() - start
+
+    metrics = evaluate(y_test, y_pred)
+    log_filename = write_log(spec, metrics, confusion_matrix(y_test, y_pred))
+    print(f"Evaluation logged to {log_filename}")
+
+    # Every run becomes an immutable registry version; 07_save_best_models.py promotes one
+    artifact = ModelArtifact.from_fitted(design.preprocessor, model, design.feature_columns, name,
+                                         metadata={"design_key": design.key, "n_jobs": n_jobs,
+                                                   "params": dict(params or {})})
+    registry = ModelRegistry()
+    version = registry.register(artifact, metadata={"metrics": metrics})
+    model_file = registry.model_path(version)
+    run_id = record_run(name, metrics, params=params, data_hash=design.key, fit_seconds=fit_seconds,
+                        n_jobs=n_jobs, artifact_path=model_file, log_file=log_filename, model_version=version)
+    print(f"Model registered as version {version}")
+    return dict(run_id=run_id, model=name, version=version, **metrics, n_jobs=n_jobs,
+                fit_seconds=fit_seconds, log_file=str(log_filename), model_file=str(model_file))
@@ -0,0 +1,335 @@
+# tree_inference.py
+# Tree ensembles as flat NumPy arrays, scored without sklearn / xgboost.
+#
+# The nodes of all trees live in one set of arrays, and both children of a
+# leaf point back to the leaf itself. Descending a fixed number of levels
+# therefore lands every (row, tree) pair on its leaf with a handful of
+# vectorized gathers per level and no per-node branching, for one row or
+# for a batch. The arrays are saved as plain .npy files and loaded with
+# mmap_mode="r", so scoring processes share one copy through the page cache.
+#
+# Both ensembles reproduce their library's arithmetic exactly (input dtype,
+# split comparison, accumulation order), so predict_proba is bit-identical.
+import ctypes
+import ctypes.util
+import json
+from pathlib import Path
+
+import numpy as np
+
+NODE_ARRAYS = ["roots", "children", "feature", "threshold", "missing_left"]
+
+
+def _descend(X, roots, children, feature, threshold, missing_left, depth, strict):
+    """Leaf of every (row, tree), shape (n_rows, n_trees).
+
+    `strict` sends x < threshold left (XGBoost), otherwise x <= threshold (sklearn).
+    """
+    n_rows, n_features = X.shape
+    values = X.ravel()
+    has_nan = np.isnan(values).any()
+    children = children.ravel()  # node's children at 2 * node (left) and 2 * node + 1 (right)
+    if n_rows == 1:
+        # A single row indexes X directly; every NumPy call saved per level counts here
+        node = roots
+    else:
+        node = np.tile(roots, (n_rows, 1))
+        row_offset = (np.arange(n_rows) * n_features)[:, None]
+    for _ in range(depth):
+        index = feature.take(node)
+        if n_rows > 1:
+            index += row_offset
+        x = values.take(index)
+        bound = threshold.take(node)
+        go_right = x >= bound if strict else x > bound
+        if has_nan:
+            go_right = np.where(np.isnan(x), ~missing_left.take(node), go_right)
+        node = children.take((node << 1) + go_right)
+    return node.reshape(n_rows, len(roots))
+
+
+def _flatten(trees):
+    """Concatenate per-tree (left, right, feature, threshold, missing_left) arrays.
+
+    Children are tree-local with -1 for a leaf; leaves become self-loops.
+    """
+    roots, parts = [], {name: [] for name in NODE_ARRAYS[1:]}
+    offset = 0
+    for left, right, feature, threshold, missing_left in trees:
+        nodes = np.arange(len(left)) + offset
+        leaf = np.asarray(left) == -1
+        roots.append(offset)
+        parts["children"].append(np.where(leaf[:, None], nodes[:, None],
+                                          np.column_stack([left, right]) + offset))
+        parts["feature"].append(np.where(leaf, 0, feature))
+        parts["threshold"].append(threshold)
+        parts["missing_left"].append(np.asarray(missing_left, dtype=bool))
+        offset += len(left)
+    arrays = {name: np.concatenate(values) for name, values in parts.items()}
+    arrays["roots"] = np.asarray(roots, dtype=np.intp)
+    for name in ("children", "feature"):
+        arrays[name] = arrays[name].astype(np.intp)
+    return arrays
+
+
+def sklearn_tree_arrays(estimators):
+    """Node arrays (NODE_ARRAYS) and maximum depth of fitted sklearn trees."""
+    arrays = _flatten([(e.tree_.children_left, e.tree_.children_right, e.tree_.feature,
+                        e.tree_.threshold, e.tree_.missing_go_to_left) for e in estimators])
+    arrays["threshold"] = arrays["threshold"].astype(np.float64)
+    return arrays, max(e.tree_.max_depth for e in estimators)
+
+
+def _save_arrays(obj, folder, names, info):
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        np.save(folder / f"{name}.npy", np.ascontiguousarray(getattr(obj, name)))
+    with open(folder / "info.json", "w") as f:
+        json.dump(info, f)
+
+
+def _load_arrays(folder, names, mmap_mode):
+    folder = Path(folder)
+    with open(folder / "info.json") as f:
+        info = json.load(f)
+    # Plain ndarray views of the mapping: np.memmap's subclass hooks would run on every take()
+    return {name: np.asarray(np.load(folder / f"{name}.npy", mmap_mode=mmap_mode)) for name in names}, info
+
+
+class FlatForest:
+    """A fitted sklearn forest classifier as node arrays.
+
+    roots         first node of every tree
+    children      (left, right) global child indices (a leaf points to itself)
+    feature       split feature of every node
+    threshold     split threshold (float64, as sklearn stores it)
+    missing_left  where a NaN goes at every node
+    value         class fractions of every node (n_nodes, n_classes)
+
+    Like sklearn, inputs are cast to float32, compared with `<=` against the
+    float64 thresholds, and the per-tree fractions are summed in tree order
+    and divided by the number of trees: the result is bit-identical to a
+    single-threaded RandomForestClassifier.predict_proba.
+    """
+
+    ARRAYS = NODE_ARRAYS + ["value"]
+
+    def __init__(self, roots, children, feature, threshold, missing_left, value, classes, depth):
+        self.roots = roots
+        self.children = children
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_left = missing_left
+        self.value = value
+        self.classes_ = np.asarray(classes)
+        self.depth = depth
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        arrays, depth = sklearn_tree_arrays(forest.estimators_)
+        value = np.concatenate([e.tree_.value[:, 0, :] for e in forest.estimators_]).astype(np.float64)
+        # Older scikit-learn stores class counts per node, newer the fractions:
+        # normalize each node like DecisionTreeClassifier.predict_proba
+        total = value.sum(axis=1, keepdims=True)
+        total[total == 0.0] = 1.0
+        arrays["value"] = value / total
+        return cls(**arrays, classes=forest.classes_, depth=depth)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """Leaf index of every (row, tree), shape (n_rows, n_trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        return _descend(X, self.roots, self.children, self.feature, self.threshold,
+                        self.missing_left, self.depth, strict=False)
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        # cumsum adds the trees strictly one after another, like sklearn's
+        # accumulation (np.sum may switch to pairwise summation)
+        proba = np.cumsum(self.value[leaves.T], axis=0)[-1]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def save(self, folder):
+        _save_arrays(self, folder, self.ARRAYS, {"classes": self.classes_.tolist(), "depth": int(self.depth)})
+
+    @classmethod
+    def load(cls, folder, mmap_mode="r"):
+        arrays, info = _load_arrays(folder, cls.ARRAYS, mmap_mode)
+        return cls(**arrays, classes=info["classes"], depth=info["depth"])
+
+
+def _libm(name):
+    """A float32 function of the C math library, which XGBoost uses (NumPy's
+    float32 exp and log sometimes round differently)."""
+    try:
+        func = getattr(ctypes.CDLL(ctypes.util.find_library("m") or ctypes.util.find_library("c")), name)
+    except (OSError, AttributeError, TypeError):
+        return None
+    func.restype = ctypes.c_float
+    func.argtypes = [ctypes.c_float]
+    return func
+
+
+_EXPF = _libm("expf")
+_LOGF = _libm("logf")
+
+
+# Batches above this many rows take the vectorized sigmoid: expf through
+# ctypes is one Python call per row
+SIGMOID_ROWS = 16
+# glibc's expf is within 0.502 ULP, so it can only round differently from the
+# exact value when that lies within 0.002 ULP of a float32 rounding midpoint
+EXPF_MARGIN = 0.01
+
+
+def _expf_batch(x):
+    """expf of a float32 array: exp in float64 rounded to float32, with expf
+    called only for the few values close enough to a rounding midpoint (or
+    out of the normal range) that the two could differ."""
+    with np.errstate(over="ignore", invalid="ignore"):
+        e64 = np.exp(x.astype(np.float64))
+        e = e64.astype(np.float32)
+        other = np.nextafter(e, np.where(e64 > e, np.float32(np.inf), np.float32(-np.inf)))
+        midpoint = (e.astype(np.float64) + other) / 2
+        near = np.abs(e64 - midpoint) < EXPF_MARGIN * np.abs(other.astype(np.float64) - e)
+    near |= ~np.isfinite(e) | (e < np.finfo(np.float32).tiny)
+    if near.any():
+        e[near] = np.fromiter(map(_EXPF, x[near].tolist()), dtype=np.float32, count=int(near.sum()))
+    return e
+
+
+def _sigmoid32(margin, vectorized=True):
+    if _EXPF is None:  # closest NumPy equivalent; export verification catches any difference
+        e = np.exp(-margin.astype(np.float64)).astype(np.float32)
+    elif vectorized and len(margin) > SIGMOID_ROWS:
+        e = _expf_batch(-margin)
+    else:
+        e = np.fromiter(map(_EXPF, (-margin).tolist()), dtype=np.float32, count=len(margin))
+    return np.float32(1) / (e + np.float32(1))
+
+
+def _logit32(p):
+    odds = np.float32(1) / np.float32(p) - np.float32(1)
+    return -np.float32(_LOGF(odds) if _LOGF is not None else np.log(odds))
+
+
+class UnsupportedModel(ValueError):
+    pass
+
+
+class FlatBooster:
+    """A binary:logistic XGBoost classifier as node arrays.
+
+    Same node layout as FlatForest; `value` holds the leaf weights. Like
+    XGBoost, inputs are float32 and compared with `<` against float32 split
+    conditions, NaN follows the default direction, the margin starts at the
+    base score and adds the trees in order in float32, and the sigmoid uses
+    the C library's expf. Batches of more than SIGMOID_ROWS rows compute it
+    vectorized (see _expf_batch) when vector_sigmoid is set, which export
+    verification only keeps if it matches XGBoost on the probe rows.
+    """
+
+    ARRAYS = NODE_ARRAYS + ["value"]
+
+    def __init__(self, roots, children, feature, threshold, missing_left, value, base_margin, depth,
+                 vector_sigmoid=True):
+        self.roots = roots
+        self.children = children
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_left = missing_left
+        self.value = value
+        self.base_margin = np.float32(base_margin)
+        self.depth = depth
+        self.vector_sigmoid = vector_sigmoid
+        self.classes_ = np.array([0, 1])
+
+    @classmethod
+    def from_xgboost(cls, model):
+        booster = model.get_booster()
+        learner = json.loads(booster.save_raw("json"))["learner"]
+        gbm = learner["gradient_booster"]
+        if learner["objective"]["name"] != "binary:logistic" or gbm["name"] != "gbtree":
+            raise UnsupportedModel(f"only binary:logistic gbtree boosters can be flattened, "
+                                   f"not {learner['objective']['name']} / {gbm['name']}")
+        trees = gbm["model"]["trees"]
+        # Like predict_proba, stop at the best iteration of an early-stopped model
+        best = booster.attr("best_iteration")
+        if best is not None:
+            trees = trees[:gbm["model"]["iteration_indptr"][int(best) + 1]]
+        if any(any(t["split_type"]) for t in trees):
+            raise UnsupportedModel("categorical splits can't be flattened")
+
+        arrays = _flatten([(t["left_children"], t["right_children"], t["split_indices"],
+                            t["split_conditions"], t["default_left"]) for t in trees])
+        conditions = np.concatenate([np.asarray(t["split_conditions"], dtype=np.float32) for t in trees])
+        arrays["threshold"] = conditions
+        arrays["value"] = conditions  # a leaf's split condition is its weight
+
+        base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+        depth = 0
+        for t in trees:
+            # parents are listed before their children
+            node_depth = np.zeros(len(t["left_children"]), dtype=int)
+            for node, (lc, rc) in enumerate(zip(t["left_children"], t["right_children"])):
+                if lc != -1:
+                    node_depth[lc] = node_depth[rc] = node_depth[node] + 1
+            depth = max(depth, int(node_depth.max()))
+        return cls(**arrays, base_margin=_logit32(base_score), depth=depth)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        return _descend(X, self.roots, self.children, self.feature, self.threshold,
+                        self.missing_left, self.depth, strict=True)
+
+    def predict_margin(self, X):
+        leaves = self.apply(X)
+        terms = np.empty((self.n_trees + 1, len(leaves)), dtype=np.float32)
+        terms[0] = self.base_margin
+        terms[1:] = self.value[leaves.T]
+        return np.cumsum(terms, axis=0)[-1]
+
+    def predict_proba(self, X):
+        p = _sigmoid32(self.predict_margin(X), self.vector_sigmoid)
+        return np.vstack((1.0 - p, p)).transpose()
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+    def save(self, folder):
+        _save_arrays(self, folder, self.ARRAYS,
+                     {"base_margin": float(self.base_margin), "depth": int(self.depth),
+                      "vector_sigmoid": bool(self.vector_sigmoid)})
+
+    @classmethod
+    def load(cls, folder, mmap_mode="r"):
+        arrays, info = _load_arrays(folder, cls.ARRAYS, mmap_mode)
+        # Exports from before the vectorized sigmoid were only verified with expf
+        return cls(**arrays, base_margin=info["base_margin"], depth=info["depth"],
+                   vector_sigmoid=info.get("vector_sigmoid", False))
+
+
+def probe_inputs(flat, n_features, n_rows=512, seed=0):
+    """Rows for checking a flattened ensemble: random values plus values sitting
+    exactly on split thresholds, where a wrong comparison would show."""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n_rows, n_features)).astype(np.float32)
+    inner = np.flatnonzero((flat.children[:, 0] != np.arange(len(flat.children))) & np.isfinite(flat.threshold))
+    if len(inner):
+        for row in range(n_rows // 2):
+            nodes = rng.choice(inner, size=min(32, len(inner)), replace=False)
+            X[row, flat.feature[nodes]] = np.asarray(flat.threshold[nodes], dtype=np.float32)
+    X[:8, ::7] = np.nan
+    return X
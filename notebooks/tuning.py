@@ -0,0 +1,290 @@
+# tuning.py
+# Hyperparameter search for the registered models: successive halving or
+# Hyperband over a process pool, scored by stratified k-fold CV on the
+# training split (the 20% test split the trainers report on stays untouched).
+#
+#   python tuning.py --models RandomForest XGBoost --cpus 16
+#   python tuning.py --models XGBoost --method halving --candidates 27 --fit-best
+#
+# A trial's budget ("resource") is n_estimators for the tree ensembles and
+# the percentage of training rows for logistic regression. XGBoost stops
+# early on a validation split carved from each fold, so its budget is an
+# upper bound on the boosting rounds. Every fold result is appended to a
+# JSON-lines file keyed by design matrix, model, params, budget and fold, so
+# an interrupted search resumes without refitting anything it already did.
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import f1_score, log_loss
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from threadpoolctl import threadpool_limits
+
+from preprocessing import DATA_FOLDER, load_design_matrix
+from training import build_model, split_design, train_model
+
+TUNING_FOLDER = DATA_FOLDER / 'tuning_cache'
+N_FOLDS = 3
+EARLY_STOPPING_ROUNDS = 30
+
+# A list is a choice; ("log" | "uniform" | "int", lo, hi) a range
+SEARCH_SPACES = {
+    "LogisticRegression": {
+        "C": ("log", 1e-3, 1e2),
+        "class_weight": ["balanced", None],
+    },
+    "RandomForest": {
+        "max_depth": [4, 6, 8, 10, 14, None],
+        "min_samples_leaf": [1, 2, 4, 8],
+        "max_features": ["sqrt", "log2", 0.3, 0.6],
+        "class_weight": ["balanced", None],
+    },
+    "XGBoost": {
+        "learning_rate": ("log", 0.01, 0.3),
+        "max_depth": ("int", 3, 10),
+        "subsample": ("uniform", 0.6, 1.0),
+        "colsample_bytree": ("uniform", 0.5, 1.0),
+        "min_child_weight": ("log", 1.0, 10.0),
+        "reg_lambda": ("log", 0.1, 10.0),
+    },
+}
+
+# (parameter, smallest budget, full budget); "n_samples" is a percentage of the fold's training rows
+RESOURCES = {
+    "LogisticRegression": ("n_samples", 10, 100),
+    "RandomForest": ("n_estimators", 25, 400),
+    "XGBoost": ("n_estimators", 50, 1000),
+}
+EARLY_STOPPING = {"XGBoost"}
+
+
+def sample_params(space, rng):
+    params = {}
+    for name, dist in space.items():
+        if isinstance(dist, list):
+            params[name] = dist[rng.integers(len(dist))]
+        elif dist[0] == "int":
+            params[name] = int(rng.integers(dist[1], dist[2] + 1))
+        elif dist[0] == "log":
+            params[name] = float(f"{np.exp(rng.uniform(np.log(dist[1]), np.log(dist[2]))):.4g}")
+        else:
+            params[name] = float(f"{rng.uniform(dist[1], dist[2]):.4g}")
+    return params
+
+
+# Per-process training split and CV folds, so tasks only ship their params
+_training = None
+
+
+def _training_folds():
+    global _training
+    if _training is None:
+        X_train, _, y_train, _ = split_design(load_design_matrix())
+        folds = list(StratifiedKFold(N_FOLDS, shuffle=True, random_state=42).split(X_train, y_train))
+        _training = (X_train, y_train, folds)
+    return _training
+
+
+def fit_fold(model, params, resource, fold):
+    """Fit one trial on one CV fold with a single thread and score it."""
+    X, y, folds = _training_folds()
+    train_idx, test_idx = folds[fold]
+    param, _, r_max = RESOURCES[model]
+
+    estimator = build_model(model, 1, params)
+    if param == "n_samples":
+        if resource < r_max:
+            train_idx, _ = train_test_split(train_idx, train_size=resource / 100, random_state=42,
+                                            stratify=y[train_idx])
+    else:
+        estimator.set_params(**{param: resource})
+    X_fit, y_fit = X[train_idx], y[train_idx]
+    fit_kwargs = {}
+    if model in EARLY_STOPPING:
+        X_fit, X_val, y_fit, y_val = train_test_split(X_fit, y_fit, test_size=0.2, random_state=42,
+                                                      stratify=y_fit)
+        estimator.set_params(early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        fit_kwargs = {"eval_set": [(X_val, y_val)], "verbose": False}
+
+    start = time.perf_counter()
+    with threadpool_limits(limits=1):
+        estimator.fit(X_fit, y_fit, **fit_kwargs)
+        proba = estimator.predict_proba(X[test_idx])[:, 1]
+    best_iteration = getattr(estimator, "best_iteration", None)
+    return {
+        "f1": float(f1_score(y[test_idx], proba > 0.5)),
+        "log_loss": float(log_loss(y[test_idx], proba, labels=[0, 1])),
+        "fit_seconds": time.perf_counter() - start,
+        "best_iteration": None if best_iteration is None else int(best_iteration),
+    }
+
+
+class TrialCache:
+    """Fold results of finished trials, one JSON line each, appended as they finish."""
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        if path.exists():
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line of an interrupted run
+                    self.results[record["key"]] = record["result"]
+
+    @staticmethod
+    def key(model, params, resource, fold):
+        return json.dumps([model, params, resource, fold], sort_keys=True)
+
+    def __contains__(self, key):
+        return key in self.results
+
+    def get(self, key):
+        return self.results[key]
+
+    def put(self, key, result):
+        self.results[key] = result
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "result": result}) + "\n")
+
+
+class Search:
+    """Evaluates configurations of one model at a given budget, fold-parallel."""
+
+    def __init__(self, model, pool, cache):
+        self.model = model
+        self.pool = pool
+        self.cache = cache
+        self.history = []
+        self.fits = 0
+
+    def evaluate(self, configs, resource, bracket, rung):
+        futures = {}
+        for params in configs:
+            for fold in range(N_FOLDS):
+                key = TrialCache.key(self.model, params, resource, fold)
+                if key not in self.cache:
+                    futures[self.pool.submit(fit_fold, self.model, params, resource, fold)] = key
+        for future in as_completed(futures):
+            self.cache.put(futures[future], future.result())
+        self.fits += len(futures)
+
+        rows = []
+        for params in configs:
+            folds = [self.cache.get(TrialCache.key(self.model, params, resource, fold))
+                     for fold in range(N_FOLDS)]
+            iterations = [f["best_iteration"] for f in folds if f["best_iteration"] is not None]
+            rows.append({
+                "model": self.model, "bracket": bracket, "rung": rung, "resource": resource,
+                "params": params,
+                "f1": np.mean([f["f1"] for f in folds]),
+                "log_loss": np.mean([f["log_loss"] for f in folds]),
+                "fit_seconds": sum(f["fit_seconds"] for f in folds),
+                "best_iteration": int(np.median(iterations)) if iterations else None,
+            })
+        self.history.extend(rows)
+        # Best F1 first; log loss breaks the (frequent) F1 ties
+        return sorted(rows, key=lambda r: (-r["f1"], r["log_loss"]))
+
+
+def successive_halving(search, configs, r_min, r_max, rungs, eta, bracket=0):
+    """Run `configs` at r_min, keep the best 1/eta at eta times the budget, `rungs` times."""
+    for rung in range(rungs + 1):
+        resource = int(round(min(r_min * eta ** rung, r_max)))
+        ranked = search.evaluate(configs, resource, bracket, rung)
+        configs = [r["params"] for r in ranked[:max(1, len(configs) // eta)]]
+    return ranked[0]
+
+
+def max_rungs(model, eta):
+    _, r_min, r_max = RESOURCES[model]
+    return int(math.floor(math.log(r_max / r_min, eta) + 1e-9))
+
+
+def hyperband(search, eta, seed):
+    """Hyperband: successive halving brackets trading #configs against starting budget."""
+    _, _, r_max = RESOURCES[search.model]
+    s_max = max_rungs(search.model, eta)
+    for s in range(s_max, -1, -1):
+        n = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+        rng = np.random.default_rng([seed, s])
+        configs = [sample_params(SEARCH_SPACES[search.model], rng) for _ in range(n)]
+        successive_halving(search, configs, r_max * eta ** -s, r_max, s, eta, bracket=s)
+
+
+def best_params(search):
+    """Best configuration at the full budget, with the budget parameter filled in."""
+    top = max(r["resource"] for r in search.history)
+    best = min((r for r in search.history if r["resource"] == top), key=lambda r: (-r["f1"], r["log_loss"]))
+    params = dict(best["params"])
+    param = RESOURCES[search.model][0]
+    if param != "n_samples":
+        # Early-stopped models keep the rounds they actually needed
+        params[param] = best["best_iteration"] + 1 if best["best_iteration"] is not None else top
+    return params, best
+
+
+def tune(model, pool, design, method="hyperband", eta=3, candidates=None, seed=42):
+    cache = TrialCache(TUNING_FOLDER / f"{design.key}_cv{N_FOLDS}.jsonl")
+    search = Search(model, pool, cache)
+    if method == "hyperband":
+        hyperband(search, eta, seed)
+    else:
+        r_max = RESOURCES[model][2]
+        rungs = max_rungs(model, eta)
+        rng = np.random.default_rng([seed, rungs])
+        configs = [sample_params(SEARCH_SPACES[model], rng) for _ in range(candidates or eta ** rungs)]
+        # Count the rungs back from the full budget, so the survivors reach it
+        successive_halving(search, configs, r_max * eta ** -rungs, r_max, rungs, eta, bracket=rungs)
+    return search
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Successive halving / Hyperband search for the registered models")
+    parser.add_argument("--models", nargs="+", choices=list(SEARCH_SPACES), default=list(SEARCH_SPACES))
+    parser.add_argument("--method", choices=["hyperband", "halving"], default="hyperband")
+    parser.add_argument("--candidates", type=int, help="configurations for --method halving (default eta^rungs)")
+    parser.add_argument("--eta", type=int, default=3, help="keep the best 1/eta at every rung")
+    parser.add_argument("--cpus", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fit-best", action="store_true",
+                        help="train, log and save each model with its best parameters")
+    args = parser.parse_args()
+
+    design = load_design_matrix()
+    with ProcessPoolExecutor(max_workers=args.cpus) as pool:
+        for model in args.models:
+            start = time.perf_counter()
+            search = tune(model, pool, design, args.method, args.eta, args.candidates, args.seed)
+            params, best = best_params(search)
+            history = pd.DataFrame(search.history)
+            r_max = RESOURCES[model][2]
+            configs = history["params"].map(lambda p: json.dumps(p, sort_keys=True)).nunique()
+
+            print(f"\n=== 🔧 {model} ({args.method}) ===")
+            print(f"{len(history)} evaluations of {configs} configurations, "
+                  f"{search.fits} fold fits run now ({len(history) * N_FOLDS - search.fits} cached)")
+            print(f"Cost: {(history['resource'] / r_max).sum() * N_FOLDS:.0f} full-budget fold fits, "
+                  f"{history['fit_seconds'].sum():.1f} CPU-s; a full-budget grid over the same "
+                  f"configurations needs {configs * N_FOLDS}. Took {time.perf_counter() - start:.1f}s")
+            print(f"🏆 CV F1 {best['f1']:.4f}, log loss {best['log_loss']:.4f}: {params}")
+
+            TUNING_FOLDER.mkdir(parents=True, exist_ok=True)
+            with open(TUNING_FOLDER / f"best_{model}.json", "w") as f:
+                json.dump({"design_key": design.key, "params": params,
+                           "cv_f1": best["f1"], "cv_log_loss": best["log_loss"]}, f, indent=2)
+
+            if args.fit_best:
+                train_model(model, n_jobs=args.cpus, design=design, params=params)
+
+
+if __name__ == "__main__":
+    main()
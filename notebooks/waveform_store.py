@@ -0,0 +1,182 @@
+# waveform_store.py
+# Memory-mapped columnar waveform store: one contiguous float32 array per
+# sensor axis on disk, plus an index table aligned by segment_id.
+#
+# Layout:
+#   <store>/layout.json          {sensor: [axis, ...]}
+#   <store>/<sensor>/<axis>.f32  all segments of that axis, back to back
+#   <store>/index.parquet        segment_id, split, domain, label, missing (sensors
+#                                whose file couldn't be read, comma-separated) and,
+#                                per sensor, <sensor>_source, <sensor>_offset, <sensor>_length
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORE_PATH = Path(__file__).parent.parent / 'data' / 'waveform_store'
+
+LAYOUT_FILE = "layout.json"
+INDEX_FILE = "index.parquet"
+META_COLUMNS = ["segment_id", "split", "domain", "label"]
+DEFAULT_LAYOUT = {"mic": ["waveform"]}
+
+
+def _axis_file(path, sensor, axis):
+    return Path(path) / sensor / f"{axis}.f32"
+
+
+class WaveformStoreWriter:
+    """Append segments one at a time; the store is committed on close().
+
+    Samples are streamed straight to disk, so building the store never needs
+    more than one segment in memory. All axes of a sensor must have the same
+    length within a segment; a sensor given as None is stored empty (length 0)
+    and listed in the `missing` column.
+
+    Everything is written to a scratch folder next to `path` that replaces
+    the old store only on close(), like the design matrix cache; abort() (or
+    an exception inside a with block) discards it and keeps the old store.
+    """
+
+    def __init__(self, path=STORE_PATH, layout=DEFAULT_LAYOUT):
+        self.path = Path(path)
+        self.layout = {sensor: list(axes) for sensor, axes in layout.items()}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._scratch = Path(tempfile.mkdtemp(dir=self.path.parent, prefix=f".{self.path.name}-"))
+        self._files = {}
+        for sensor, axes in self.layout.items():
+            (self._scratch / sensor).mkdir()
+            for axis in axes:
+                self._files[sensor, axis] = open(_axis_file(self._scratch, sensor, axis), "wb")
+        self._offsets = dict.fromkeys(self.layout, 0)
+        self._rows = []
+
+    def append(self, segment_id, split, domain, label, channels, sources=None):
+        """Add one segment; `channels` maps sensor -> {axis: waveform}."""
+        sources = sources or {}
+        missing = [sensor for sensor in self.layout if channels.get(sensor) is None]
+        row = [segment_id, split, domain, label, ",".join(missing)]
+        for sensor, axes in self.layout.items():
+            if sensor in missing:
+                row += [sources.get(sensor, ""), self._offsets[sensor], 0]
+                continue
+            length = len(channels[sensor][axes[0]])
+            for axis in axes:
+                samples = np.ascontiguousarray(channels[sensor][axis], dtype=np.float32)
+                if len(samples) != length:
+                    raise ValueError(f"{segment_id}: {sensor} axes have different lengths")
+                self._files[sensor, axis].write(samples.tobytes())
+            row += [sources.get(sensor, ""), self._offsets[sensor], length]
+            self._offsets[sensor] += length
+        self._rows.append(row)
+
+    def close(self):
+        """Write the index and swap the new store in for the old one."""
+        if not self._files:
+            return
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        try:
+            columns = META_COLUMNS + ["missing"]
+            for sensor in self.layout:
+                columns += [f"{sensor}_source", f"{sensor}_offset", f"{sensor}_length"]
+            index = pd.DataFrame(self._rows, columns=columns)
+            with open(self._scratch / LAYOUT_FILE, "w") as f:
+                json.dump(self.layout, f)
+            index.to_parquet(self._scratch / INDEX_FILE, index=False)
+            # Move the old store aside, rename the new one into place, then drop
+            # the old one (readers that already mapped its files keep them)
+            old = None
+            if self.path.exists():
+                old = Path(tempfile.mkdtemp(dir=self.path.parent, prefix=f".{self.path.name}-old-"))
+                os.replace(self.path, old)
+            os.rename(self._scratch, self.path)
+            if old is not None:
+                shutil.rmtree(old, ignore_errors=True)
+        finally:
+            shutil.rmtree(self._scratch, ignore_errors=True)
+
+    def abort(self):
+        """Discard everything appended; the previous store stays as it was."""
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        shutil.rmtree(self._scratch, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class WaveformStore:
+    """Read-only view of a store; segments are zero-copy slices of memmaps."""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = Path(path)
+        with open(self.path / LAYOUT_FILE) as f:
+            self.layout = json.load(f)
+        self.index = pd.read_parquet(self.path / INDEX_FILE)
+        self._arrays = {}
+        self._positions = None
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def data(self):
+        """The mic waveform array (kept for single-sensor readers)."""
+        if "waveform" not in self.layout.get("mic", []):
+            raise KeyError(f"{self.path} has no mic waveform (layout: {self.layout}); "
+                           f"use array(sensor, axis)")
+        return self.array("mic", "waveform")
+
+    def array(self, sensor, axis):
+        """Whole memory-mapped array of one sensor axis (opened lazily)."""
+        key = sensor, axis
+        if key not in self._arrays:
+            end = self.index[f"{sensor}_offset"] + self.index[f"{sensor}_length"]
+            total = int(end.max()) if len(end) else 0
+            if total:
+                self._arrays[key] = np.memmap(_axis_file(self.path, sensor, axis),
+                                              dtype=np.float32, mode="r", shape=(total,))
+            else:
+                self._arrays[key] = np.empty(0, dtype=np.float32)
+        return self._arrays[key]
+
+    def segment(self, i, sensor="mic", axis="waveform"):
+        """Waveform of the i-th indexed segment (a view, nothing is copied)."""
+        offset = self.index.at[i, f"{sensor}_offset"]
+        length = self.index.at[i, f"{sensor}_length"]
+        return self.array(sensor, axis)[offset:offset + length]
+
+    def axes(self, i, sensor):
+        """{axis: waveform} for every axis of one sensor."""
+        return {axis: self.segment(i, sensor, axis) for axis in self.layout[sensor]}
+
+    def get(self, segment_id, sensor="mic", axis="waveform"):
+        if self._positions is None:
+            self._positions = pd.Series(np.arange(len(self.index)), index=self.index["segment_id"])
+        return self.segment(int(self._positions[segment_id]), sensor, axis)
+
+    def select(self, **filters):
+        """Index rows matching e.g. split="train", domain="target"."""
+        mask = np.ones(len(self.index), dtype=bool)
+        for col, value in filters.items():
+            mask &= (self.index[col] == value).to_numpy()
+        return self.index[mask]
+
+    def iter_segments(self, rows=None, sensor="mic", axis="waveform"):
+        """Yield (index row, waveform) pairs, optionally for a subset of rows."""
+        rows = self.index if rows is None else rows
+        for i, row in zip(rows.index, rows.itertuples(index=False)):
+            yield row, self.segment(i, sensor, axis)